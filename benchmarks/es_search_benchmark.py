@@ -0,0 +1,52 @@
+"""
+Benchmarks for parsing elasticsearch search responses into variant json, using the recorded responses from the
+elasticsearch unit tests.
+
+These are not run as part of the unit test suite. To run:
+    python manage.py test --noinput benchmarks.es_search_benchmark
+"""
+import mock
+import time
+from django.test import TestCase
+from elasticsearch_dsl import Search
+from elasticsearch_dsl.response import Response
+
+from reference_data.models import GENOME_VERSION_GRCh37
+from seqr.models import Sample
+from seqr.utils.search.elasticsearch.es_search import EsSearch
+from seqr.utils.search.elasticsearch.es_utils_tests import urllib3_responses, setup_responses, mock_hits, \
+    INDEX_ES_VARIANTS, INDEX_NAME, SV_INDEX_NAME, MITO_WGS_INDEX_NAME
+
+NUM_HITS = 10000
+INDICES = [INDEX_NAME, SV_INDEX_NAME, MITO_WGS_INDEX_NAME]
+
+
+@mock.patch('seqr.utils.search.elasticsearch.es_utils.ELASTICSEARCH_SERVICE_HOSTNAME', 'testhost')
+class EsParseHitBenchmark(TestCase):
+    databases = '__all__'
+    fixtures = ['users', '1kg_project', 'reference_data']
+
+    def _run_benchmark(self, include_matched_queries):
+        samples = Sample.objects.filter(elasticsearch_index__in=INDICES, is_active=True)
+        es_search = EsSearch(samples, GENOME_VERSION_GRCh37)
+
+        recorded_hits = []
+        for index in INDICES:
+            recorded_hits += mock_hits(
+                INDEX_ES_VARIANTS[index], include_matched_queries=include_matched_queries, index=index)
+        hits = (recorded_hits * (NUM_HITS // len(recorded_hits) + 1))[:NUM_HITS]
+        response = Response(Search(), {'took': 1, 'hits': {'total': {'value': NUM_HITS}, 'hits': hits}})
+
+        start = time.perf_counter()
+        parsed = [es_search._parse_hit(hit) for hit in response]
+        duration = time.perf_counter() - start
+
+        self.assertEqual(len(parsed), NUM_HITS)
+        print('Parsed {} hits in {:.3f} seconds ({:.0f} hits/second){}'.format(
+            NUM_HITS, duration, NUM_HITS / duration, '' if include_matched_queries else ' without matched queries'))
+
+    @urllib3_responses.activate
+    def test_parse_hit(self):
+        setup_responses()
+        self._run_benchmark(include_matched_queries=True)
+        self._run_benchmark(include_matched_queries=False)
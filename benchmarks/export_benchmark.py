@@ -0,0 +1,46 @@
+"""
+Benchmarks for exporting large tables.
+
+These are not run as part of the unit test suite. To run:
+    python manage.py test --noinput benchmarks.export_benchmark
+"""
+import time
+import tracemalloc
+from django.test import SimpleTestCase
+
+from seqr.views.utils.export_utils import export_table
+
+NUM_ROWS = 50000
+NUM_COLUMNS = 40
+
+
+def _get_rows():
+    for i in range(NUM_ROWS):
+        yield [f'row{i}_col{j}' if j % 4 else None for j in range(NUM_COLUMNS)]
+
+
+def _iter_response_content(response):
+    return response.streaming_content if response.streaming else [response.content]
+
+
+class ExportTableBenchmark(SimpleTestCase):
+
+    def test_export_table(self):
+        header = [f'column_{j}' for j in range(NUM_COLUMNS)]
+        for file_format in ['tsv', 'xls']:
+            for description, get_rows in [('list', lambda: list(_get_rows())), ('generator', _get_rows)]:
+                tracemalloc.start()
+                start = time.perf_counter()
+                try:
+                    response = export_table('benchmark', header, get_rows(), file_format=file_format)
+                    content_size = sum(len(chunk) for chunk in _iter_response_content(response))
+                except TypeError:
+                    # Exports which do not support row generators
+                    tracemalloc.stop()
+                    continue
+                duration = time.perf_counter() - start
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+                print('Exported {} rows as {} from a {} in {:.2f} seconds ({:.1f}MB, peak memory {:.2f}MB)'.format(
+                    NUM_ROWS, file_format, description, duration, content_size / 1024 / 1024, peak / 1024 / 1024))
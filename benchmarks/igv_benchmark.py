@@ -0,0 +1,58 @@
+"""
+Benchmarks for serving byte range requests for local IGV tracks.
+
+These are not run as part of the unit test suite. To run:
+    python manage.py test --noinput benchmarks.igv_benchmark
+
+By default a randomly generated file is used, set IGV_BENCHMARK_FILE to the path of a large local BAM/CRAM to use a
+real track instead.
+"""
+import os
+import random
+import tempfile
+import time
+from django.test import RequestFactory, SimpleTestCase
+
+from seqr.views.apis.igv_api import _stream_file
+
+GENERATED_FILE_SIZE = 256 * 1024 * 1024
+NUM_RANGE_REQUESTS = 500
+MAX_RANGE_SIZE = 1024 * 1024
+
+
+class IgvStreamFileBenchmark(SimpleTestCase):
+
+    def _run_benchmark(self, file_path):
+        file_size = os.path.getsize(file_path)
+        rand = random.Random(0)
+        ranges = []
+        for _ in range(NUM_RANGE_REQUESTS):
+            first_byte = rand.randrange(0, file_size - 1)
+            ranges.append((first_byte, min(first_byte + rand.randrange(1, MAX_RANGE_SIZE), file_size - 1)))
+
+        factory = RequestFactory()
+        total_bytes = 0
+        start = time.perf_counter()
+        for first_byte, last_byte in ranges:
+            request = factory.get('/', HTTP_RANGE=f'bytes={first_byte}-{last_byte}')
+            request.user = None
+            response = _stream_file(request, file_path)
+            total_bytes += sum(len(chunk) for chunk in response.streaming_content)
+        duration = time.perf_counter() - start
+
+        print('Served {} range requests ({:.1f} MB) in {:.3f} seconds ({:.0f} requests/second, {:.1f} MB/second)'.format(
+            NUM_RANGE_REQUESTS, total_bytes / 1024 ** 2, duration, NUM_RANGE_REQUESTS / duration,
+            total_bytes / 1024 ** 2 / duration))
+
+    def test_stream_file_ranges(self):
+        file_path = os.environ.get('IGV_BENCHMARK_FILE')
+        if file_path:
+            self._run_benchmark(file_path)
+            return
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, 'benchmark.bam')
+            with open(file_path, 'wb') as f:
+                for _ in range(GENERATED_FILE_SIZE // MAX_RANGE_SIZE):
+                    f.write(os.urandom(MAX_RANGE_SIZE))
+            self._run_benchmark(file_path)
@@ -0,0 +1,74 @@
+"""
+Benchmarks for bulk loading reference data records.
+
+These are not run as part of the unit test suite. To run:
+    python manage.py test --noinput benchmarks.reference_data_benchmark
+"""
+import gzip
+import os
+import random
+import tempfile
+import time
+import mock
+from django.test import TestCase
+
+from reference_data.management.commands.update_primate_ai import PrimateAIReferenceDataHandler
+from reference_data.management.commands.utils.gencode_utils import load_gencode_records, MAX_GTF_PARSE_PROCESSES
+from reference_data.management.commands.utils.update_utils import update_records
+from reference_data.models import GeneInfo, PrimateAI
+
+NUM_GENES = 1000
+NUM_RECORDS = 200000
+NUM_GTF_GENES = 20000
+GTF_INFO = 'gene_id "ENSG{i:011d}.1"; transcript_id "ENST{i:011d}.1"; gene_type "protein_coding"; gene_name "GENE{i}"; ' \
+           'transcript_type "protein_coding"; level 2; hgnc_id "HGNC:{i}"; tag "basic"; tag "CCDS"; havana_gene "OTTHUMG1";'
+GTF_FEATURE_TYPES = ['gene', 'transcript', 'exon', 'CDS', 'exon', 'CDS', 'exon', 'UTR', 'start_codon', 'stop_codon']
+
+
+class UpdateRecordsBenchmark(TestCase):
+    databases = '__all__'
+
+    def test_update_records(self):
+        GeneInfo.objects.bulk_create([
+            GeneInfo(gene_id=f'ENSG{i:011d}', gene_symbol=f'GENE{i}', gencode_release=39) for i in range(NUM_GENES)
+        ])
+        rand = random.Random(0)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, 'primate_ai.tsv')
+            with open(file_path, 'w') as f:
+                f.write('genesymbol\tpcnt25\tpcnt75\n')
+                for i in range(NUM_RECORDS):
+                    f.write(f'GENE{i % NUM_GENES}\t{rand.random()}\t{rand.random()}\n')
+
+            with mock.patch('reference_data.management.commands.utils.update_utils.logger') as mock_logger:
+                start = time.perf_counter()
+                update_records(PrimateAIReferenceDataHandler(), file_path=file_path)
+                duration = time.perf_counter() - start
+                mock_logger.error.assert_not_called()
+
+        self.assertEqual(PrimateAI.objects.count(), NUM_RECORDS)
+        print('Loaded {} records in {:.3f} seconds ({:.0f} records/second)'.format(
+            NUM_RECORDS, duration, NUM_RECORDS / duration))
+
+
+class LoadGencodeRecordsBenchmark(TestCase):
+
+    def test_load_gencode_records(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, 'gencode.v39.annotation.gtf.gz')
+            with gzip.open(file_path, 'wt') as f:
+                for i in range(NUM_GTF_GENES):
+                    info = GTF_INFO.format(i=i)
+                    for j, feature_type in enumerate(GTF_FEATURE_TYPES):
+                        f.write(f'chr1\tHAVANA\t{feature_type}\t{i * 1000 + j}\t{i * 1000 + 500}\t.\t+\t.\t{info}\n')
+
+            with mock.patch('reference_data.management.commands.utils.gencode_utils.logger'):
+                start = time.perf_counter()
+                genes, transcripts, _ = load_gencode_records(39, file_path, '38')
+                duration = time.perf_counter() - start
+
+        self.assertEqual(len(genes), NUM_GTF_GENES)
+        self.assertEqual(len(transcripts), NUM_GTF_GENES)
+        num_lines = NUM_GTF_GENES * len(GTF_FEATURE_TYPES)
+        print('Parsed {} GTF lines in {:.3f} seconds ({:.0f} lines/second, {} processes)'.format(
+            num_lines, duration, num_lines / duration, min(MAX_GTF_PARSE_PROCESSES, os.cpu_count() or 1)))
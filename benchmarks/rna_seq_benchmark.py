@@ -0,0 +1,109 @@
+"""
+Benchmarks for replacing large RNA-seq datasets.
+
+These are not run as part of the unit test suite. To run:
+    python manage.py test --noinput benchmarks.rna_seq_benchmark
+"""
+import mock
+import os
+import tempfile
+import time
+import tracemalloc
+from django.db import connection
+from django.test import TestCase
+
+from reference_data.models import GeneInfo
+from seqr.models import RnaSeqTpm, RnaSeqTpmArray, Sample
+from seqr.views.utils.dataset_utils import _load_rna_seq_file, TPM_HEADER_COLS
+from seqr.views.utils.rna_seq_tpm_utils import convert_rna_seq_tpm_rows_to_arrays, get_rna_seq_tpms
+
+NUM_GENES = 200000
+NUM_FILE_SAMPLES = 50
+NUM_FILE_GENES = 5000
+NUM_STORED_SAMPLES = 20
+NUM_STORED_GENES = 20000
+NUM_QUERIES = 50
+
+
+class RnaSeqBenchmark(TestCase):
+    databases = '__all__'
+    fixtures = ['users', '1kg_project']
+
+    def test_bulk_delete(self):
+        sample = Sample.objects.get(guid='S000129_na19675')
+        RnaSeqTpm.objects.bulk_create([
+            RnaSeqTpm(sample=sample, gene_id=f'ENSG{i:011d}', tpm=i / 10) for i in range(NUM_GENES)
+        ], batch_size=10000)
+
+        with mock.patch('seqr.models.logger'):
+            tracemalloc.start()
+            start = time.perf_counter()
+            RnaSeqTpm.bulk_delete(user=None, sample=sample)
+            duration = time.perf_counter() - start
+            _, peak_memory = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        self.assertFalse(RnaSeqTpm.objects.filter(sample=sample).exists())
+        print('Deleted {} RnaSeqTpm records in {:.3f} seconds ({:.0f} records/second, peak memory {:.1f} MB)'.format(
+            NUM_GENES, duration, NUM_GENES / duration, peak_memory / 1024 / 1024))
+
+    def test_parse_tpm_file(self):
+        GeneInfo.objects.bulk_create([
+            GeneInfo(gene_id=f'ENSG{i:011d}', gene_symbol=f'GENE{i}', gencode_release=39) for i in range(NUM_FILE_GENES)
+        ])
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, 'tpms.tsv')
+            with open(file_path, 'w') as f:
+                f.write('sample_id\tproject\tgene_id\tTPM\ttissue\n')
+                for sample in range(NUM_FILE_SAMPLES):
+                    for i in range(NUM_FILE_GENES):
+                        f.write(f'SAMPLE{sample}\tproject\tENSG{i:011d}\t{i / 10}\tmuscle\n')
+
+            with mock.patch('seqr.views.utils.dataset_utils.logger'):
+                tracemalloc.start()
+                start = time.perf_counter()
+                _, samples_by_id, _, _ = _load_rna_seq_file(file_path, None, TPM_HEADER_COLS)
+                duration = time.perf_counter() - start
+                _, peak_memory = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+        self.assertEqual(len(samples_by_id), NUM_FILE_SAMPLES)
+        num_rows = NUM_FILE_SAMPLES * NUM_FILE_GENES
+        print('Parsed {} RNA-seq rows in {:.3f} seconds ({:.0f} rows/second, peak memory {:.1f} MB)'.format(
+            num_rows, duration, num_rows / duration, peak_memory / 1024 / 1024))
+
+    def test_tpm_storage(self):
+        samples = list(Sample.objects.filter(sample_type=Sample.SAMPLE_TYPE_RNA).order_by('id'))
+        new_samples = [Sample(
+            guid=f'S_BENCHMARK_{i}', individual=samples[0].individual, sample_id=f'BENCHMARK_{i}',
+            sample_type=Sample.SAMPLE_TYPE_RNA, tissue_type=samples[0].tissue_type, is_active=True,
+            loaded_date=samples[0].loaded_date,
+        ) for i in range(NUM_STORED_SAMPLES)]
+        for sample in new_samples:
+            sample.save()
+        sample_ids = [sample.id for sample in new_samples]
+        gene_ids = [f'ENSG{i:011d}' for i in range(NUM_STORED_GENES)]
+        RnaSeqTpm.objects.bulk_create([
+            RnaSeqTpm(sample_id=sample_id, gene_id=gene_id, tpm=i / 10)
+            for sample_id in sample_ids for i, gene_id in enumerate(gene_ids)
+        ], batch_size=10000)
+
+        self._print_storage_stats('rows', RnaSeqTpm, sample_ids, gene_ids)
+        with mock.patch('seqr.models.logger'):
+            convert_rna_seq_tpm_rows_to_arrays(None, sample_ids)
+        self._print_storage_stats('arrays', RnaSeqTpmArray, sample_ids, gene_ids)
+
+    @staticmethod
+    def _print_storage_stats(storage_type, model, sample_ids, gene_ids):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_total_relation_size(%s)', [model._meta.db_table])
+            table_size = cursor.fetchone()[0]
+
+        start = time.perf_counter()
+        for i in range(NUM_QUERIES):
+            tpms = get_rna_seq_tpms(sample_ids, [gene_ids[i * len(gene_ids) // NUM_QUERIES]])
+        duration = time.perf_counter() - start
+
+        assert len(tpms) == len(sample_ids)
+        print('TPM {}: {:.1f} MB for {} samples x {} genes, {:.2f} ms per single gene lookup across all samples'.format(
+            storage_type, table_size / 1024 / 1024, len(sample_ids), len(gene_ids), duration / NUM_QUERIES * 1000))
@@ -0,0 +1,141 @@
+"""
+Benchmarks for refreshing the saved variant json for a project.
+
+These are not run as part of the unit test suite. To run:
+    python manage.py test --noinput benchmarks.saved_variant_benchmark
+"""
+import json
+import mock
+import time
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from seqr.models import Family, SavedVariant, VariantNote, VariantTag, VariantTagType
+from seqr.views.utils.orm_to_json_utils import get_json_for_saved_variants, get_json_for_saved_variants_with_tags
+from seqr.views.utils.project_context_utils import DISCOVERY_TAG_JSON_KEYS
+from seqr.views.utils.variant_utils import update_project_saved_variant_json
+
+NUM_VARIANTS = 5000
+NUM_GENE_VARIANTS = 50000
+NUM_GENES = 2000
+NUM_QUERIES = 20
+NUM_LISTED_VARIANTS = 2000
+NUM_GENOTYPES = 50
+SEARCH_LATENCY = 0.2
+
+
+def _mock_get_variants(families, variant_ids, **kwargs):
+    # Simulate the round trip to the search backend
+    time.sleep(SEARCH_LATENCY)
+    return [{
+        'variantId': variant_id, 'familyGuids': [family.guid for family in families], 'transcripts': {},
+        'populations': {'gnomad_genomes': {'af': 0.001}},
+    } for variant_id in variant_ids]
+
+
+class SavedVariantJsonBenchmark(TestCase):
+    databases = '__all__'
+    fixtures = ['users', '1kg_project']
+
+    def test_update_project_saved_variant_json(self):
+        family = Family.objects.get(guid='F000001_1')
+        SavedVariant.objects.bulk_create([SavedVariant(
+            guid=f'SV_BENCHMARK_{i}', family=family, xpos=1000000000 + i, ref='A', alt='T',
+            variant_id=f'1-{i}-A-T', saved_variant_json={},
+        ) for i in range(NUM_VARIANTS)])
+
+        with mock.patch('seqr.views.utils.variant_utils.get_variants_for_variant_ids', _mock_get_variants), \
+                mock.patch('seqr.models.logger'), CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            updated_guids = update_project_saved_variant_json(family.project)
+            duration = time.perf_counter() - start
+
+        self.assertGreaterEqual(len(updated_guids), NUM_VARIANTS)
+        print('Updated {} saved variants in {:.3f} seconds ({:.0f} variants/second, {} queries)'.format(
+            len(updated_guids), duration, len(updated_guids) / duration, len(queries)))
+
+    def test_filter_by_gene(self):
+        family = Family.objects.get(guid='F000001_1')
+        saved_variants = []
+        for i in range(NUM_GENE_VARIANTS):
+            gene_id = f'ENSG{i % NUM_GENES:011d}'
+            saved_variant = SavedVariant(
+                guid=f'SV_BENCHMARK_{i}', family=family, xpos=1000000000 + i, ref='A', alt='T',
+                variant_id=f'1-{i}-A-T', saved_variant_json={
+                    'transcripts': {gene_id: [{'transcriptId': f'ENST{i:011d}', 'majorConsequence': 'missense'}]},
+                    'mainTranscriptId': f'ENST{i:011d}', 'populations': {'gnomad_genomes': {'af': 0.001}},
+                },
+            )
+            saved_variant.update_gene_fields()
+            saved_variants.append(saved_variant)
+        SavedVariant.objects.bulk_create(saved_variants, batch_size=5000)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE seqr_savedvariant')
+
+        for description, get_filter in [
+            ('json key', lambda gene_id: {'saved_variant_json__transcripts__has_key': gene_id}),
+            ('gene_ids', lambda gene_id: {'gene_ids__contains': [gene_id]}),
+        ]:
+            start = time.perf_counter()
+            for i in range(NUM_QUERIES):
+                num_variants = len(SavedVariant.objects.filter(**get_filter(f'ENSG{i:011d}')).values_list('id'))
+            duration = time.perf_counter() - start
+            self.assertEqual(num_variants, NUM_GENE_VARIANTS // NUM_GENES)
+            print('Filtered {} saved variants by {} in {:.2f} ms per gene'.format(
+                NUM_GENE_VARIANTS, description, duration / NUM_QUERIES * 1000))
+
+    def test_list_saved_variants(self):
+        family = Family.objects.get(guid='F000001_1')
+        variant_json = SavedVariant.objects.get(guid='SV0000001_2103343353_r0390_100').saved_variant_json
+        variant_json['genotypes'] = {
+            f'I{i:07d}': {'ab': 0.5, 'ad': '10,12', 'dp': 22, 'gq': 99, 'numAlt': 1, 'sampleId': f'SAMPLE_{i}'}
+            for i in range(NUM_GENOTYPES)
+        }
+        SavedVariant.objects.bulk_create([SavedVariant(
+            guid=f'SV_BENCHMARK_{i}', family=family, xpos=1000000000 + i, ref='A', alt='T',
+            variant_id=f'1-{i}-A-T', saved_variant_json=variant_json,
+        ) for i in range(NUM_LISTED_VARIANTS)], batch_size=1000)
+        saved_variants = SavedVariant.objects.filter(guid__startswith='SV_BENCHMARK')
+
+        for description, kwargs in [
+            ('full json', {}), ('discovery tag keys', {'saved_variant_json_keys': DISCOVERY_TAG_JSON_KEYS}),
+        ]:
+            start = time.perf_counter()
+            variants = get_json_for_saved_variants(saved_variants, add_details=True, **kwargs)
+            duration = time.perf_counter() - start
+            self.assertEqual(len(variants), NUM_LISTED_VARIANTS)
+            print('Listed {} saved variants with {} in {:.3f} seconds ({:.1f} MB of json)'.format(
+                NUM_LISTED_VARIANTS, description, duration, len(json.dumps(list(variants), default=str)) / 1024 / 1024))
+
+    def test_load_saved_variant_tags(self):
+        family = Family.objects.get(guid='F000001_1')
+        saved_variants = SavedVariant.objects.bulk_create([SavedVariant(
+            guid=f'SV_BENCHMARK_{i}', family=family, xpos=1000000000 + i, ref='A', alt='T',
+            variant_id=f'1-{i}-A-T', saved_variant_json={},
+        ) for i in range(NUM_LISTED_VARIANTS)])
+        tag_types = list(VariantTagType.objects.filter(project__isnull=True)[:3])
+        tags = VariantTag.objects.bulk_create([
+            VariantTag(guid=f'VT_BENCHMARK_{i}_{j}', variant_tag_type=tag_type)
+            for i in range(NUM_LISTED_VARIANTS) for j, tag_type in enumerate(tag_types)
+        ])
+        notes = VariantNote.objects.bulk_create([
+            VariantNote(guid=f'VN_BENCHMARK_{i}', note='A note') for i in range(NUM_LISTED_VARIANTS)
+        ])
+        VariantTag.saved_variants.through.objects.bulk_create([
+            VariantTag.saved_variants.through(varianttag_id=tag.id, savedvariant_id=saved_variants[i // len(tag_types)].id)
+            for i, tag in enumerate(tags)
+        ])
+        VariantNote.saved_variants.through.objects.bulk_create([
+            VariantNote.saved_variants.through(variantnote_id=note.id, savedvariant_id=saved_variants[i].id)
+            for i, note in enumerate(notes)
+        ])
+
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = get_json_for_saved_variants_with_tags(SavedVariant.objects.filter(guid__startswith='SV_BENCHMARK'))
+            duration = time.perf_counter() - start
+
+        self.assertEqual(len(response['variantTagsByGuid']), len(tags))
+        print('Loaded tags and notes for {} saved variants in {:.3f} seconds ({} queries)'.format(
+            NUM_LISTED_VARIANTS, duration, len(queries)))
@@ -0,0 +1,69 @@
+"""
+Benchmarks for parsing and saving large uploaded pedigree and sample manifest tables.
+
+These are not run as part of the unit test suite. To run:
+    python manage.py test --noinput benchmarks.upload_benchmark
+"""
+from io import BytesIO
+import openpyxl as xl
+import time
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, SimpleTestCase
+
+from seqr.views.utils.file_utils import save_uploaded_file
+from seqr.views.utils.pedigree_info_utils import parse_basic_pedigree_table
+
+NUM_ROWS = 50000
+HEADER = ['Family ID', 'Individual ID', 'Paternal ID', 'Maternal ID', 'Sex', 'Affected Status', 'Notes']
+
+
+def _generate_rows():
+    rows = [HEADER]
+    for i in range(NUM_ROWS // 3):
+        family_id = f'FAM{i}'
+        rows += [
+            [family_id, f'{family_id}_father', '', '', 'Male', 'Unaffected', 'a note'],
+            [family_id, f'{family_id}_mother', '', '', 'Female', 'Unaffected', ''],
+            [family_id, f'{family_id}_proband', f'{family_id}_father', f'{family_id}_mother', 'Female', 'Affected', ''],
+        ]
+    return rows
+
+
+def _process_records(records, filename=''):
+    return parse_basic_pedigree_table(records, filename)[0]
+
+
+class UploadedFileBenchmark(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        rows = _generate_rows()
+        cls.file_content = {
+            'tsv': '\n'.join('\t'.join(row) for row in rows).encode('utf-8'),
+            'csv': '\n'.join(','.join(row) for row in rows).encode('utf-8'),
+        }
+        wb = xl.Workbook()
+        ws = wb[wb.sheetnames[0]]
+        for row in rows:
+            ws.append(row)
+        xlsx = BytesIO()
+        wb.save(xlsx)
+        cls.file_content['xlsx'] = xlsx.getvalue()
+
+    def _run_benchmark(self, ext, process_records=None):
+        request = RequestFactory().post('/api/upload_temp_file', {
+            'f': SimpleUploadedFile(f'benchmark.{ext}', self.file_content[ext]),
+        })
+        start = time.perf_counter()
+        _, _, json_records = save_uploaded_file(request, process_records=process_records)
+        duration = time.perf_counter() - start
+
+        print('Saved {} {} rows{} in {:.3f} seconds ({:.0f} rows/second)'.format(
+            len(json_records), ext, ' as pedigree records' if process_records else '', duration,
+            len(json_records) / duration))
+
+    def test_save_uploaded_file(self):
+        for ext in self.file_content.keys():
+            self._run_benchmark(ext)
+        self._run_benchmark('tsv', process_records=_process_records)
@@ -0,0 +1,99 @@
+"""
+Benchmarks for exporting variant search results.
+
+These are not run as part of the unit test suite. To run:
+    python manage.py test --noinput benchmarks.variant_export_benchmark
+"""
+import inspect
+import mock
+import time
+from django.contrib.auth.models import User
+from django.test import RequestFactory, TestCase
+
+from seqr.models import SavedVariant, VariantSearch, VariantSearchResults
+from seqr.views.apis.variant_search_api import export_variants_handler
+
+NUM_VARIANTS = 1000
+NUM_FAMILIES = 50
+TAGGED_VARIANT_RATE = 10
+SEARCH_HASH = 'benchmark_search_hash'
+
+
+def _get_variant(i):
+    gene_id = f'ENSG{i:011d}'
+    return {
+        'variantId': f'1-{i}-A-T', 'chrom': '1', 'pos': i, 'ref': 'A', 'alt': 'T', 'genomeVersion': '38',
+        'familyGuids': [f'F_BENCHMARK_{j}' for j in range(NUM_FAMILIES)],
+        'mainTranscriptId': f'ENST{i:011d}_0',
+        'transcripts': {gene_id: [{
+            'transcriptId': f'ENST{i:011d}_{k}', 'geneId': gene_id, 'geneSymbol': f'GENE{i}',
+            'majorConsequence': 'missense_variant', 'hgvsc': f'c.{k}A>T', 'hgvsp': f'p.Gly{k}Ser',
+        } for k in range(5)]},
+        'populations': {'callset': {'af': 0.1}, 'gnomad_genomes': {'af': 0.001}},
+        'predictions': {'cadd': 20.1, 'revel': 0.5, 'polyphen': 'D', 'sift': 'T'},
+        'clinvar': {'clinicalSignificance': 'Pathogenic', 'goldStars': 2},
+        'rsid': f'rs{i}',
+        'genotypes': {f'I_BENCHMARK_{j}': {
+            'sampleId': f'S_BENCHMARK_{j}', 'numAlt': 1, 'gq': 99, 'ab': 0.5,
+        } for j in range(NUM_FAMILIES)},
+    }
+
+
+def _get_saved_variants_json(variants):
+    saved_variants_by_guid = {}
+    tags_by_guid = {}
+    notes_by_guid = {}
+    for i, variant in enumerate(variants):
+        for family_guid in variant['familyGuids']:
+            variant_guid = f'SV_BENCHMARK_{i}_{family_guid}'
+            saved_variants_by_guid[variant_guid] = {
+                'variantGuid': variant_guid, 'familyGuids': [family_guid], 'variantId': variant['variantId'],
+                'genomeVersion': '38',
+            }
+            if len(saved_variants_by_guid) % TAGGED_VARIANT_RATE == 0:
+                tag_guid = f'VT_BENCHMARK_{len(tags_by_guid)}'
+                tags_by_guid[tag_guid] = {
+                    'tagGuid': tag_guid, 'name': 'Review', 'createdBy': 'test_user', 'lastModifiedDate': None,
+                    'variantGuids': [variant_guid],
+                }
+                note_guid = f'VN_BENCHMARK_{len(notes_by_guid)}'
+                notes_by_guid[note_guid] = {
+                    'noteGuid': note_guid, 'note': 'a note', 'createdBy': 'test_user', 'lastModifiedDate': None,
+                    'variantGuids': [variant_guid],
+                }
+    return {
+        'savedVariantsByGuid': saved_variants_by_guid, 'variantTagsByGuid': tags_by_guid,
+        'variantNotesByGuid': notes_by_guid,
+    }
+
+
+class VariantExportBenchmark(TestCase):
+    databases = '__all__'
+    fixtures = ['users', '1kg_project']
+
+    def test_export_variants(self):
+        user = User.objects.get(username='test_superuser')
+        variant_search = VariantSearch.objects.create(search={})
+        VariantSearchResults.objects.create(variant_search=variant_search, search_hash=SEARCH_HASH)
+
+        variants = [_get_variant(i) for i in range(NUM_VARIANTS)]
+        saved_variants_json = _get_saved_variants_json(variants)
+
+        request = RequestFactory().get('/')
+        request.user = user
+        with mock.patch('seqr.views.apis.variant_search_api.query_variants') as mock_query_variants, \
+                mock.patch('seqr.views.apis.variant_search_api._get_saved_variant_models') as mock_get_saved_variants, \
+                mock.patch('seqr.views.apis.variant_search_api.get_json_for_saved_variants_with_tags') as mock_get_json:
+            mock_query_variants.return_value = (variants, NUM_VARIANTS)
+            mock_get_saved_variants.return_value = (SavedVariant.objects.none(), {})
+            mock_get_json.return_value = saved_variants_json
+
+            start = time.perf_counter()
+            response = inspect.unwrap(export_variants_handler)(request, SEARCH_HASH)
+            content = response.getvalue()
+            duration = time.perf_counter() - start
+
+        self.assertEqual(len(content.split(b'\n')), NUM_VARIANTS + 2)
+        print('Exported {} variants x {} families ({} tags) in {:.2f} seconds ({:.1f}MB)'.format(
+            NUM_VARIANTS, NUM_FAMILIES, len(saved_variants_json['variantTagsByGuid']), duration,
+            len(content) / 1024 / 1024))
@@ -1,8 +1,13 @@
 import logging
+import threading
+import time
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from django.core.management.base import BaseCommand
+from django.db import connections
 
 from reference_data.management.commands.utils.gencode_utils import LATEST_GENCODE_RELEASE, OLD_GENCODE_RELEASES
+from reference_data.management.commands.utils.gene_utils import get_genes_by_symbol_and_id
 from reference_data.management.commands.utils.update_utils import update_records
 from reference_data.management.commands.update_human_phenotype_ontology import update_hpo
 from reference_data.management.commands.update_dbnsfp_gene import DbNSFPReferenceDataHandler
@@ -31,6 +36,13 @@ REFERENCE_DATA_SOURCES = OrderedDict([
     ("hpo", None),
 ])
 
+GENE_DEPENDENT_SOURCES = ['omim'] + [source for source, data_handler in REFERENCE_DATA_SOURCES.items() if data_handler]
+SOURCE_DEPENDENCIES = {
+    'mgi': ['dbnsfp_gene'],
+}
+
+DEFAULT_MAX_PARALLEL_UPDATES = 4
+
 
 class Command(BaseCommand):
     help = "Loads all reference data"
@@ -42,6 +54,10 @@ class Command(BaseCommand):
         omim_options.add_argument('--skip-omim', help="Don't reload gene constraint", action="store_true")
 
         parser.add_argument('--skip-gencode', help="Don't reload gencode", action="store_true")
+        parser.add_argument(
+            '--max-parallel-updates', type=int, default=DEFAULT_MAX_PARALLEL_UPDATES,
+            help='Maximum number of sources to update in parallel',
+        )
 
         for source in REFERENCE_DATA_SOURCES.keys():
             parser.add_argument(
@@ -49,41 +65,107 @@ class Command(BaseCommand):
             )
 
     def handle(self, *args, **options):
-        updated = []
-        update_failed = []
+        self._gene_reference = None
+        self._gene_reference_lock = threading.Lock()
 
+        updates = OrderedDict()
         if not options["skip_gencode"]:
-            # Download latest version first, and then add any genes from old releases not included in the latest release
-            # Old gene ids are used in the gene constraint table and other datasets, as well as older sequencing data
-            update_gencode(LATEST_GENCODE_RELEASE, reset=True)
-            for release in OLD_GENCODE_RELEASES:
-                update_gencode(release)
-            updated.append('gencode')
+            updates['gencode'] = self._update_gencode
 
         if not options["skip_omim"]:
-            try:
-                omim_handler = CachedOmimReferenceDataHandler() if options['use_cached_omim'] else \
-                    OmimReferenceDataHandler(options["omim_key"])
-                update_records(omim_handler)
-                updated.append('omim')
-            except Exception as e:
-                logger.error("unable to update omim: {}".format(e))
-                update_failed.append('omim')
+            if options['use_cached_omim']:
+                updates['omim'] = self._get_update_records_func(CachedOmimReferenceDataHandler)
+            else:
+                updates['omim'] = self._get_update_records_func(OmimReferenceDataHandler, omim_key=options["omim_key"])
 
         for source, data_handler in REFERENCE_DATA_SOURCES.items():
             if not options["skip_{}".format(source)]:
-                try:
-                    if data_handler:
-                        update_records(data_handler())
-                    elif source == "hpo":
-                        update_hpo()
-                    updated.append(source)
-                except Exception as e:
-                    logger.error("unable to update {}: {}".format(source, e))
-                    update_failed.append(source)
+                if data_handler:
+                    updates[source] = self._get_update_records_func(data_handler)
+                elif source == "hpo":
+                    updates[source] = update_hpo
+
+        durations = {}
+        update_failed = self._run_updates(updates, options['max_parallel_updates'], durations)
+        updated = [source for source in updates.keys() if source not in update_failed]
+
+        for source in updates.keys():
+            logger.info("{}: {} in {:.1f} seconds".format(
+                source, 'failed' if source in update_failed else 'updated', durations.get(source, 0)))
 
         logger.info("Done")
         if updated:
             logger.info("Updated: {}".format(', '.join(updated)))
         if update_failed:
-            logger.info("Failed to Update: {}".format(', '.join(update_failed)))
+            logger.info("Failed to Update: {}".format(', '.join(source for source in updates.keys() if source in update_failed)))
+
+    @staticmethod
+    def _update_gencode():
+        # Download latest version first, and then add any genes from old releases not included in the latest release
+        # Old gene ids are used in the gene constraint table and other datasets, as well as older sequencing data
+        update_gencode(LATEST_GENCODE_RELEASE, reset=True)
+        for release in OLD_GENCODE_RELEASES:
+            update_gencode(release)
+
+    def _get_update_records_func(self, data_handler, **kwargs):
+        return lambda: update_records(data_handler(gene_reference=self._get_gene_reference(), **kwargs))
+
+    def _get_gene_reference(self):
+        # Genes are only loaded once all gencode updates complete, and are then shared read-only by all sources
+        with self._gene_reference_lock:
+            if self._gene_reference is None:
+                gene_symbols_to_gene, gene_ids_to_gene = get_genes_by_symbol_and_id()
+                self._gene_reference = {
+                    'gene_symbols_to_gene': gene_symbols_to_gene,
+                    'gene_ids_to_gene': gene_ids_to_gene,
+                }
+        return self._gene_reference
+
+    @staticmethod
+    def _get_dependencies(source, updates):
+        dependencies = SOURCE_DEPENDENCIES.get(source, [])
+        if source in GENE_DEPENDENT_SOURCES:
+            dependencies = ['gencode'] + dependencies
+        return [dependency for dependency in dependencies if dependency in updates]
+
+    @staticmethod
+    def _run_update(source, update_func, durations):
+        start = time.perf_counter()
+        try:
+            update_func()
+        finally:
+            durations[source] = time.perf_counter() - start
+            connections.close_all()
+
+    def _run_updates(self, updates, max_parallel_updates, durations):
+        """Run each update once all the updates it depends on have succeeded, running independent updates in parallel.
+        Returns the sources which failed to update"""
+        pending = OrderedDict((source, self._get_dependencies(source, updates)) for source in updates.keys())
+        update_failed = set()
+        completed = set()
+        running = {}
+        with ThreadPoolExecutor(max_workers=max_parallel_updates) as executor:
+            while pending or running:
+                for source, dependencies in list(pending.items()):
+                    failed_dependencies = [dependency for dependency in dependencies if dependency in update_failed]
+                    if failed_dependencies:
+                        logger.error("unable to update {}: {} failed to update".format(source, ', '.join(failed_dependencies)))
+                        update_failed.add(source)
+                        del pending[source]
+                    elif all(dependency in completed for dependency in dependencies):
+                        running[executor.submit(self._run_update, source, updates[source], durations)] = source
+                        del pending[source]
+
+                if not running:
+                    continue
+                done, _ = wait(running.keys(), return_when=FIRST_COMPLETED)
+                for future in done:
+                    source = running.pop(future)
+                    try:
+                        future.result()
+                        completed.add(source)
+                    except Exception as e:
+                        logger.error("unable to update {}: {}".format(source, e))
+                        update_failed.add(source)
+
+        return update_failed
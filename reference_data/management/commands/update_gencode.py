@@ -3,7 +3,7 @@ import logging
 from django.core.management.base import BaseCommand
 
 from reference_data.management.commands.utils.gencode_utils import load_gencode_records, create_transcript_info, \
-    LATEST_GENCODE_RELEASE
+    update_gene_info, LATEST_GENCODE_RELEASE
 from reference_data.models import GeneInfo, TranscriptInfo, GENOME_VERSION_GRCh37, GENOME_VERSION_GRCh38
 
 logger = logging.getLogger(__name__)
@@ -36,7 +36,8 @@ def update_gencode(gencode_release, gencode_gtf_path=None, genome_version=None,
         genome_version (str): '37' or '38'. Required only if gencode_gtf_path is specified.
         reset (bool): If True, all records will be deleted from GeneInfo and TranscriptInfo before loading the new data.
             Setting this to False can be useful to sequentially load more than one gencode release so that data in the
-            tables represents the union of multiple gencode releases.
+            tables represents the union of multiple gencode releases. Previously loaded genes from an older gencode
+            release are updated with any changed fields, while genes loaded from a newer release are left unchanged.
     """
     if reset:
         logger.info("Dropping the {} existing TranscriptInfo entries".format(TranscriptInfo.objects.count()))
@@ -44,13 +45,16 @@ def update_gencode(gencode_release, gencode_gtf_path=None, genome_version=None,
         logger.info("Dropping the {} existing GeneInfo entries".format(GeneInfo.objects.count()))
         GeneInfo.objects.all().delete()
 
-    existing_gene_ids = {gene.gene_id for gene in GeneInfo.objects.all().only('gene_id')}
-    existing_transcript_ids = {
-        transcript.transcript_id for transcript in TranscriptInfo.objects.all().only('transcript_id')
-    }
+    newer_release_gene_ids = set(
+        GeneInfo.objects.filter(gencode_release__gt=gencode_release).values_list('gene_id', flat=True))
+    existing_transcript_ids = set(TranscriptInfo.objects.values_list('transcript_id', flat=True))
 
     new_genes, new_transcripts, counters = load_gencode_records(
-        gencode_release, gencode_gtf_path, genome_version, existing_gene_ids, existing_transcript_ids)
+        gencode_release, gencode_gtf_path, genome_version, newer_release_gene_ids, existing_transcript_ids)
+
+    updated_genes, _ = update_gene_info(new_genes, GeneInfo.objects.filter(gene_id__in=new_genes.keys()))
+    logger.info('Updated {} previously loaded GeneInfo records'.format(len(updated_genes)))
+    counters["genes_updated"] = len(updated_genes)
 
     logger.info('Creating {} GeneInfo records'.format(len(new_genes)))
     counters["genes_created"] = len(new_genes)
@@ -3,7 +3,7 @@ import logging
 from django.core.management.base import BaseCommand
 
 from reference_data.management.commands.utils.gencode_utils import load_gencode_records, create_transcript_info, \
-    LATEST_GENCODE_RELEASE
+    update_gene_info, LATEST_GENCODE_RELEASE
 from reference_data.management.commands.utils.update_utils import update_records
 from reference_data.management.commands.update_refseq import RefseqReferenceDataHandler
 from reference_data.models import GeneInfo, TranscriptInfo
@@ -25,24 +25,15 @@ class Command(BaseCommand):
 
         genes, transcripts, counters = load_gencode_records(LATEST_GENCODE_RELEASE)
 
-        genes_to_update = GeneInfo.objects.filter(gene_id__in=genes.keys())
-        fields = set()
-        symbol_changes = []
-        for existing in genes_to_update:
-            new_gene = genes.pop(existing.gene_id)
-            if track_symbol_change and new_gene['gene_symbol'] != existing.gene_symbol:
-                symbol_changes.append((existing.gene_id, existing.gene_symbol, new_gene['gene_symbol']))
-            fields.update(new_gene.keys())
-            for key, value in new_gene.items():
-                setattr(existing, key, value)
-
-        if symbol_changes:
+        existing_genes = GeneInfo.objects.filter(gene_id__in=genes.keys())
+        genes_to_update, symbol_changes = update_gene_info(genes, existing_genes, batch_size=BATCH_SIZE)
+
+        if track_symbol_change and symbol_changes:
             with open(f'{options.get("output_directory", ".")}/gene_symbol_changes.csv', 'w') as f:
                 f.writelines(sorted([f'{",".join(change)}\n' for change in symbol_changes]))
 
-        logger.info(f'Updating {len(genes_to_update)} previously loaded GeneInfo records')
+        logger.info(f'Updated {len(genes_to_update)} previously loaded GeneInfo records')
         counters['genes_updated'] = len(genes_to_update)
-        GeneInfo.objects.bulk_update(genes_to_update, fields, batch_size=BATCH_SIZE)
 
         logger.info('Creating {} GeneInfo records'.format(len(genes)))
         counters['genes_created'] = len(genes)
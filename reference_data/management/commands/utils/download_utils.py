@@ -1,3 +1,5 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
 import logging
 import os
 import requests
@@ -6,9 +8,16 @@ from tqdm import tqdm
 
 logger = logging.getLogger(__name__)
 
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_PARALLEL_DOWNLOADS = 4
+METADATA_FILE_SUFFIX = '.download_metadata.json'
+
 
 def download_file(url, to_dir=tempfile.gettempdir(), verbose=True):
     """Download the given file and returns its local path.
+
+    A sidecar metadata file records the ETag, Last-Modified and size of the remote file, so that a previous download is
+    only re-used if the remote file is unchanged, and an interrupted download is resumed with an HTTP Range request.
      Args:
         url (string): HTTP or FTP url
      Returns:
@@ -18,30 +27,88 @@ def download_file(url, to_dir=tempfile.gettempdir(), verbose=True):
     if not (url and url.startswith(("http://", "https://"))):
         raise ValueError("Invalid url: {}".format(url))
     local_file_path = os.path.join(to_dir, os.path.basename(url))
-    remote_file_size = _get_remote_file_size(url)
-    if os.path.isfile(local_file_path) and os.path.getsize(local_file_path) == remote_file_size:
-        logger.info("Re-using {} previously downloaded from {}".format(local_file_path, url))
-        return local_file_path
-
-    is_gz = url.endswith(".gz")
-    response = requests.get(url, stream=is_gz)
-    input_iter = response if is_gz else response.iter_content()
+    metadata_file_path = '{}{}'.format(local_file_path, METADATA_FILE_SUFFIX)
+
+    remote_metadata, accepts_ranges = _get_remote_file_metadata(url)
+    has_validators = bool(remote_metadata['etag'] or remote_metadata['last_modified'])
+
+    resume_from = 0
+    if os.path.isfile(local_file_path):
+        local_metadata = _load_metadata(metadata_file_path) if has_validators else None
+        is_same_remote_file = local_metadata and all(local_metadata.get(k) == v for k, v in remote_metadata.items())
+        if is_same_remote_file and local_metadata.get('complete'):
+            logger.info("Re-using {} previously downloaded from {}".format(local_file_path, url))
+            return local_file_path
+        elif is_same_remote_file and accepts_ranges:
+            resume_from = os.path.getsize(local_file_path)
+            if resume_from and resume_from == remote_metadata['size']:
+                # The download finished but was interrupted before it was recorded as complete
+                _write_metadata(metadata_file_path, remote_metadata, complete=True)
+                logger.info("Re-using {} previously downloaded from {}".format(local_file_path, url))
+                return local_file_path
+        elif not has_validators and os.path.getsize(local_file_path) == remote_metadata['size']:
+            logger.info("Re-using {} previously downloaded from {}".format(local_file_path, url))
+            return local_file_path
+
+    _write_metadata(metadata_file_path, remote_metadata, complete=False)
+
+    headers = {'Accept-Encoding': 'identity'}
+    if resume_from:
+        headers.update({
+            'Range': 'bytes={}-'.format(resume_from),
+            'If-Range': remote_metadata['etag'] or remote_metadata['last_modified'],
+        })
+    response = requests.get(url, stream=True, headers=headers)
+    if resume_from and response.status_code == 416:
+        # The requested range is not satisfiable for the remote file, so restart the download from the beginning
+        resume_from = 0
+        response = requests.get(url, stream=True, headers={'Accept-Encoding': 'identity'})
+    response.raise_for_status()
+    if response.status_code != 206:
+        resume_from = 0
+
+    input_iter = response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE)
     if verbose:
-        logger.info("Downloading {} to {}".format(url, local_file_path))
-        input_iter = tqdm(input_iter, unit=" data" if is_gz else " lines")
+        if resume_from:
+            logger.info("Resuming download of {} to {} from byte {}".format(url, local_file_path, resume_from))
+        else:
+            logger.info("Downloading {} to {}".format(url, local_file_path))
+        input_iter = tqdm(input_iter, unit=' MB', initial=resume_from // DOWNLOAD_CHUNK_SIZE)
 
-    with open(local_file_path, 'wb') as f:
-        f.writelines(input_iter)
+    with open(local_file_path, 'ab' if resume_from else 'wb') as f:
+        for chunk in input_iter:
+            f.write(chunk)
 
     input_iter.close()
+    _write_metadata(metadata_file_path, remote_metadata, complete=True)
 
     return local_file_path
 
 
-def _get_remote_file_size(url):
-    if url.startswith("http"):
-        response = requests.head(url)
-        return int(response.headers.get('Content-Length', '0'))
-    else:
-        return 0  # file size not yet implemented for FTP and other protocols
+def download_files(urls, to_dir=tempfile.gettempdir(), verbose=True):
+    """Download the given files in parallel and returns their local paths, in the same order as the given urls"""
+    with ThreadPoolExecutor(max_workers=min(len(urls), MAX_PARALLEL_DOWNLOADS) or 1) as executor:
+        return list(executor.map(lambda url: download_file(url, to_dir=to_dir, verbose=verbose), urls))
+
+
+def _get_remote_file_metadata(url):
+    response = requests.head(url, headers={'Accept-Encoding': 'identity'}, allow_redirects=True)
+    return {
+        'url': url,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'size': int(response.headers.get('Content-Length', '0')),
+    }, response.headers.get('Accept-Ranges') == 'bytes'
+
+
+def _load_metadata(metadata_file_path):
+    try:
+        with open(metadata_file_path, 'r') as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
+
 
+def _write_metadata(metadata_file_path, metadata, complete):
+    with open(metadata_file_path, 'w') as f:
+        json.dump(dict(complete=complete, **metadata), f)
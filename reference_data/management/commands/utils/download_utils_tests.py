@@ -1,10 +1,16 @@
+import gzip
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
 import mock
+import os
+import requests
 import responses
+import threading
 
 import tempfile
 import shutil
 
-from reference_data.management.commands.utils.download_utils import download_file
+from reference_data.management.commands.utils.download_utils import download_file, download_files
 
 from django.test import TestCase
 
@@ -53,3 +59,173 @@ class DownloadUtilsTest(TestCase):
             line2 = f.readline()
         self.assertEqual(line1, "test data\n")
         self.assertEqual(line2, "another line\n")
+
+
+class _RangeRequestHandler(BaseHTTPRequestHandler):
+    """Serves files from memory, with support for ETag validation and Range requests"""
+    files = {}
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def _send_headers(self):
+        content, etag = self.files.get(self.path, (None, None))
+        self.requests.append((self.command, self.path, self.headers.get('Range'), self.headers.get('If-Range')))
+        if content is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return b''
+
+        range_header = self.headers.get('Range')
+        if range_header and self.headers.get('If-Range') == etag:
+            start = int(range_header.replace('bytes=', '').rstrip('-'))
+            if start >= len(content):
+                self.send_response(416)
+                self.send_header('Content-Range', 'bytes */{}'.format(len(content)))
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return b''
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, len(content) - 1, len(content)))
+            content = content[start:]
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(content)))
+        self.send_header('ETag', etag)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        return content
+
+    def do_HEAD(self):
+        self._send_headers()
+
+    def do_GET(self):
+        self.wfile.write(self._send_headers())
+
+
+class DownloadUtilsLocalServerTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('localhost', 0), _RangeRequestHandler)
+        cls.url = 'http://localhost:{}'.format(cls.server.server_address[1])
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        _RangeRequestHandler.files = {
+            '/test_file.gz': (gzip.compress(b'test data\n' * 1000), '"v1"'),
+            '/other_file.txt': (b'other data\n', '"v1"'),
+        }
+        _RangeRequestHandler.requests = []
+        patcher = mock.patch('reference_data.management.commands.utils.download_utils.logger')
+        self.mock_logger = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _read_file(self, file_name):
+        with open(os.path.join(self.test_dir, file_name), 'rb') as f:
+            return f.read()
+
+    @mock.patch('reference_data.management.commands.utils.download_utils.DOWNLOAD_CHUNK_SIZE', 100)
+    def test_download_file(self):
+        url = f'{self.url}/test_file.gz'
+        file_path = download_file(url, self.test_dir)
+        self.assertEqual(file_path, os.path.join(self.test_dir, 'test_file.gz'))
+        self.assertEqual(self._read_file('test_file.gz'), _RangeRequestHandler.files['/test_file.gz'][0])
+        self.mock_logger.info.assert_called_with(f'Downloading {url} to {file_path}')
+        with open(f'{file_path}.download_metadata.json') as f:
+            self.assertDictEqual(json.load(f), {
+                'url': url, 'etag': '"v1"', 'last_modified': None, 'complete': True,
+                'size': len(_RangeRequestHandler.files['/test_file.gz'][0]),
+            })
+
+        # Test re-using an unchanged file only makes a HEAD request
+        _RangeRequestHandler.requests = []
+        self.assertEqual(download_file(url, self.test_dir), file_path)
+        self.mock_logger.info.assert_called_with(f'Re-using {file_path} previously downloaded from {url}')
+        self.assertListEqual(_RangeRequestHandler.requests, [('HEAD', '/test_file.gz', None, None)])
+
+        # Test resuming an interrupted download
+        content = _RangeRequestHandler.files['/test_file.gz'][0]
+        with open(file_path, 'wb') as f:
+            f.write(content[:50])
+        with open(f'{file_path}.download_metadata.json') as f:
+            metadata = json.load(f)
+        with open(f'{file_path}.download_metadata.json', 'w') as f:
+            json.dump({**metadata, 'complete': False}, f)
+        _RangeRequestHandler.requests = []
+        self.assertEqual(download_file(url, self.test_dir), file_path)
+        self.assertEqual(self._read_file('test_file.gz'), content)
+        self.mock_logger.info.assert_called_with(f'Resuming download of {url} to {file_path} from byte 50')
+        self.assertListEqual(_RangeRequestHandler.requests, [
+            ('HEAD', '/test_file.gz', None, None), ('GET', '/test_file.gz', 'bytes=50-', '"v1"'),
+        ])
+
+        # Test resuming a download which finished before it was recorded as complete
+        with open(f'{file_path}.download_metadata.json', 'w') as f:
+            json.dump({**metadata, 'complete': False}, f)
+        _RangeRequestHandler.requests = []
+        self.assertEqual(download_file(url, self.test_dir), file_path)
+        self.assertEqual(self._read_file('test_file.gz'), content)
+        self.mock_logger.info.assert_called_with(f'Re-using {file_path} previously downloaded from {url}')
+        self.assertListEqual(_RangeRequestHandler.requests, [('HEAD', '/test_file.gz', None, None)])
+        with open(f'{file_path}.download_metadata.json') as f:
+            self.assertTrue(json.load(f)['complete'])
+
+        # Test resuming from beyond the end of the remote file restarts the download
+        with open(file_path, 'ab') as f:
+            f.write(b'extra')
+        with open(f'{file_path}.download_metadata.json', 'w') as f:
+            json.dump({**metadata, 'complete': False}, f)
+        _RangeRequestHandler.requests = []
+        self.assertEqual(download_file(url, self.test_dir), file_path)
+        self.assertEqual(self._read_file('test_file.gz'), content)
+        self.mock_logger.info.assert_called_with(f'Downloading {url} to {file_path}')
+        self.assertListEqual(_RangeRequestHandler.requests, [
+            ('HEAD', '/test_file.gz', None, None), ('GET', '/test_file.gz', f'bytes={len(content) + 5}-', '"v1"'),
+            ('GET', '/test_file.gz', None, None),
+        ])
+
+        # Test re-downloading a file without metadata
+        os.remove(f'{file_path}.download_metadata.json')
+        _RangeRequestHandler.requests = []
+        self.assertEqual(download_file(url, self.test_dir), file_path)
+        self.assertEqual(self._read_file('test_file.gz'), content)
+        self.assertEqual(len(_RangeRequestHandler.requests), 2)
+
+        # Test re-downloading a changed file
+        _RangeRequestHandler.files['/test_file.gz'] = (b'new data\n', '"v2"')
+        with open(file_path, 'wb') as f:
+            f.write(b'new')
+        _RangeRequestHandler.requests = []
+        self.assertEqual(download_file(url, self.test_dir), file_path)
+        self.assertEqual(self._read_file('test_file.gz'), b'new data\n')
+        self.mock_logger.info.assert_called_with(f'Downloading {url} to {file_path}')
+        self.assertListEqual(_RangeRequestHandler.requests, [
+            ('HEAD', '/test_file.gz', None, None), ('GET', '/test_file.gz', None, None),
+        ])
+
+        # Test missing file
+        with self.assertRaises(requests.exceptions.HTTPError):
+            download_file(f'{self.url}/missing_file.txt', self.test_dir)
+
+    def test_download_files(self):
+        file_paths = download_files([f'{self.url}/test_file.gz', f'{self.url}/other_file.txt'], self.test_dir, verbose=False)
+        self.assertListEqual(file_paths, [
+            os.path.join(self.test_dir, 'test_file.gz'), os.path.join(self.test_dir, 'other_file.txt'),
+        ])
+        self.assertEqual(self._read_file('test_file.gz'), _RangeRequestHandler.files['/test_file.gz'][0])
+        self.assertEqual(self._read_file('other_file.txt'), b'other data\n')
+        self.mock_logger.info.assert_not_called()
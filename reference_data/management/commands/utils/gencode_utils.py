@@ -1,12 +1,16 @@
 import collections
+from concurrent.futures import ProcessPoolExecutor
 import gzip
 import logging
+import multiprocessing
 import os
-from tqdm import tqdm
+import re
+import time
 
+import django
 from django.core.management.base import CommandError
 
-from reference_data.management.commands.utils.download_utils import download_file
+from reference_data.management.commands.utils.download_utils import download_files
 from reference_data.models import GeneInfo, TranscriptInfo, GENOME_VERSION_GRCh37, GENOME_VERSION_GRCh38
 
 logger = logging.getLogger(__name__)
@@ -20,6 +24,14 @@ GENCODE_URL_TEMPLATE = 'http://ftp.ebi.ac.uk/pub/databases/gencode/Gencode_human
 GENCODE_FILE_HEADER = [
     'chrom', 'source', 'feature_type', 'start', 'end', 'score', 'strand', 'phase', 'info'
 ]
+FEATURE_TYPE_INDEX = GENCODE_FILE_HEADER.index('feature_type')
+PARSED_FEATURE_TYPES = {'gene', 'transcript', 'CDS'}
+# Only the info attributes which are used are extracted
+INFO_FIELD_REGEX = re.compile(r'(?:^|\s)(gene_id|transcript_id|gene_name|gene_type|tag) "?([^";]*)"?;')
+
+# approximate number of characters of the GTF parsed in each process pool task
+GTF_CHUNK_SIZE = 8 * 1024 * 1024
+MAX_GTF_PARSE_PROCESSES = 4
 
 
 def _get_valid_gencode_gtf_paths(gencode_release, gencode_gtf_path, genome_version):
@@ -47,10 +59,8 @@ def _get_valid_gencode_gtf_paths(gencode_release, gencode_gtf_path, genome_versi
                 ('37', GENCODE_URL_TEMPLATE.format(path='GRCh37_mapping/', file='lift37.annotation.gtf.gz', gencode_release=gencode_release)),
                 ('38', gtf_url),
             ]
-        gencode_gtf_paths = {}
-        for genome_version, url in urls:
-            local_filename = download_file(url)
-            gencode_gtf_paths.update({genome_version: local_filename})
+        local_filenames = download_files([url for _, url in urls])
+        gencode_gtf_paths = {genome_version: local_filename for (genome_version, _), local_filename in zip(urls, local_filenames)}
     return gencode_gtf_paths
 
 
@@ -63,44 +73,113 @@ def load_gencode_records(gencode_release, gencode_gtf_path=None, genome_version=
 
     for genome_version, gencode_gtf_path in gencode_gtf_paths.items():
         logger.info("Loading {} (genome version: {})".format(gencode_gtf_path, genome_version))
+        start = time.perf_counter()
+        num_records = 0
         with gzip.open(gencode_gtf_path, 'rt') as gencode_file:
-            for i, line in enumerate(tqdm(gencode_file, unit=' gencode records')):
-                _parse_line(
-                    line, i, new_genes, new_transcripts, existing_gene_ids or set(), existing_transcript_ids or set(),
+            for record in _parse_gtf_records(gencode_file):
+                num_records += 1
+                _add_record(
+                    record, new_genes, new_transcripts, existing_gene_ids or set(), existing_transcript_ids or set(),
                     counters, genome_version, gencode_release)
+        duration = time.perf_counter() - start
+        logger.info("Parsed {} gencode records in {:.1f} seconds ({:.0f} records/second)".format(
+            num_records, duration, num_records / duration if duration else 0))
 
     return new_genes, new_transcripts, counters
 
 
 def create_transcript_info(new_transcripts):
-    gene_id_to_gene_info = {g.gene_id: g for g in GeneInfo.objects.all().only('gene_id')}
+    gene_id_to_pk = dict(GeneInfo.objects.values_list('gene_id', 'id'))
     logger.info('Creating {} TranscriptInfo records'.format(len(new_transcripts)))
     TranscriptInfo.objects.bulk_create([
-        TranscriptInfo(gene=gene_id_to_gene_info[record.pop('gene_id')], **record) for record in
+        TranscriptInfo(gene_id=gene_id_to_pk[record.pop('gene_id')], **record) for record in
         new_transcripts.values()
     ], batch_size=50000)
 
 
-def _parse_line(line, i, new_genes, new_transcripts,  existing_gene_ids, existing_transcript_ids, counters, genome_version, gencode_release):
-    line = line.rstrip('\r\n')
-    if not line or line.startswith('#'):
+def update_gene_info(new_genes, existing_genes, batch_size=None):
+    """Update existing genes with any changed fields from the new gencode records, and return the (gene_id, old symbol,
+    new symbol) for every gene whose symbol changed. All existing genes are removed from new_genes, so only the records
+    still to be created remain"""
+    genes_to_update = []
+    fields = set()
+    symbol_changes = []
+    for existing in existing_genes:
+        new_gene = new_genes.pop(existing.gene_id)
+        changed_fields = {key for key, value in new_gene.items() if getattr(existing, key) != value}
+        if not changed_fields:
+            continue
+        if 'gene_symbol' in changed_fields:
+            symbol_changes.append((existing.gene_id, existing.gene_symbol, new_gene['gene_symbol']))
+        fields.update(changed_fields)
+        for key in changed_fields:
+            setattr(existing, key, new_gene[key])
+        genes_to_update.append(existing)
+
+    if genes_to_update:
+        GeneInfo.objects.bulk_update(genes_to_update, fields, batch_size=batch_size)
+    return genes_to_update, symbol_changes
+
+
+def _parse_gtf_records(gencode_file):
+    """Yields the parsed gene, transcript and CDS records in file order. When multiple CPUs are available, chunks of the
+    file are parsed in a process pool. Worker processes are spawned rather than forked, as this may run in a thread
+    alongside other reference data updates, and are set up as django processes so this module can be imported"""
+    num_processes = min(MAX_GTF_PARSE_PROCESSES, os.cpu_count() or 1)
+    if num_processes <= 1:
+        yield from _iter_gtf_records(gencode_file)
         return
-    fields = line.split('\t')
 
-    if len(fields) != len(GENCODE_FILE_HEADER):
-        raise ValueError("Unexpected number of fields on line #%s: %s" % (i, fields))
+    with ProcessPoolExecutor(
+            max_workers=num_processes, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup,
+    ) as executor:
+        futures = collections.deque()
+        for chunk in _iter_gtf_chunks(gencode_file):
+            futures.append(executor.submit(_parse_gtf_chunk, *chunk))
+            if len(futures) >= num_processes * 2:
+                yield from futures.popleft().result()
+        while futures:
+            yield from futures.popleft().result()
+
+
+def _iter_gtf_chunks(gencode_file):
+    first_line_index = 0
+    while True:
+        lines = gencode_file.readlines(GTF_CHUNK_SIZE)
+        if not lines:
+            return
+        yield ''.join(lines), first_line_index
+        first_line_index += len(lines)
 
-    record = dict(zip(GENCODE_FILE_HEADER, fields))
 
-    if record['feature_type'] not in ('gene', 'transcript', 'CDS'):
-        return
+def _parse_gtf_chunk(chunk, first_line_index):
+    return list(_iter_gtf_records(chunk.splitlines(), first_line_index))
+
+
+def _iter_gtf_records(lines, first_line_index=0):
+    for i, line in enumerate(lines, start=first_line_index):
+        line = line.rstrip('\r\n')
+        if not line or line.startswith('#'):
+            continue
+        fields = line.split('\t')
+
+        if len(fields) != len(GENCODE_FILE_HEADER):
+            raise ValueError("Unexpected number of fields on line #%s: %s" % (i, fields))
+
+        # Only parse the info field for the feature types which are used
+        if fields[FEATURE_TYPE_INDEX] not in PARSED_FEATURE_TYPES:
+            continue
+
+        record = dict(zip(GENCODE_FILE_HEADER, fields))
+        _parse_record(record)
+
+        if len(record["chrom"]) > 2:
+            continue  # skip super-contigs
 
-    # parse info field
-    _parse_record(record)
+        yield record
 
-    if len(record["chrom"]) > 2:
-        return  # skip super-contigs
 
+def _add_record(record, new_genes, new_transcripts, existing_gene_ids, existing_transcript_ids, counters, genome_version, gencode_release):
     if record['feature_type'] == 'gene':
         if record["gene_id"] in existing_gene_ids:
             counters["genes_skipped"] += 1
@@ -129,10 +208,8 @@ def _parse_line(line, i, new_genes, new_transcripts,  existing_gene_ids, existin
 
 
 def _parse_record(record):
-    info_fields = [x.strip().split() for x in record['info'].split(';') if x != '']
     info_dict = {}
-    for k, v in info_fields:
-        v = v.strip('"')
+    for k, v in INFO_FIELD_REGEX.findall(record.pop('info')):
         if k == 'tag':
             if k not in info_dict:
                 info_dict[k] = []
@@ -1,15 +1,20 @@
+from io import StringIO
 import logging
 import os
 import gzip
+import time
 from tqdm import tqdm
 import traceback
 from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router, transaction
 from reference_data.management.commands.utils.download_utils import download_file
 from reference_data.management.commands.utils.gene_utils import get_genes_by_symbol_and_id
-from reference_data.models import GeneInfo
+from reference_data.models import GeneInfo, format_copy_value
 
 logger = logging.getLogger(__name__)
 
+COPY_BATCH_SIZE = 10000
+
 
 class ReferenceDataHandler(object):
 
@@ -21,15 +26,17 @@ class ReferenceDataHandler(object):
     keep_existing_records = False
     gene_key = 'gene'
 
-    def __init__(self, **kwargs):
+    def __init__(self, gene_reference=None, **kwargs):
         if GeneInfo.objects.count() == 0:
             raise CommandError("GeneInfo table is empty. Run './manage.py update_gencode' before running this command.")
 
-        gene_symbols_to_gene, gene_ids_to_gene = get_genes_by_symbol_and_id()
-        self.gene_reference = {
-            'gene_symbols_to_gene': gene_symbols_to_gene,
-            'gene_ids_to_gene': gene_ids_to_gene,
-        }
+        if gene_reference is None:
+            gene_symbols_to_gene, gene_ids_to_gene = get_genes_by_symbol_and_id()
+            gene_reference = {
+                'gene_symbols_to_gene': gene_symbols_to_gene,
+                'gene_ids_to_gene': gene_ids_to_gene,
+            }
+        self.gene_reference = gene_reference
 
     @staticmethod
     def parse_record(record):
@@ -67,6 +74,62 @@ class GeneCommand(BaseCommand):
         update_records(self.reference_data_handler(**options), file_path=options.get('file_path'), )
 
 
+class StagingTableLoader(object):
+    """Loads model records into a temporary staging table with COPY, so they can be swapped into the model's table
+    within a single short transaction"""
+
+    def __init__(self, model_cls, batch_size=None):
+        self.db = router.db_for_write(model_cls)
+        self.connection = connections[self.db]
+        self.batch_size = batch_size or COPY_BATCH_SIZE
+        self.fields = [field for field in model_cls._meta.concrete_fields if not field.primary_key]
+        quote_name = self.connection.ops.quote_name
+        self.table = quote_name(model_cls._meta.db_table)
+        self.staging_table = quote_name('{}_staging'.format(model_cls._meta.db_table))
+        self.columns = ', '.join(quote_name(field.column) for field in self.fields)
+
+    def __enter__(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS {}'.format(self.staging_table))
+            cursor.execute('CREATE TEMPORARY TABLE {} AS SELECT {} FROM {} WITH NO DATA'.format(
+                self.staging_table, self.columns, self.table))
+        return self
+
+    def __exit__(self, *args):
+        with self.connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS {}'.format(self.staging_table))
+
+    def _copy_rows(self, cursor, rows):
+        cursor.copy_expert(
+            'COPY {} ({}) FROM STDIN'.format(self.staging_table, self.columns), StringIO(''.join(rows)))
+
+    def load(self, models):
+        """Stream the given models into the staging table in batches, and return the number of loaded records"""
+        num_records = 0
+        rows = []
+        with self.connection.cursor() as cursor:
+            for model in models:
+                rows.append('\t'.join(
+                    format_copy_value(field, model, self.connection) for field in self.fields) + '\n')
+                if len(rows) >= self.batch_size:
+                    self._copy_rows(cursor, rows)
+                    num_records += len(rows)
+                    rows = []
+            if rows:
+                self._copy_rows(cursor, rows)
+                num_records += len(rows)
+        return num_records
+
+    def swap_in(self, keep_existing_records=False):
+        """Replace the records in the model's table with the staged records. This must be run inside a transaction so
+        the table is never visible empty"""
+        with self.connection.cursor() as cursor:
+            if not keep_existing_records:
+                cursor.execute('DELETE FROM {}'.format(self.table))
+            cursor.execute('INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging_table}'.format(
+                table=self.table, columns=self.columns, staging_table=self.staging_table))
+
+
 def update_records(reference_data_handler, file_path=None):
     """
     Args:
@@ -81,43 +144,52 @@ def update_records(reference_data_handler, file_path=None):
     model_name = model_cls.__name__
     model_objects = getattr(model_cls, 'objects')
 
-    models = []
     skip_counter = 0
-    logger.info('Parsing file')
-    open_file = gzip.open if file_path.endswith('.gz') else open
-    open_mode = 'rt' if file_path.endswith('.gz') else 'r'
-    try:
-        with open_file(file_path, open_mode) as f:
-            header_fields = reference_data_handler.get_file_header(f)
 
-            for line in reference_data_handler.get_file_iterator(f):
-                record = dict(zip(header_fields, line if isinstance(line, list) else line.rstrip('\r\n').split('\t')))
-                for record in reference_data_handler.parse_record(record):
-                    if record is None:
-                        continue
+    def _parse_models(f):
+        nonlocal skip_counter
+        header_fields = reference_data_handler.get_file_header(f)
 
-                    try:
-                        record[reference_data_handler.gene_key] = reference_data_handler.get_gene_for_record(record)
-                    except ValueError as e:
-                        skip_counter += 1
-                        logger.debug(e)
-                        continue
+        for line in reference_data_handler.get_file_iterator(f):
+            record = dict(zip(header_fields, line if isinstance(line, list) else line.rstrip('\r\n').split('\t')))
+            for record in reference_data_handler.parse_record(record):
+                if record is None:
+                    continue
 
-                    models.append(model_cls(**record))
+                try:
+                    record[reference_data_handler.gene_key] = reference_data_handler.get_gene_for_record(record)
+                except ValueError as e:
+                    skip_counter += 1
+                    logger.debug(e)
+                    continue
 
-        if reference_data_handler.post_process_models:
-            reference_data_handler.post_process_models(models)
-
-        if not reference_data_handler.keep_existing_records:
-            logger.info("Deleting {} existing {} records".format(model_objects.count(), model_name))
-            model_objects.all().delete()
-
-        logger.info("Creating {} {} records".format(len(models), model_name))
-        model_objects.bulk_create(models)
+                yield model_cls(**record)
 
+    logger.info('Parsing file')
+    open_file = gzip.open if file_path.endswith('.gz') else open
+    open_mode = 'rt' if file_path.endswith('.gz') else 'r'
+    try:
+        start = time.perf_counter()
+        with open_file(file_path, open_mode) as f, StagingTableLoader(
+                model_cls, batch_size=reference_data_handler.batch_size) as loader:
+            models = _parse_models(f)
+            if reference_data_handler.post_process_models:
+                models = list(models)
+                reference_data_handler.post_process_models(models)
+
+            with transaction.atomic(using=loader.db):
+                num_records = loader.load(models)
+
+            with transaction.atomic(using=loader.db):
+                if not reference_data_handler.keep_existing_records:
+                    logger.info("Deleting {} existing {} records".format(model_objects.count(), model_name))
+                logger.info("Creating {} {} records".format(num_records, model_name))
+                loader.swap_in(keep_existing_records=reference_data_handler.keep_existing_records)
+
+        duration = time.perf_counter() - start
         logger.info("Done")
-        logger.info("Loaded {} {} records from {}. Skipped {} records with unrecognized genes.".format(
-            model_objects.count(), model_name, file_path, skip_counter))
+        logger.info("Loaded {} {} records from {} in {:.1f} seconds ({:.0f} records/second). Skipped {} records with unrecognized genes.".format(
+            model_objects.count(), model_name, file_path, duration, num_records / duration if duration else 0, skip_counter))
         if skip_counter > 0:
             logger.info('Running ./manage.py update_gencode to update the gencode version might fix missing genes')
     except Exception as e:
@@ -0,0 +1,50 @@
+from django.db import IntegrityError, transaction
+from django.test import TestCase
+
+from reference_data.management.commands.utils.update_utils import StagingTableLoader
+from reference_data.models import GenCC, GeneInfo, Omim
+
+
+class StagingTableLoaderTest(TestCase):
+    databases = '__all__'
+    fixtures = ['users', 'reference_data']
+
+    def test_load_and_swap_in(self):
+        gene = GeneInfo.objects.get(id=1)
+        models = [
+            Omim(gene=gene, mim_number=1, comments='a\ttab and a\nnewline', phenotype_description='back\\slash'),
+            Omim(gene=gene, mim_number=2, comments='', phenotype_mim_number=3),
+            Omim(gene=gene, mim_number=4, phenotype_map_method='2'),
+        ]
+        with StagingTableLoader(Omim, batch_size=2) as loader:
+            self.assertEqual(loader.load(iter(models)), 3)
+            self.assertEqual(Omim.objects.count(), 3)
+            with transaction.atomic(using=loader.db):
+                loader.swap_in()
+
+        self.assertListEqual(list(Omim.objects.order_by('mim_number').values(
+            'gene_id', 'mim_number', 'comments', 'phenotype_description', 'phenotype_mim_number', 'phenotype_map_method',
+        )), [
+            {'gene_id': 1, 'mim_number': 1, 'comments': 'a\ttab and a\nnewline', 'phenotype_description': 'back\\slash',
+             'phenotype_mim_number': None, 'phenotype_map_method': None},
+            {'gene_id': 1, 'mim_number': 2, 'comments': '', 'phenotype_description': None,
+             'phenotype_mim_number': 3, 'phenotype_map_method': None},
+            {'gene_id': 1, 'mim_number': 4, 'comments': None, 'phenotype_description': None,
+             'phenotype_mim_number': None, 'phenotype_map_method': '2'},
+        ])
+
+        # Test keeping existing records and json fields
+        with StagingTableLoader(GenCC) as loader:
+            loader.load([GenCC(gene=gene, hgnc_id='HGNC:1', classifications=[{'disease': 'A\tB', 'moi': None}])])
+            loader.swap_in(keep_existing_records=True)
+        self.assertEqual(GenCC.objects.count(), 2)
+        self.assertListEqual(
+            GenCC.objects.get(hgnc_id='HGNC:1').classifications, [{'disease': 'A\tB', 'moi': None}])
+
+        # Test a failed swap leaves the existing records in place
+        with StagingTableLoader(Omim) as loader:
+            loader.load([Omim(gene=gene, mim_number=None)])
+            with self.assertRaises(IntegrityError):
+                with transaction.atomic(using=loader.db):
+                    loader.swap_in()
+        self.assertEqual(Omim.objects.count(), 3)
@@ -1,4 +1,5 @@
 import gzip
+import itertools
 import mock
 import responses
 import tempfile
@@ -17,6 +18,10 @@ class ReferenceDataCommandTestCase(TestCase):
         patcher = mock.patch('reference_data.management.commands.utils.update_utils.logger')
         self.mock_logger = patcher.start()
         self.addCleanup(patcher.stop)
+        patcher = mock.patch('reference_data.management.commands.utils.update_utils.time')
+        mock_time = patcher.start()
+        mock_time.perf_counter.side_effect = itertools.cycle([0, 0.5])
+        self.addCleanup(patcher.stop)
 
         tmp_dir = tempfile.gettempdir()
         self.tmp_file = '{}/{}'.format(tmp_dir, self.URL.split('/')[-1])
@@ -43,8 +48,8 @@ class ReferenceDataCommandTestCase(TestCase):
             mock.call('Creating {} {} records'.format(created_records, model_name)),
             mock.call('Done'),
             mock.call(
-                'Loaded {} {} records from {}. Skipped {} records with unrecognized genes.'.format(
-                    created_records, model_name, self.tmp_file, skipped_records)),
+                'Loaded {} {} records from {} in 0.5 seconds ({} records/second). Skipped {} records with unrecognized '
+                'genes.'.format(created_records, model_name, self.tmp_file, created_records * 2, skipped_records)),
             mock.call('Running ./manage.py update_gencode to update the gencode version might fix missing genes')
         ]
         self.mock_logger.info.assert_has_calls(log_calls)
@@ -1,3 +1,4 @@
+from collections import OrderedDict
 import mock
 
 from django.core.management import call_command
@@ -5,17 +6,26 @@ from django.core.management.base import CommandError
 from django.test import TestCase
 
 
-def omim_exception(omim_key):
+def omim_exception(omim_key, **kwargs):
     raise Exception('Omim exception, key: '+omim_key)
 
 
-def primate_ai_exception():
+def primate_ai_exception(**kwargs):
     raise Exception('Primate_AI failed')
 
 
-def mgi_exception():
+def mgi_exception(**kwargs):
     raise Exception('MGI failed')
 
+
+def gencode_exception(*args, **kwargs):
+    raise Exception('Gencode failed')
+
+GENE_REFERENCE = {
+    'gene_symbols_to_gene': {'A': 'gene_a'},
+    'gene_ids_to_gene': {'ENSG1': 'gene_a'},
+}
+
 SKIP_ARGS = [
     '--skip-gencode', '--skip-dbnsfp-gene', '--skip-gene-constraint', '--skip-primate-ai', '--skip-mgi', '--skip-hpo',
     '--skip-gene-cn-sensitivity', '--skip-gencc', '--skip-clingen', '--skip-refseq',
@@ -26,22 +36,22 @@ class UpdateAllReferenceDataTest(TestCase):
     fixtures = ['users', 'reference_data']
 
     def setUp(self):
-        patcher = mock.patch('reference_data.management.commands.update_dbnsfp_gene.DbNSFPReferenceDataHandler', lambda: 'dbnsfp_gene')
+        patcher = mock.patch('reference_data.management.commands.update_dbnsfp_gene.DbNSFPReferenceDataHandler', lambda **kwargs: 'dbnsfp_gene')
         patcher.start()
         self.addCleanup(patcher.stop)
-        patcher = mock.patch('reference_data.management.commands.update_gene_cn_sensitivity.CNSensitivityReferenceDataHandler', lambda: 'gene_cn_sensitivity')
+        patcher = mock.patch('reference_data.management.commands.update_gene_cn_sensitivity.CNSensitivityReferenceDataHandler', lambda **kwargs: 'gene_cn_sensitivity')
         patcher.start()
         self.addCleanup(patcher.stop)
-        patcher = mock.patch('reference_data.management.commands.update_gene_constraint.GeneConstraintReferenceDataHandler', lambda: 'gene_constraint')
+        patcher = mock.patch('reference_data.management.commands.update_gene_constraint.GeneConstraintReferenceDataHandler', lambda **kwargs: 'gene_constraint')
         patcher.start()
         self.addCleanup(patcher.stop)
-        patcher = mock.patch('reference_data.management.commands.update_gencc.GenCCReferenceDataHandler', lambda: 'gencc')
+        patcher = mock.patch('reference_data.management.commands.update_gencc.GenCCReferenceDataHandler', lambda **kwargs: 'gencc')
         patcher.start()
         self.addCleanup(patcher.stop)
-        patcher = mock.patch('reference_data.management.commands.update_clingen.ClinGenReferenceDataHandler', lambda: 'clingen')
+        patcher = mock.patch('reference_data.management.commands.update_clingen.ClinGenReferenceDataHandler', lambda **kwargs: 'clingen')
         patcher.start()
         self.addCleanup(patcher.stop)
-        patcher = mock.patch('reference_data.management.commands.update_refseq.RefseqReferenceDataHandler', lambda: 'refseq')
+        patcher = mock.patch('reference_data.management.commands.update_refseq.RefseqReferenceDataHandler', lambda **kwargs: 'refseq')
         patcher.start()
         self.addCleanup(patcher.stop)
 
@@ -70,6 +80,13 @@ class UpdateAllReferenceDataTest(TestCase):
         patcher = mock.patch('reference_data.management.commands.update_all_reference_data.logger')
         self.mock_logger = patcher.start()
         self.addCleanup(patcher.stop)
+        patcher = mock.patch('reference_data.management.commands.update_all_reference_data.get_genes_by_symbol_and_id')
+        self.mock_get_genes = patcher.start()
+        self.mock_get_genes.return_value = ({'A': 'gene_a'}, {'ENSG1': 'gene_a'})
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('reference_data.management.commands.update_all_reference_data.time')
+        patcher.start().perf_counter.return_value = 0
+        self.addCleanup(patcher.stop)
 
     def test_update_all_reference_data_command(self):
 
@@ -92,8 +109,9 @@ class UpdateAllReferenceDataTest(TestCase):
         ]
         self.mock_update_gencode.assert_has_calls(calls)
 
-        self.mock_omim.assert_called_with('test_key')
+        self.mock_omim.assert_called_with(omim_key='test_key', gene_reference=GENE_REFERENCE)
         self.mock_cached_omim.assert_not_called()
+        self.mock_get_genes.assert_called_once()
 
         self.assertEqual(self.mock_update_records.call_count, 7)
         calls = [
@@ -105,11 +123,22 @@ class UpdateAllReferenceDataTest(TestCase):
             mock.call('clingen'),
             mock.call('refseq'),
         ]
-        self.mock_update_records.assert_has_calls(calls)
+        self.mock_update_records.assert_has_calls(calls, any_order=True)
 
         self.mock_update_hpo.assert_called_with()
 
         calls = [
+            mock.call('gencode: updated in 0.0 seconds'),
+            mock.call('omim: updated in 0.0 seconds'),
+            mock.call('dbnsfp_gene: updated in 0.0 seconds'),
+            mock.call('gene_constraint: updated in 0.0 seconds'),
+            mock.call('gene_cn_sensitivity: updated in 0.0 seconds'),
+            mock.call('primate_ai: failed in 0.0 seconds'),
+            mock.call('mgi: failed in 0.0 seconds'),
+            mock.call('gencc: updated in 0.0 seconds'),
+            mock.call('clingen: updated in 0.0 seconds'),
+            mock.call('refseq: updated in 0.0 seconds'),
+            mock.call('hpo: updated in 0.0 seconds'),
             mock.call('Done'),
             mock.call('Updated: gencode, omim, dbnsfp_gene, gene_constraint, gene_cn_sensitivity, gencc, clingen, refseq, hpo'),
             mock.call('Failed to Update: primate_ai, mgi')
@@ -120,7 +149,43 @@ class UpdateAllReferenceDataTest(TestCase):
             mock.call('unable to update primate_ai: Primate_AI failed'),
             mock.call('unable to update mgi: MGI failed')
         ]
-        self.mock_logger.error.assert_has_calls(calls)
+        self.mock_logger.error.assert_has_calls(calls, any_order=True)
+
+        # Test sources are not updated if the sources they depend on fail
+        self.mock_update_records.reset_mock()
+        self.mock_update_hpo.reset_mock()
+        self.mock_update_gencode.reset_mock()
+        self.mock_logger.reset_mock()
+        self.mock_update_gencode.side_effect = gencode_exception
+        call_command(
+            'update_all_reference_data', '--omim-key=test_key', '--skip-primate-ai', '--skip-mgi', '--skip-gencc',
+            '--skip-clingen', '--skip-refseq', '--skip-gene-cn-sensitivity', '--max-parallel-updates=1')
+
+        self.mock_update_gencode.assert_called_once_with(39, reset=True)
+        self.mock_update_records.assert_not_called()
+        self.mock_update_hpo.assert_called_with()
+        self.mock_logger.error.assert_has_calls([
+            mock.call('unable to update gencode: Gencode failed'),
+            mock.call('unable to update omim: gencode failed to update'),
+            mock.call('unable to update dbnsfp_gene: gencode failed to update'),
+            mock.call('unable to update gene_constraint: gencode failed to update'),
+        ])
+        self.mock_logger.info.assert_has_calls([
+            mock.call('Done'),
+            mock.call('Updated: hpo'),
+            mock.call('Failed to Update: gencode, omim, dbnsfp_gene, gene_constraint'),
+        ])
+
+    def test_update_source_dependencies(self):
+        # mgi is only updated once dbnsfp_gene is loaded
+        updated = []
+        self.mock_update_records.side_effect = lambda handler: updated.append(handler)
+        with mock.patch(
+            'reference_data.management.commands.update_all_reference_data.REFERENCE_DATA_SOURCES',
+            OrderedDict([('mgi', lambda **kwargs: 'mgi'), ('dbnsfp_gene', lambda **kwargs: 'dbnsfp_gene')]),
+        ):
+            call_command('update_all_reference_data', '--skip-omim', '--skip-gencode')
+        self.assertListEqual(updated, ['dbnsfp_gene', 'mgi'])
 
     def test_skip_all_update_reference_data_command(self):
         call_command(
@@ -139,7 +204,7 @@ class UpdateAllReferenceDataTest(TestCase):
         call_command(
             'update_all_reference_data', '--use-cached-omim', *SKIP_ARGS)
 
-        self.mock_cached_omim.assert_called_with()
+        self.mock_cached_omim.assert_called_with(gene_reference=GENE_REFERENCE)
         self.mock_update_records.assert_called_with('cached_omim')
 
         self.mock_omim.assert_not_called()
@@ -157,7 +222,7 @@ class UpdateAllReferenceDataTest(TestCase):
         call_command('update_all_reference_data', '--omim=test_key', *SKIP_ARGS)
 
         self.mock_update_gencode.assert_not_called()
-        self.mock_omim.assert_called_with('test_key')
+        self.mock_omim.assert_called_with(omim_key='test_key', gene_reference=GENE_REFERENCE)
         self.mock_update_records.assert_not_called()
         self.mock_update_hpo.assert_not_called()
 
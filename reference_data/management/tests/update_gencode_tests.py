@@ -1,3 +1,4 @@
+from itertools import cycle
 import mock
 import os
 import responses
@@ -49,6 +50,10 @@ class UpdateGencodeTest(TestCase):
     fixtures = ['users', 'reference_data']
 
     def setUp(self):
+        patcher = mock.patch('reference_data.management.commands.utils.gencode_utils.time')
+        patcher.start().perf_counter.side_effect = cycle([0, 0.5])
+        self.addCleanup(patcher.stop)
+
         # Create a temporary directory
         self.test_dir = tempfile.mkdtemp()
         self.temp_file_path = os.path.join(self.test_dir, 'gencode.v31lift37.annotation.gtf.gz')
@@ -149,8 +154,8 @@ class UpdateGencodeTest(TestCase):
         responses.add(responses.HEAD, url_23_lift, headers={"Content-Length": "1024"})
         responses.add(responses.GET, url_23_lift, body=self.gzipped_gtf_data, stream=True)
         call_command('update_gencode', '--gencode-release=23')
-        self.assertEqual(responses.calls[0].request.url, url_23_lift)
-        self.assertEqual(responses.calls[2].request.url, url_23)
+        # Files are downloaded in parallel, so may be requested in any order
+        self.assertSetEqual({call.request.url for call in responses.calls}, {url_23_lift, url_23})
 
     def _has_expected_new_genes(self, expected_release=None):
         gene_info = GeneInfo.objects.get(gene_id='ENSG00000223972')
@@ -191,41 +196,69 @@ class UpdateGencodeTest(TestCase):
     @mock.patch('reference_data.management.commands.update_gencode_transcripts.logger')
     @mock.patch('reference_data.management.commands.update_gencode.logger')
     def test_update_gencode_command(self, mock_logger, mock_update_transcripts_logger, mock_utils_logger):
-        # Test normal command function
-        call_command('update_gencode', '--gencode-release=31', self.temp_file_path, '37')
+        # Test normal command function, with the file parsed in parallel chunks
+        with mock.patch('reference_data.management.commands.utils.gencode_utils.GTF_CHUNK_SIZE', 1), \
+                mock.patch('reference_data.management.commands.utils.gencode_utils.os.cpu_count') as mock_cpu_count:
+            mock_cpu_count.return_value = 2
+            call_command('update_gencode', '--gencode-release=31', self.temp_file_path, '37')
         mock_utils_logger.info.assert_has_calls([
             mock.call('Loading {} (genome version: 37)'.format(self.temp_file_path)),
+            mock.call('Parsed 5 gencode records in 0.5 seconds (10 records/second)'),
             mock.call('Creating 1 TranscriptInfo records'),
         ])
         calls = [
+            mock.call('Updated 1 previously loaded GeneInfo records'),
             mock.call('Creating 1 GeneInfo records'),
             mock.call('Done'),
             mock.call('Stats: '),
-            mock.call('  genes_skipped: 1'),
             mock.call('  transcripts_skipped: 1'),
+            mock.call('  genes_updated: 1'),
             mock.call('  genes_created: 1'),
             mock.call('  transcripts_created: 1')
         ]
         mock_logger.info.assert_has_calls(calls)
 
-        self._has_expected_new_genes()
+        # Genes from an older gencode release are updated with the changed fields
+        self._has_expected_new_genes(expected_release=31)
+        gene_info = GeneInfo.objects.get(gene_id='ENSG00000223972')
+        self.assertEqual(gene_info.gene_symbol, 'DDX11L1A')
+        self.assertEqual(gene_info.coding_region_size_grch37, 0)
 
         self.assertEqual(TranscriptInfo.objects.all().count(), 3)
         self._has_expected_new_transcripts(updated_existing_trancript=False)
 
+        # Test genes from a newer gencode release are not updated
+        mock_logger.reset_mock()
+        call_command('update_gencode', '--gencode-release=27', self.temp_file_path, '37')
+        mock_logger.info.assert_has_calls([
+            mock.call('Updated 0 previously loaded GeneInfo records'),
+            mock.call('Creating 0 GeneInfo records'),
+            mock.call('Done'),
+            mock.call('Stats: '),
+            mock.call('  genes_skipped: 2'),
+            mock.call('  transcripts_skipped: 2'),
+            mock.call('  genes_updated: 0'),
+            mock.call('  genes_created: 0'),
+            mock.call('  transcripts_created: 0')
+        ])
+        self._has_expected_new_genes(expected_release=31)
+
         # Test normal command function with a --reset option
         mock_logger.reset_mock()
         call_command('update_gencode', '--reset', '--gencode-release=39', self.temp_file_path, '37')
         mock_utils_logger.info.assert_has_calls([
             mock.call('Loading {} (genome version: 37)'.format(self.temp_file_path)),
+            mock.call('Parsed 5 gencode records in 0.5 seconds (10 records/second)'),
             mock.call('Creating 2 TranscriptInfo records'),
         ])
         calls = [
             mock.call('Dropping the 3 existing TranscriptInfo entries'),
             mock.call('Dropping the 52 existing GeneInfo entries'),
+            mock.call('Updated 0 previously loaded GeneInfo records'),
             mock.call('Creating 2 GeneInfo records'),
             mock.call('Done'),
             mock.call('Stats: '),
+            mock.call('  genes_updated: 0'),
             mock.call('  genes_created: 2'),
             mock.call('  transcripts_created: 2')
         ]
@@ -254,14 +287,14 @@ class UpdateGencodeTest(TestCase):
         self._has_expected_new_transcripts(expected_release=39)
         mock_utils_logger.info.assert_has_calls([
             mock.call('Loading {} (genome version: 37)'.format(self.temp_file_path)),
+            mock.call('Parsed 5 gencode records in 0.5 seconds (10 records/second)'),
             mock.call('Creating 2 TranscriptInfo records'),
         ])
         mock_update_transcripts_logger.info.assert_has_calls([
             mock.call('Dropping the 2 existing TranscriptInfo entries'),
         ])
 
-        self.assertEqual(responses.calls[0].request.url, url_lift)
-        self.assertEqual(responses.calls[2].request.url, url)
+        self.assertSetEqual({call.request.url for call in responses.calls}, {url_lift, url})
 
     @responses.activate
     @mock.patch('reference_data.management.commands.utils.update_utils.logger')
@@ -276,7 +309,7 @@ class UpdateGencodeTest(TestCase):
         call_command('update_gencode_latest', '--track-symbol-change', f'--output-dir={self.test_dir}')
         mock_gencode_utils_logger.info.assert_called_with('Creating 2 TranscriptInfo records')
         mock_logger.info.assert_has_calls([
-            mock.call('Updating 1 previously loaded GeneInfo records'),
+            mock.call('Updated 1 previously loaded GeneInfo records'),
             mock.call('Creating 1 GeneInfo records'),
             mock.call('Dropping 1 existing TranscriptInfo entries'),
             mock.call('Done'),
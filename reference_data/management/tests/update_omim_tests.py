@@ -1,3 +1,4 @@
+import itertools
 import mock
 
 import tempfile
@@ -72,6 +73,12 @@ class UpdateOmimTest(TestCase):
     databases = '__all__'
     fixtures = ['users', 'reference_data']
 
+    def setUp(self):
+        patcher = mock.patch('reference_data.management.commands.utils.update_utils.time')
+        mock_time = patcher.start()
+        mock_time.perf_counter.side_effect = itertools.cycle([0, 0.5])
+        self.addCleanup(patcher.stop)
+
     @responses.activate
     @mock.patch('reference_data.management.commands.utils.update_utils.logger')
     @mock.patch('reference_data.management.commands.update_omim.os')
@@ -156,7 +163,7 @@ class UpdateOmimTest(TestCase):
             mock.call('Deleting 3 existing Omim records'),
             mock.call('Creating 2 Omim records'),
             mock.call('Done'),
-            mock.call('Loaded 2 Omim records from {}. Skipped 2 records with unrecognized genes.'.format(tmp_file)),
+            mock.call('Loaded 2 Omim records from {} in 0.5 seconds (4 records/second). Skipped 2 records with unrecognized genes.'.format(tmp_file)),
             mock.call('Running ./manage.py update_gencode to update the gencode version might fix missing genes')
         ]
         mock_utils_logger.info.assert_has_calls(calls)
@@ -178,7 +185,7 @@ class UpdateOmimTest(TestCase):
             mock.call('Deleting 2 existing Omim records'),
             mock.call('Creating 2 Omim records'),
             mock.call('Done'),
-            mock.call('Loaded 2 Omim records from {}. Skipped 2 records with unrecognized genes.'.format(tmp_file)),
+            mock.call('Loaded 2 Omim records from {} in 0.5 seconds (4 records/second). Skipped 2 records with unrecognized genes.'.format(tmp_file)),
             mock.call('Running ./manage.py update_gencode to update the gencode version might fix missing genes')
         ]
         mock_utils_logger.info.assert_has_calls(calls)
@@ -227,7 +234,7 @@ class UpdateOmimTest(TestCase):
             mock.call('Deleting 3 existing Omim records'),
             mock.call('Creating 2 Omim records'),
             mock.call('Done'),
-            mock.call('Loaded 2 Omim records from {}. Skipped 0 records with unrecognized genes.'.format(tmp_file)),
+            mock.call('Loaded 2 Omim records from {} in 0.5 seconds (4 records/second). Skipped 0 records with unrecognized genes.'.format(tmp_file)),
         ]
         mock_utils_logger.info.assert_has_calls(calls)
 
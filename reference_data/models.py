@@ -14,6 +14,14 @@ GENOME_VERSION_CHOICES = [
 GENOME_VERSION_LOOKUP = {k: v for (k, v) in GENOME_VERSION_CHOICES}
 
 
+def format_copy_value(field, model, connection):
+    """Formats the model's value for the given field as a value in a tab-delimited postgres COPY row"""
+    value = field.get_db_prep_save(getattr(model, field.attname), connection=connection)
+    if value is None:
+        return '\\N'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
 class ReferenceDataRouter(object):
     """
     A router to control all database operations on reference data models
@@ -0,0 +1,35 @@
+import logging
+from django.core.management.base import BaseCommand
+
+from seqr.models import SavedVariant
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Populate the gene fields for saved variants from their saved variant json'
+
+    def handle(self, *args, **options):
+        saved_variants = SavedVariant.objects.order_by('id').only(
+            'id', 'saved_variant_json', 'selected_main_transcript_id', *SavedVariant.GENE_FIELDS)
+
+        num_updated = 0
+        to_update = []
+        for saved_variant in saved_variants.iterator(chunk_size=BATCH_SIZE):
+            gene_fields = [getattr(saved_variant, field) for field in SavedVariant.GENE_FIELDS]
+            saved_variant.update_gene_fields()
+            if gene_fields != [getattr(saved_variant, field) for field in SavedVariant.GENE_FIELDS]:
+                to_update.append(saved_variant)
+            if len(to_update) >= BATCH_SIZE:
+                num_updated += self._update_batch(to_update)
+                to_update = []
+        num_updated += self._update_batch(to_update)
+
+        logger.info(f'Updated gene fields for {num_updated} saved variants')
+
+    @staticmethod
+    def _update_batch(saved_variants):
+        SavedVariant.objects.bulk_update(saved_variants, SavedVariant.GENE_FIELDS)
+        return len(saved_variants)
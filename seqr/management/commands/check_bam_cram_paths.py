@@ -6,7 +6,7 @@ import tqdm
 
 from seqr.models import IgvSample
 from seqr.utils import communication_utils
-from seqr.utils.file_utils import does_file_exist
+from seqr.utils.file_utils import get_files_exist
 from settings import SEQR_SLACK_DATA_ALERTS_NOTIFICATION_CHANNEL
 
 logger = logging.getLogger(__name__)
@@ -36,8 +36,9 @@ class Command(BaseCommand):
         missing_counter = collections.defaultdict(int)
         guids_of_samples_with_missing_file = set()
         project_name_to_missing_paths = collections.defaultdict(list)
+        files_exist = get_files_exist([sample.file_path for sample in samples])
         for sample in tqdm.tqdm(samples, unit=" samples"):
-            if not does_file_exist(sample.file_path):
+            if not files_exist[sample.file_path]:
                 individual_id = sample.individual.individual_id
                 project_name = sample.individual.family.project.name
                 missing_counter[project_name] += 1
@@ -0,0 +1,21 @@
+import logging
+from django.core.management.base import BaseCommand
+
+from seqr.models import RnaSeqTpm
+from seqr.views.utils.rna_seq_tpm_utils import convert_rna_seq_tpm_rows_to_arrays
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Convert RNA-Seq TPM data from one row per gene to a single TPM array per sample'
+
+    def handle(self, *args, **options):
+        sample_ids = sorted(RnaSeqTpm.objects.values_list('sample_id', flat=True).distinct())
+        if not sample_ids:
+            logger.info('No RnaSeqTpm data to convert')
+            return
+
+        gene_index = convert_rna_seq_tpm_rows_to_arrays(None, sample_ids)
+        logger.info(f'Converted RnaSeqTpm data for {len(sample_ids)} samples to arrays '
+                    f'(gene index version {gene_index.version}, {len(gene_index.gene_ids)} genes)')
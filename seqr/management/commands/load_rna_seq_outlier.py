@@ -28,8 +28,8 @@ class Command(BaseCommand):
         }
         for sample_guid, data_by_gene in samples_to_load.items():
             sample_data = sample_id_map[sample_guid]
-            models = RnaSeqOutlier.objects.bulk_create(
-                [RnaSeqOutlier(sample_id=sample_data['id'], **data) for data in data_by_gene.values()])
-            logger.info(f'create {len(models)} RnaSeqOutliers for {sample_data["sample_id"]}')
+            num_created = RnaSeqOutlier.bulk_copy_create(
+                None, (RnaSeqOutlier(sample_id=sample_data['id'], **data) for data in data_by_gene.values()))
+            logger.info(f'create {num_created} RnaSeqOutliers for {sample_data["sample_id"]}')
 
 
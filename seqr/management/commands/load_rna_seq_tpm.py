@@ -39,9 +39,9 @@ class Command(BaseCommand):
         }
         for sample_guid, data_by_gene in samples_to_load.items():
             sample_data = sample_id_map[sample_guid]
-            models = RnaSeqTpm.objects.bulk_create(
-                [RnaSeqTpm(sample_id=sample_data['id'], **data) for data in data_by_gene.values()], batch_size=1000)
-            logger.info(f'create {len(models)} RnaSeqTpm for {sample_data["sample_id"]}')
+            num_created = RnaSeqTpm.bulk_copy_create(
+                None, (RnaSeqTpm(sample_id=sample_data['id'], **data) for data in data_by_gene.values()))
+            logger.info(f'create {num_created} RnaSeqTpm for {sample_data["sample_id"]}')
 
         logger.info('DONE')
 
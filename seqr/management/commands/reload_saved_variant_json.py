@@ -1,4 +1,5 @@
 import logging
+import os
 from django.core.management.base import BaseCommand
 from django.db.models.query_utils import Q
 from tqdm import tqdm
@@ -15,11 +16,15 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument('projects', nargs="*", help='Project(s) to transfer. If not specified, defaults to all projects.')
         parser.add_argument('--family-id', help='optional family to reload variants for')
+        parser.add_argument(
+            '--progress-file', help='optional file to record reloaded projects in. If the file already exists, the '
+                                    'projects recorded in it are skipped, so an interrupted reload can be resumed')
 
     def handle(self, *args, **options):
         """transfer project"""
         projects_to_process = options['projects']
         family_id = options['family_id']
+        progress_file = options['progress_file']
 
         if projects_to_process:
             projects = Project.objects.filter(Q(name__in=projects_to_process) | Q(guid__in=projects_to_process))
@@ -28,6 +33,12 @@ class Command(BaseCommand):
             projects = Project.objects.all()
             logging.info("Processing all %s projects" % len(projects))
 
+        if progress_file and os.path.exists(progress_file):
+            with open(progress_file) as f:
+                completed_project_guids = {line.strip() for line in f if line.strip()}
+            projects = [project for project in projects if project.guid not in completed_project_guids]
+            logger.info('Resuming from {0}, {1} projects remaining'.format(progress_file, len(projects)))
+
         success = {}
         error = {}
         for project in tqdm(projects, unit=" projects"):
@@ -36,6 +47,9 @@ class Command(BaseCommand):
                 updated_saved_variant_guids = update_project_saved_variant_json(project, family_id=family_id)
                 success[project.name] = len(updated_saved_variant_guids)
                 logger.info('Updated {0} variants for project {1}'.format(len(updated_saved_variant_guids), project.name))
+                if progress_file:
+                    with open(progress_file, 'a') as f:
+                        f.write('{}\n'.format(project.guid))
             except Exception as e:
                 traceback_message = traceback.format_exc()
                 logger.error(traceback_message)
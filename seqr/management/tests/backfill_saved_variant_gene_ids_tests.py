@@ -0,0 +1,31 @@
+import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from seqr.models import SavedVariant
+
+
+class BackfillSavedVariantGeneIdsTest(TestCase):
+    fixtures = ['users', '1kg_project']
+
+    @mock.patch('seqr.management.commands.backfill_saved_variant_gene_ids.BATCH_SIZE', 2)
+    @mock.patch('seqr.management.commands.backfill_saved_variant_gene_ids.logger')
+    def test_command(self, mock_logger):
+        expected_gene_fields = {
+            sv.guid: (sv.gene_ids, sv.main_transcript_gene_id) for sv in SavedVariant.objects.all()
+        }
+        SavedVariant.objects.update(gene_ids=[], main_transcript_gene_id=None)
+
+        call_command('backfill_saved_variant_gene_ids')
+        mock_logger.info.assert_called_with('Updated gene fields for 6 saved variants')
+        self.assertDictEqual(
+            {sv.guid: (sv.gene_ids, sv.main_transcript_gene_id) for sv in SavedVariant.objects.all()},
+            expected_gene_fields,
+        )
+        self.assertListEqual(SavedVariant.objects.get(id=7).gene_ids, [
+            'ENSG00000135953', 'ENSG00000223972', 'ENSG00000240361'])
+        self.assertEqual(SavedVariant.objects.get(id=6).main_transcript_gene_id, 'ENSG00000240361')
+
+        call_command('backfill_saved_variant_gene_ids')
+        mock_logger.info.assert_called_with('Updated gene fields for 0 saved variants')
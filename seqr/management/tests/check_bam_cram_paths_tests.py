@@ -13,12 +13,16 @@ class CheckBamCramPathsTest(TestCase):
     fixtures = ['users', '1kg_project']
 
     def test_command_with_project(self, mock_logger, mock_safe_post_to_slack, mock_subprocess):
-        mock_subprocess.return_value.wait.side_effect = [-1, 0]
+        mock_subprocess.return_value.communicate.return_value = (
+            b'gs://datasets-gcnv/NA20870.bed.gz\n', b'CommandException: One or more URLs matched no objects.\n',
+        )
         call_command('check_bam_cram_paths', '1kg project n\u00e5me with uni\u00e7\u00f8de')
         self._check_results(True, mock_logger, mock_safe_post_to_slack, mock_subprocess)
 
     def test_command_with_other_project(self, mock_logger, mock_safe_post_to_slack, mock_subprocess):
-        mock_subprocess.return_value.wait.side_effect = [-1, 0]
+        mock_subprocess.return_value.communicate.return_value = (
+            b'gs://datasets-gcnv/NA20870.bed.gz\n', b'CommandException: One or more URLs matched no objects.\n',
+        )
         call_command('check_bam_cram_paths', '1kg project')
         self.assertEqual(IgvSample.objects.count(), 3)
 
@@ -29,12 +33,16 @@ class CheckBamCramPathsTest(TestCase):
         mock_logger.info.assert_has_calls(calls)
 
     def test_command(self, mock_logger, mock_safe_post_to_slack, mock_subprocess):
-        mock_subprocess.return_value.wait.side_effect = [-1, 0]
+        mock_subprocess.return_value.communicate.return_value = (
+            b'gs://datasets-gcnv/NA20870.bed.gz\n', b'CommandException: One or more URLs matched no objects.\n',
+        )
         call_command('check_bam_cram_paths')
         self._check_results(True, mock_logger, mock_safe_post_to_slack, mock_subprocess)
 
     def test_dry_run_arg(self, mock_logger, mock_safe_post_to_slack, mock_subprocess):
-        mock_subprocess.return_value.wait.side_effect = [-1, 0]
+        mock_subprocess.return_value.communicate.return_value = (
+            b'gs://datasets-gcnv/NA20870.bed.gz\n', b'CommandException: One or more URLs matched no objects.\n',
+        )
         call_command('check_bam_cram_paths', '--dry-run')
         self._check_results(False, mock_logger, mock_safe_post_to_slack, mock_subprocess)
 
@@ -45,10 +53,8 @@ class CheckBamCramPathsTest(TestCase):
             expected_remaining_files.append('gs://readviz/NA20870.cram')
         self.assertListEqual(sorted(igv_file_paths), expected_remaining_files)
 
-        mock_subprocess.assert_has_calls([
-            mock.call('gsutil ls gs://readviz/NA20870.cram', stdout=-1, stderr=-2, shell=True),
-            mock.call('gsutil ls gs://datasets-gcnv/NA20870.bed.gz', stdout=-1, stderr=-2, shell=True),
-        ], any_order=True)
+        mock_subprocess.assert_called_once_with(
+            'gsutil ls gs://readviz/NA20870.cram gs://datasets-gcnv/NA20870.bed.gz', stdout=-1, stderr=-1, shell=True)
 
         calls = [
             mock.call('Individual: NA20870  file not found: gs://readviz/NA20870.cram'),
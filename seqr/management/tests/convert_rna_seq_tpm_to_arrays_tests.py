@@ -0,0 +1,30 @@
+import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from seqr.models import RnaSeqTpm, RnaSeqTpmArray
+
+
+class ConvertRnaSeqTpmToArraysTest(TestCase):
+    databases = '__all__'
+    fixtures = ['users', '1kg_project', 'reference_data']
+
+    @mock.patch('seqr.management.commands.convert_rna_seq_tpm_to_arrays.logger')
+    def test_command(self, mock_logger):
+        num_genes = RnaSeqTpm.objects.values('gene_id').distinct().count()
+        call_command('convert_rna_seq_tpm_to_arrays')
+        mock_logger.info.assert_called_with(
+            f'Converted RnaSeqTpm data for 2 samples to arrays (gene index version 1, {num_genes} genes)')
+        self.assertListEqual(
+            list(RnaSeqTpmArray.objects.order_by('sample_id').values_list('sample_id', flat=True)), [151, 152])
+        self.assertEqual(RnaSeqTpm.objects.count(), 4)
+
+        # Re-running replaces the existing arrays
+        call_command('convert_rna_seq_tpm_to_arrays')
+        self.assertEqual(RnaSeqTpmArray.objects.count(), 2)
+        self.assertEqual(RnaSeqTpm.objects.count(), 4)
+
+        RnaSeqTpm.objects.all().delete()
+        call_command('convert_rna_seq_tpm_to_arrays')
+        mock_logger.info.assert_called_with('No RnaSeqTpm data to convert')
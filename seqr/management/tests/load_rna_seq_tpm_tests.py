@@ -14,6 +14,9 @@ EXISTING_SAMPLE_GUID = 'S000152_na19675_d2'
 class LoadRnaSeqTest(AuthenticationTestCase):
     fixtures = ['users', '1kg_project', 'reference_data']
 
+    # Buffer a single sample at a time, so the interleaved samples in the file are spilled to disk in fragments
+    @mock.patch('seqr.views.utils.dataset_utils.RNA_SAMPLE_BUFFER_SIZE', 1)
+    @mock.patch('seqr.views.utils.dataset_utils.RNA_SPILL_MAX_OPEN_FILES', 2)
     @mock.patch('seqr.utils.file_utils.gzip.open')
     @mock.patch('seqr.views.utils.dataset_utils.logger')
     @mock.patch('seqr.management.commands.load_rna_seq_tpm.logger')
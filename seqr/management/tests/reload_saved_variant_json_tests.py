@@ -1,5 +1,7 @@
 #-*- coding: utf-8 -*-
 import mock
+import os
+import tempfile
 
 from django.core.management import call_command
 from django.test import TestCase
@@ -91,3 +93,35 @@ class ReloadSavedVariantJsonTest(TestCase):
         mock_logger.info.assert_has_calls(logger_info_calls)
 
         mock_logger.error.assert_called_with('Error in project 1kg project n\xe5me with uni\xe7\xf8de: Database error.')
+
+    @mock.patch('seqr.management.commands.reload_saved_variant_json.logger')
+    @mock.patch('seqr.views.utils.variant_utils.get_variants_for_variant_ids')
+    def test_with_progress_file_command(self, mock_get_variants, mock_logger):
+        mock_get_variants.side_effect = lambda families, variant_ids, **kwargs: \
+            [{'variantId': variant_id, 'familyGuids': [family.guid for family in families]}
+             for variant_id in variant_ids]
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            progress_file = os.path.join(temp_dir, 'progress.txt')
+            with open(progress_file, 'w') as f:
+                f.write('R0001_1kg\nR0002_empty\n')
+
+            call_command('reload_saved_variant_json', f'--progress-file={progress_file}')
+
+            mock_logger.info.assert_any_call(f'Resuming from {progress_file}, 2 projects remaining')
+            self.assertEqual(mock_get_variants.call_count, 2)
+            mock_get_variants.assert_has_calls([
+                mock.call([Family.objects.get(id=12)], ['12-48367227-TC-T', 'prefix_19107_DEL'], user=None),
+                mock.call([Family.objects.get(id=14)], ['12-48367227-TC-T'], user=None)
+            ], any_order=True)
+
+            with open(progress_file) as f:
+                completed_projects = f.read().split()
+            self.assertListEqual(
+                sorted(completed_projects), ['R0001_1kg', 'R0002_empty', 'R0003_test', 'R0004_non_analyst_project'])
+
+            # Test resuming a completed reload
+            mock_get_variants.reset_mock()
+            call_command('reload_saved_variant_json', f'--progress-file={progress_file}')
+            mock_logger.info.assert_any_call(f'Resuming from {progress_file}, 0 projects remaining')
+            mock_get_variants.assert_not_called()
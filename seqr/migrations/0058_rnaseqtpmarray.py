@@ -0,0 +1,35 @@
+# Generated by Django 3.2.23 on 2026-10-19 11:39
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seqr', '0057_alter_family_analysis_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RnaSeqTpmGeneIndex',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(unique=True)),
+                ('gene_ids', django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=20), size=None)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RnaSeqTpmArray',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tpms', django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(null=True), size=None)),
+                ('gene_index', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='seqr.rnaseqtpmgeneindex')),
+                ('sample', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='seqr.sample')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
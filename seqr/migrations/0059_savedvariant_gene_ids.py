@@ -0,0 +1,60 @@
+# Generated by Django 3.2.23 on 2026-10-19 11:53
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+from seqr.models import get_saved_variant_gene_fields
+
+BATCH_SIZE = 1000
+
+
+def populate_gene_fields(apps, schema_editor):
+    SavedVariant = apps.get_model('seqr', 'SavedVariant')
+    db_alias = schema_editor.connection.alias
+
+    saved_variants = SavedVariant.objects.using(db_alias).order_by('id').only(
+        'id', 'saved_variant_json', 'selected_main_transcript_id')
+    to_update = []
+    num_updated = 0
+    for saved_variant in saved_variants.iterator(chunk_size=BATCH_SIZE):
+        saved_variant.gene_ids, saved_variant.main_transcript_gene_id = get_saved_variant_gene_fields(
+            saved_variant.saved_variant_json, saved_variant.selected_main_transcript_id)
+        if saved_variant.gene_ids or saved_variant.main_transcript_gene_id:
+            to_update.append(saved_variant)
+        if len(to_update) >= BATCH_SIZE:
+            num_updated += _update_batch(SavedVariant, db_alias, to_update)
+            to_update = []
+    num_updated += _update_batch(SavedVariant, db_alias, to_update)
+    if num_updated:
+        print(f'Populated gene fields for {num_updated} saved variants')
+
+
+def _update_batch(SavedVariant, db_alias, saved_variants):
+    SavedVariant.objects.using(db_alias).bulk_update(saved_variants, ['gene_ids', 'main_transcript_gene_id'])
+    return len(saved_variants)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seqr', '0058_rnaseqtpmarray'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='savedvariant',
+            name='gene_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=20), default=list, size=None),
+        ),
+        migrations.AddField(
+            model_name='savedvariant',
+            name='main_transcript_gene_id',
+            field=models.CharField(max_length=20, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='savedvariant',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['gene_ids'], name='seqr_savedv_gene_id_737124_gin'),
+        ),
+        migrations.RunPython(populate_gene_fields, reverse_code=migrations.RunPython.noop),
+    ]
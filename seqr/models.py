@@ -1,4 +1,5 @@
 from abc import abstractmethod
+from io import StringIO
 import uuid
 import json
 import random
@@ -6,8 +7,11 @@ import random
 from django.contrib.auth.models import User, Group
 from django.contrib.postgres.fields import ArrayField
 from django.core.exceptions import PermissionDenied
-from django.db import models
-from django.db.models import base, options, ForeignKey, JSONField, prefetch_related_objects
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.contrib.postgres.indexes import GinIndex
+from django.db import connections, models, router, transaction
+from django.db.models import base, options, Count, ForeignKey, JSONField, prefetch_related_objects
+from django.db.models.deletion import Collector
 from django.utils import timezone
 from django.utils.text import slugify as __slugify
 
@@ -16,7 +20,7 @@ from guardian.shortcuts import assign_perm
 from seqr.utils.logging_utils import log_model_update, log_model_bulk_update, SeqrLogger
 from seqr.utils.xpos_utils import get_chrom_pos
 from seqr.views.utils.terra_api_utils import anvil_enabled
-from reference_data.models import GENOME_VERSION_GRCh37, GENOME_VERSION_CHOICES
+from reference_data.models import GENOME_VERSION_GRCh37, GENOME_VERSION_CHOICES, format_copy_value
 from settings import MME_DEFAULT_CONTACT_NAME, MME_DEFAULT_CONTACT_HREF, MME_DEFAULT_CONTACT_INSTITUTION
 
 logger = SeqrLogger(__name__)
@@ -144,6 +148,13 @@ class ModelWithGUID(models.Model, metaclass=CustomModelBase):
         queryset.update(**update_json)
         return entity_ids
 
+    @classmethod
+    def bulk_update_models(cls, user, models, fields):
+        """Helper bulk update method for models which each have their own updated values that logs the update"""
+        entity_ids = log_model_bulk_update(logger, models, user, 'update', update_fields=fields)
+        cls.objects.bulk_update(models, fields)
+        return entity_ids
+
     @classmethod
     def bulk_delete(cls, user, queryset=None, **filter_kwargs):
         """Helper bulk delete method that logs the deletion"""
@@ -722,6 +733,25 @@ class IgvSample(ModelWithGUID):
         json_fields = ['guid', 'file_path', 'sample_type', 'sample_id']
 
 
+def get_saved_variant_gene_fields(saved_variant_json, selected_main_transcript_id):
+    """Returns the gene ids and main transcript gene id for a saved variant. Used by both the model and its migration"""
+    transcripts = saved_variant_json.get('transcripts') or {}
+    gene_ids = sorted(transcripts.keys())
+
+    main_transcript_gene_id = None
+    main_transcript_id = selected_main_transcript_id or saved_variant_json.get('mainTranscriptId')
+    if main_transcript_id:
+        main_transcript_gene_id = next((
+            t.get('geneId') or gene_id for gene_id, gene_transcripts in transcripts.items()
+            for t in gene_transcripts if t.get('transcriptId') == main_transcript_id
+        ), None)
+    elif len(transcripts) == 1 and not next(iter(transcripts.values())):
+        #  Manually created SNPs have a gene but no transcripts
+        main_transcript_gene_id = gene_ids[0]
+
+    return gene_ids, main_transcript_gene_id
+
+
 class SavedVariant(ModelWithGUID):
     family = models.ForeignKey('Family', on_delete=models.CASCADE)
 
@@ -734,8 +764,14 @@ class SavedVariant(ModelWithGUID):
     selected_main_transcript_id = models.CharField(max_length=20, null=True)
     saved_variant_json = JSONField(default=dict)
 
+    # Denormalized from saved_variant_json so variants can be looked up by gene without scanning the json
+    gene_ids = ArrayField(models.CharField(max_length=20), default=list)
+    main_transcript_gene_id = models.CharField(max_length=20, null=True)
+
     acmg_classification = JSONField(null=True) # ACMG based classification
 
+    GENE_FIELDS = ['gene_ids', 'main_transcript_gene_id']
+
     def __unicode__(self):
         chrom, pos = get_chrom_pos(self.xpos)
         return "%s:%s-%s" % (chrom, pos, self.family.guid)
@@ -743,8 +779,26 @@ class SavedVariant(ModelWithGUID):
     def _compute_guid(self):
         return 'SV%07d_%s' % (self.id, _slugify(str(self)))
 
+    def update_gene_fields(self):
+        """Sets the denormalized gene fields from the saved_variant_json and selected_main_transcript_id"""
+        self.gene_ids, self.main_transcript_gene_id = get_saved_variant_gene_fields(
+            self.saved_variant_json, self.selected_main_transcript_id)
+
+    def save(self, *args, **kwargs):
+        self.update_gene_fields()
+        super(SavedVariant, self).save(*args, **kwargs)
+
+    @classmethod
+    def bulk_update_models(cls, user, models, fields):
+        if 'saved_variant_json' in fields or 'selected_main_transcript_id' in fields:
+            for model in models:
+                model.update_gene_fields()
+            fields = list(fields) + cls.GENE_FIELDS
+        return super(SavedVariant, cls).bulk_update_models(user, models, fields)
+
     class Meta:
         unique_together = ('xpos', 'xpos_end', 'variant_id', 'family')
+        indexes = [GinIndex(fields=['gene_ids'])]
 
         json_fields = ['guid', 'xpos', 'ref', 'alt', 'variant_id', 'selected_main_transcript_id', 'acmg_classification']
 
@@ -1037,19 +1091,26 @@ class VariantSearchResults(ModelWithGUID):
 
 class BulkOperationBase(models.Model):
 
+    DELETE_BATCH_SIZE = 10000
+    COPY_BATCH_SIZE = 10000
+
     @classmethod
-    def log_model_no_guid_bulk_update(cls, models, user, update_type):
-        if not models:
-            return
+    def _log_bulk_update(cls, user, update_type, num_entities, parent_ids):
         db_entity = cls.__name__
-        prefetch_related_objects(models, cls.PARENT_FIELD)
-        parent_ids = {getattr(model, cls.PARENT_FIELD).guid for model in models}
         db_update = {
-            'dbEntity': db_entity, 'numEntities': len(models), 'parentEntityIds': sorted(parent_ids),
+            'dbEntity': db_entity, 'numEntities': num_entities, 'parentEntityIds': sorted(parent_ids),
             'updateType': 'bulk_{}'.format(update_type),
         }
         logger.info(f'{update_type} {db_entity}s', user, db_update=db_update)
 
+    @classmethod
+    def log_model_no_guid_bulk_update(cls, models, user, update_type):
+        if not models:
+            return
+        prefetch_related_objects(models, cls.PARENT_FIELD)
+        parent_ids = {getattr(model, cls.PARENT_FIELD).guid for model in models}
+        cls._log_bulk_update(user, update_type, len(models), parent_ids)
+
     @classmethod
     def bulk_create(cls, user, new_models):
         """Helper bulk create method that logs the creation"""
@@ -1059,13 +1120,66 @@ class BulkOperationBase(models.Model):
         cls.log_model_no_guid_bulk_update(models, user, 'create')
         return models
 
+    @classmethod
+    def bulk_copy_create(cls, user, new_models):
+        """Helper bulk create method that streams the new models into the table with batched COPY statements and logs
+        the creation. Unlike bulk_create, new_models can be a generator and the created models are not returned"""
+        db = router.db_for_write(cls)
+        connection = connections[db]
+        quote_name = connection.ops.quote_name
+        fields = [field for field in cls._meta.concrete_fields if not field.primary_key]
+        copy_sql = 'COPY {} ({}) FROM STDIN'.format(
+            quote_name(cls._meta.db_table), ', '.join(quote_name(field.column) for field in fields))
+        parent_field = cls._meta.get_field(cls.PARENT_FIELD)
+
+        parent_ids = set()
+        num_models = 0
+        rows = []
+        with transaction.atomic(using=db), connection.cursor() as cursor:
+            for model in new_models:
+                parent_ids.add(getattr(model, parent_field.attname))
+                rows.append('\t'.join(format_copy_value(field, model, connection) for field in fields) + '\n')
+                if len(rows) >= cls.COPY_BATCH_SIZE:
+                    cursor.copy_expert(copy_sql, StringIO(''.join(rows)))
+                    num_models += len(rows)
+                    rows = []
+            if rows:
+                cursor.copy_expert(copy_sql, StringIO(''.join(rows)))
+                num_models += len(rows)
+
+        if num_models:
+            parent_guids = parent_field.related_model.objects.filter(id__in=parent_ids).values_list('guid', flat=True)
+            cls._log_bulk_update(user, 'create', num_models, parent_guids)
+        return num_models
+
     @classmethod
     def bulk_delete(cls, user, queryset=None, **filter_kwargs):
-        """Helper bulk delete method that logs the deletion"""
+        """Helper bulk delete method that logs the deletion.
+
+        The records are never loaded into memory: the audit log is computed with a single aggregate query, and if no
+        cascades or delete signals apply, the records are deleted with raw SQL in primary key batches
+        """
         if queryset is None:
             queryset = cls.objects.filter(**filter_kwargs)
-        cls.log_model_no_guid_bulk_update(queryset, user, 'delete')
-        return queryset.delete()
+        summary = queryset.order_by().aggregate(
+            count=Count('pk'), parent_ids=ArrayAgg(f'{cls.PARENT_FIELD}__guid', distinct=True))
+        if not summary['count']:
+            return 0, {}
+        cls._log_bulk_update(user, 'delete', summary['count'], summary['parent_ids'])
+
+        if not Collector(using=queryset.db).can_fast_delete(queryset):
+            return queryset.delete()
+
+        batch_query, params = queryset.order_by('pk').values('pk')[:cls.DELETE_BATCH_SIZE].query.sql_with_params()
+        delete_sql = f'DELETE FROM "{cls._meta.db_table}" WHERE "{cls._meta.pk.column}" IN ({batch_query})'
+        num_deleted = 0
+        with transaction.atomic(using=queryset.db), connections[queryset.db].cursor() as cursor:
+            while True:
+                cursor.execute(delete_sql, params)
+                num_deleted += cursor.rowcount
+                if cursor.rowcount < cls.DELETE_BATCH_SIZE:
+                    break
+        return num_deleted, {cls._meta.label: num_deleted}
 
     class Meta:
         abstract = True
@@ -1111,6 +1225,22 @@ class RnaSeqTpm(DeletableSampleMetadataModel):
         indexes = [models.Index(fields=['sample_id', 'gene_id'])]
 
 
+class RnaSeqTpmGeneIndex(models.Model):
+    """A versioned, append-only list of genes which the RnaSeqTpmArray tpms are aligned to"""
+    version = models.PositiveIntegerField(unique=True)
+    gene_ids = ArrayField(models.CharField(max_length=20))
+
+
+class RnaSeqTpmArray(BulkOperationBase):
+    """A compact alternative to storing one RnaSeqTpm row per gene, with all the TPMs for a sample in a single array
+    aligned to the genes in the gene index. Genes with no TPM for the sample are null"""
+    PARENT_FIELD = 'sample'
+
+    sample = models.OneToOneField('Sample', on_delete=models.CASCADE)
+    gene_index = models.ForeignKey('RnaSeqTpmGeneIndex', on_delete=models.PROTECT)
+    tpms = ArrayField(models.FloatField(null=True))
+
+
 class RnaSeqSpliceOutlier(DeletableSampleMetadataModel):
     SIGNIFICANCE_THRESHOLD = 0.01
     SIGNIFICANCE_FIELD = 'p_value'
@@ -0,0 +1,136 @@
+from contextlib import contextmanager
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+
+from seqr.utils.logging_utils import SeqrLogger
+
+logger = SeqrLogger(__name__)
+
+LOCK_FILE_NAME = '.lock'
+SIZE_FILE_NAME = '.size'
+
+
+class DiskLruCache(object):
+    """
+    Bounded on-disk cache for immutable file content, which evicts the least recently used entries once the cache
+    exceeds its maximum size. Entries are only added once their content has been fully read, and are moved into place
+    atomically so the cache can be shared by multiple processes. The total cache size is shared by all processes in a
+    size file in the cache directory, which is only updated under a file lock, and the cache directory is only scanned
+    once that total exceeds the maximum size.
+    """
+
+    def __init__(self, cache_dir, max_size):
+        self._cache_dir = cache_dir
+        self._max_size = max_size
+
+    def _get_path(self, key):
+        return os.path.join(self._cache_dir, hashlib.sha256(json.dumps(key).encode()).hexdigest())
+
+    def get(self, key):
+        """Returns an open file with the cached content and the cached metadata, or None if the key is not cached"""
+        path = self._get_path(key)
+        try:
+            with open(f'{path}.json') as f:
+                metadata = json.load(f)
+            cached_file = open(path, 'rb')
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return cached_file, metadata
+
+    def cache_content(self, key, content, metadata=None, user=None):
+        """Yields the given content chunks, and caches the content if it is read in full"""
+        try:
+            os.makedirs(self._cache_dir, exist_ok=True)
+            temp_file = tempfile.NamedTemporaryFile(dir=self._cache_dir, prefix='.', delete=False)
+        except OSError as e:
+            logger.warning('Unable to write to disk cache {}: {}'.format(self._cache_dir, str(e)), user)
+            temp_file = None
+
+        size = 0
+        try:
+            for chunk in content:
+                if temp_file:
+                    try:
+                        temp_file.write(chunk)
+                        size += len(chunk)
+                    except OSError as e:
+                        logger.warning('Unable to write to disk cache {}: {}'.format(self._cache_dir, str(e)), user)
+                        self._remove_temp_file(temp_file)
+                        temp_file = None
+                yield chunk
+
+            if temp_file and size <= self._max_size:
+                temp_file.close()
+                self._add_entry(key, temp_file.name, metadata, size)
+                temp_file = None
+        finally:
+            if temp_file:
+                self._remove_temp_file(temp_file)
+
+    @staticmethod
+    def _remove_temp_file(temp_file):
+        temp_file.close()
+        try:
+            os.remove(temp_file.name)
+        except FileNotFoundError:
+            pass
+
+    def _add_entry(self, key, content_path, metadata, size):
+        path = self._get_path(key)
+        with tempfile.NamedTemporaryFile(mode='w', dir=self._cache_dir, prefix='.', delete=False) as f:
+            json.dump(metadata or {}, f)
+        # The metadata file is moved into place last, so a cache entry is only visible once its content is in place
+        with self._lock():
+            os.replace(content_path, path)
+            os.replace(f.name, f'{path}.json')
+
+            total_size = self._read_total_size()
+            if total_size is not None:
+                total_size += size
+            if total_size is None or total_size > self._max_size:
+                total_size = self._evict()
+            self._write_total_size(total_size)
+
+    @contextmanager
+    def _lock(self):
+        with open(os.path.join(self._cache_dir, LOCK_FILE_NAME), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def _read_total_size(self):
+        try:
+            with open(os.path.join(self._cache_dir, SIZE_FILE_NAME)) as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def _write_total_size(self, total_size):
+        with open(os.path.join(self._cache_dir, SIZE_FILE_NAME), 'w') as f:
+            f.write(str(total_size))
+
+    def _evict(self):
+        entries = []
+        for entry in os.scandir(self._cache_dir):
+            if entry.name.startswith('.') or entry.name.endswith('.json'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self._max_size:
+                break
+            for entry_path in [f'{path}.json', path]:
+                try:
+                    os.remove(entry_path)
+                except FileNotFoundError:
+                    pass
+            total_size -= size
+        return total_size
@@ -0,0 +1,101 @@
+import mock
+import os
+import tempfile
+from unittest import TestCase
+
+from seqr.utils.disk_cache_utils import DiskLruCache
+
+
+class DiskCacheUtilsTest(TestCase):
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.cache_dir = os.path.join(temp_dir.name, 'cache')
+        self.cache = DiskLruCache(self.cache_dir, 10)
+
+    def _get_cached(self, key):
+        cached = self.cache.get(key)
+        if not cached:
+            return None
+        cached_file, metadata = cached
+        with cached_file:
+            return cached_file.read(), metadata
+
+    def test_cache_content(self):
+        self.assertIsNone(self._get_cached(['a']))
+
+        content = self.cache.cache_content(['a'], iter([b'abc', b'de']), metadata={'status': 200})
+        self.assertEqual(next(content), b'abc')
+        # content is not cached until it is fully read
+        self.assertIsNone(self._get_cached(['a']))
+        self.assertListEqual(list(content), [b'de'])
+        self.assertTupleEqual(self._get_cached(['a']), (b'abcde', {'status': 200}))
+
+        self.assertListEqual(list(self.cache.cache_content(['b'], iter([b'fgh']))), [b'fgh'])
+        self.assertTupleEqual(self._get_cached(['b']), (b'fgh', {}))
+
+        # partially read content is not cached
+        content = self.cache.cache_content(['c'], iter([b'ij', b'kl']))
+        next(content)
+        content.close()
+        self.assertIsNone(self._get_cached(['c']))
+
+        # content larger than the cache is not cached
+        self.assertListEqual(list(self.cache.cache_content(['d'], iter([b'0123456789', b'0']))), [b'0123456789', b'0'])
+        self.assertIsNone(self._get_cached(['d']))
+
+        # least recently used entries are evicted once the cache is full
+        for path in os.listdir(self.cache_dir):
+            os.utime(os.path.join(self.cache_dir, path), (100, 100))
+        self._get_cached(['a'])
+        list(self.cache.cache_content(['e'], iter([b'mno'])))
+        self.assertTupleEqual(self._get_cached(['a']), (b'abcde', {'status': 200}))
+        self.assertIsNone(self._get_cached(['b']))
+        self.assertTupleEqual(self._get_cached(['e']), (b'mno', {}))
+        self.assertSetEqual({path for path in os.listdir(self.cache_dir) if path.startswith('.')}, {'.lock', '.size'})
+        self.assertEqual(len(os.listdir(self.cache_dir)), 6)
+
+    def test_cache_size_tracking(self):
+        with mock.patch('seqr.utils.disk_cache_utils.os.scandir', wraps=os.scandir) as mock_scandir:
+            # the cache directory is scanned for the initial cache size
+            list(self.cache.cache_content(['a'], iter([b'abc'])))
+            self.assertEqual(mock_scandir.call_count, 1)
+
+            # the cache directory is not scanned again until the cache exceeds its max size, and the size is shared
+            # with other processes using the same cache directory
+            list(self.cache.cache_content(['b'], iter([b'def'])))
+            other_process_cache = DiskLruCache(self.cache_dir, 10)
+            list(other_process_cache.cache_content(['c'], iter([b'ghi'])))
+            self.assertEqual(mock_scandir.call_count, 1)
+            with open(os.path.join(self.cache_dir, '.size')) as f:
+                self.assertEqual(f.read(), '9')
+
+            for path in os.listdir(self.cache_dir):
+                os.utime(os.path.join(self.cache_dir, path), (100, 100))
+            list(self.cache.cache_content(['d'], iter([b'jk'])))
+            self.assertEqual(mock_scandir.call_count, 2)
+            with open(os.path.join(self.cache_dir, '.size')) as f:
+                self.assertEqual(f.read(), '8')
+
+        self.assertEqual(len(os.listdir(self.cache_dir)), 8)
+        self.assertTupleEqual(self._get_cached(['d']), (b'jk', {}))
+
+    @mock.patch('seqr.utils.disk_cache_utils.logger')
+    def test_cache_errors(self, mock_logger):
+        with mock.patch('seqr.utils.disk_cache_utils.os.makedirs') as mock_makedirs:
+            mock_makedirs.side_effect = OSError('Permission denied')
+            self.assertListEqual(list(self.cache.cache_content(['a'], iter([b'abc']))), [b'abc'])
+        mock_logger.warning.assert_called_with(
+            f'Unable to write to disk cache {self.cache_dir}: Permission denied', None)
+        self.assertIsNone(self._get_cached(['a']))
+
+        mock_logger.reset_mock()
+        with mock.patch('seqr.utils.disk_cache_utils.tempfile.NamedTemporaryFile') as mock_temp_file:
+            mock_temp_file.return_value.name = os.path.join(self.cache_dir, '.missing_temp_file')
+            mock_temp_file.return_value.write.side_effect = OSError('No space left on device')
+            self.assertListEqual(list(self.cache.cache_content(['a'], iter([b'abc', b'de']))), [b'abc', b'de'])
+        mock_logger.warning.assert_called_once_with(
+            f'Unable to write to disk cache {self.cache_dir}: No space left on device', None)
+        self.assertIsNone(self._get_cached(['a']))
+        self.assertListEqual(os.listdir(self.cache_dir), [])
@@ -1,11 +1,30 @@
+from concurrent.futures import ThreadPoolExecutor
 import gzip
 import os
+import re
 import subprocess # nosec
+from urllib.parse import quote
+import zlib
+
+import google.auth
+from google.auth.credentials import AnonymousCredentials
+from google.auth.transport.requests import AuthorizedSession
+from requests.adapters import HTTPAdapter
 
 from seqr.utils.logging_utils import SeqrLogger
+from settings import GS_STORAGE_BACKEND, GS_STORAGE_URL
 
 logger = SeqrLogger(__name__)
 
+LOCAL_FILE_CHUNK_SIZE = 65536
+GOOGLE_STORAGE_URL = 'https://storage.googleapis.com'
+GS_API_SCOPES = ['https://www.googleapis.com/auth/devstorage.read_write']
+GS_API_POOL_SIZE = 25
+GS_API_MAX_PARALLEL_REQUESTS = 10
+#  Paths are passed to gsutil as shell arguments, so they are batched to stay well below the OS argument size limit
+GSUTIL_LS_BATCH_SIZE = 200
+GSUTIL_NO_MATCH_ERROR = 'CommandException: One or more URLs matched no objects.'
+
 
 def run_command(command, user=None, pipe_errors=False):
     logger.info('==> {}'.format(command), user)
@@ -36,67 +55,288 @@ def get_google_project(gs_path):
     return 'anvil-datastorage' if gs_path.startswith('gs://fc-secure') else None
 
 
-def does_file_exist(file_path, user=None):
-    if is_google_bucket_file_path(file_path):
+def iter_gunzipped_chunks(chunks):
+    """Decompress a stream of gzipped chunks, including multi-member (bgzipped) files and truncated byte ranges"""
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        while chunk:
+            yield decompressor.decompress(chunk)
+            if decompressor.eof:
+                chunk = decompressor.unused_data
+                decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+            else:
+                chunk = b''
+
+
+def iter_decoded_lines(chunks):
+    remainder = b''
+    for chunk in chunks:
+        lines = (remainder + chunk).split(b'\n')
+        remainder = lines.pop()
+        for line in lines:
+            yield (line + b'\n').decode('utf-8')
+    if remainder:
+        yield remainder.decode('utf-8')
+
+
+class LocalStorageBackend(object):
+    """Storage backend for files on the local filesystem"""
+
+    @staticmethod
+    def does_file_exist(file_path, user=None):
+        return os.path.isfile(file_path)
+
+    def get_files_exist(self, file_paths, user=None):
+        return {file_path: self.does_file_exist(file_path) for file_path in file_paths}
+
+    @staticmethod
+    def file_iter(file_path, byte_range=None, raw_content=False, user=None):
+        if byte_range:
+            chunks = _local_file_range_iter(file_path, byte_range)
+            if raw_content:
+                yield from chunks
+            else:
+                yield from iter_decoded_lines(
+                    iter_gunzipped_chunks(chunks) if file_path.endswith('gz') else chunks)
+        else:
+            mode = 'rb' if raw_content else 'r'
+            open_func = gzip.open if file_path.endswith("gz") else open
+            with open_func(file_path, mode) as f:
+                for line in f:
+                    yield line
+
+
+class GsutilStorageBackend(object):
+    """Storage backend for google buckets which runs gsutil commands"""
+
+    @staticmethod
+    def does_file_exist(file_path, user=None):
         process = _run_gsutil_command('ls', file_path, user=user)
         success = process.wait() == 0
         if not success:
             errors = [line.decode('utf-8').strip() for line in process.stdout]
             logger.info(' '.join(errors), user)
         return success
-    return os.path.isfile(file_path)
 
+    @staticmethod
+    def get_files_exist(file_paths, user=None):
+        paths_by_project = {}
+        for file_path in file_paths:
+            paths_by_project.setdefault(get_google_project(file_path), []).append(file_path)
 
-def file_iter(file_path, byte_range=None, raw_content=False, user=None):
-    if is_google_bucket_file_path(file_path):
-        for line in _google_bucket_file_iter(file_path, byte_range=byte_range, raw_content=raw_content, user=user):
-            yield line
-    elif byte_range:
-        command = 'dd skip={offset} count={size} bs=1 if={file_path}'.format(
-            offset=byte_range[0],
-            size=byte_range[1]-byte_range[0],
-            file_path=file_path,
-        )
-        process = run_command(command, user=user)
+        existing_paths = set()
+        for project_paths in paths_by_project.values():
+            for i in range(0, len(project_paths), GSUTIL_LS_BATCH_SIZE):
+                existing_paths.update(_get_existing_gs_paths(project_paths[i:i + GSUTIL_LS_BATCH_SIZE], user))
+        return {file_path: file_path in existing_paths for file_path in file_paths}
+
+    @staticmethod
+    def file_iter(gs_path, byte_range=None, raw_content=False, user=None):
+        range_arg = ' -r {}-{}'.format(byte_range[0], byte_range[1]) if byte_range else ''
+        process = _run_gsutil_command(
+            'cat{}'.format(range_arg), gs_path, gunzip=gs_path.endswith("gz") and not raw_content, user=user)
         for line in process.stdout:
+            if not raw_content:
+                line = line.decode('utf-8')
             yield line
-    else:
-        mode = 'rb' if raw_content else 'r'
-        open_func = gzip.open if file_path.endswith("gz") else open
-        with open_func(file_path, mode) as f:
-            for line in f:
-                yield line
-
-
-def _google_bucket_file_iter(gs_path, byte_range=None, raw_content=False, user=None):
-    """Iterate over lines in the given file"""
-    range_arg = ' -r {}-{}'.format(byte_range[0], byte_range[1]) if byte_range else ''
-    process = _run_gsutil_command(
-        'cat{}'.format(range_arg), gs_path, gunzip=gs_path.endswith("gz") and not raw_content, user=user)
-    for line in process.stdout:
-        if not raw_content:
-            line = line.decode('utf-8')
+
+    @staticmethod
+    def mv_file(local_path, gs_path, user=None):
+        command = 'mv {}'.format(local_path)
+        _run_gsutil_with_wait(command, gs_path, user)
+
+    @staticmethod
+    def get_file_list(gs_path, user=None, check_subfolders=True, allow_missing=False):
+        command = 'ls'
+
+        if check_subfolders:
+            # If a bucket is empty gsutil throws an error when running ls with ** instead of returning an empty list
+            subfolders = _run_gsutil_with_stdout(command, gs_path, user)
+            if not subfolders:
+                return []
+            gs_path = f'{gs_path}/**'
+
+        all_lines = _run_gsutil_with_stdout(command, gs_path, user, allow_missing=allow_missing)
+        return [line for line in all_lines if is_google_bucket_file_path(line)]
+
+
+class GcsApiStorageBackend(object):
+    """
+    Storage backend for google buckets which calls the storage JSON API directly with a pooled, authorized session.
+    When GS_STORAGE_URL is set to a local emulator, requests are sent to the emulator without credentials.
+    """
+
+    def __init__(self, storage_url):
+        self._storage_url = storage_url
+        if storage_url == GOOGLE_STORAGE_URL:
+            credentials, _ = google.auth.default(scopes=GS_API_SCOPES)
+        else:
+            credentials = AnonymousCredentials()
+        self._session = AuthorizedSession(credentials)
+        self._session.mount(storage_url, HTTPAdapter(pool_maxsize=GS_API_POOL_SIZE))
+
+    @staticmethod
+    def _parse_gs_path(gs_path):
+        if not is_google_bucket_file_path(gs_path):
+            raise Exception('A Google Storage path is expected.')
+        bucket, _, object_name = gs_path[len('gs://'):].partition('/')
+        return bucket, object_name
+
+    def _request(self, gs_path, path='', api_path='storage/v1', params=None, allowed_status=None, **kwargs):
+        bucket, object_name = self._parse_gs_path(gs_path)
+        url = f'{self._storage_url}/{api_path}/b/{bucket}/o'
+        if path:
+            url += f'/{quote(path, safe="")}'
+        params = dict(params or {})
+        #  Anvil buckets are requester-pays and we bill them to the anvil project
+        google_project = get_google_project(gs_path)
+        if google_project:
+            params['userProject'] = google_project
+        response = self._session.request(url=url, params=params, **kwargs)
+        if not (response.ok or response.status_code in (allowed_status or [])):
+            raise Exception(f'Google Storage request for {gs_path} failed: {response.status_code} {response.text}')
+        return response
+
+    def does_file_exist(self, file_path, user=None):
+        _, object_name = self._parse_gs_path(file_path)
+        response = self._request(
+            file_path, path=object_name, method='GET', params={'fields': 'name'}, allowed_status=[404])
+        if response.status_code == 404:
+            logger.info(f'{file_path} not found', user)
+            return False
+        return True
+
+    def get_files_exist(self, file_paths, user=None):
+        with ThreadPoolExecutor(max_workers=GS_API_MAX_PARALLEL_REQUESTS) as executor:
+            files_exist = executor.map(lambda file_path: self.does_file_exist(file_path, user=user), file_paths)
+            return dict(zip(file_paths, files_exist))
+
+    def file_iter(self, gs_path, byte_range=None, raw_content=False, user=None):
+        _, object_name = self._parse_gs_path(gs_path)
+        headers = {'Range': 'bytes={}-{}'.format(byte_range[0], byte_range[1])} if byte_range else {}
+        response = self._request(
+            gs_path, path=object_name, api_path='download/storage/v1', method='GET', params={'alt': 'media'},
+            headers=headers, stream=True)
+        chunks = response.iter_content(chunk_size=LOCAL_FILE_CHUNK_SIZE)
+        if raw_content:
+            yield from chunks
+        else:
+            yield from iter_decoded_lines(iter_gunzipped_chunks(chunks) if gs_path.endswith('gz') else chunks)
+
+    def mv_file(self, local_path, gs_path, user=None):
+        _, object_name = self._parse_gs_path(gs_path)
+        logger.info(f'==> upload {local_path} to {gs_path}', user)
+        with open(local_path, 'rb') as f:
+            self._request(
+                gs_path, api_path='upload/storage/v1', method='POST',
+                params={'uploadType': 'media', 'name': object_name}, data=f,
+            )
+        os.remove(local_path)
+
+    def _list_objects(self, gs_path, prefix, delimiter=None):
+        bucket, _ = self._parse_gs_path(gs_path)
+        params = {'prefix': prefix, 'fields': 'items(name),prefixes,nextPageToken'}
+        if delimiter:
+            params['delimiter'] = delimiter
+        paths = []
+        while True:
+            response_json = self._request(gs_path, method='GET', params=params).json()
+            paths += [f'gs://{bucket}/{item["name"]}' for item in response_json.get('items', [])]
+            paths += [f'gs://{bucket}/{prefix}' for prefix in response_json.get('prefixes', [])]
+            if not response_json.get('nextPageToken'):
+                return paths
+            params['pageToken'] = response_json['nextPageToken']
+
+    def get_file_list(self, gs_path, user=None, check_subfolders=True, allow_missing=False):
+        _, object_name = self._parse_gs_path(gs_path)
+        if '*' in object_name:
+            # Match wildcards the same way as gsutil, where only ** matches across subfolders
+            path_regex = re.compile('.*'.join(
+                '[^/]*'.join(re.escape(part) for part in sub_path.split('*')) for sub_path in gs_path.split('**')
+            ) + '$')
+            paths = [
+                path for path in self._list_objects(gs_path, object_name.split('*')[0]) if path_regex.match(path)
+            ]
+        elif check_subfolders:
+            return self._list_objects(gs_path, f'{object_name}/' if object_name else '')
+        else:
+            paths = [path for path in self._list_objects(gs_path, object_name, delimiter='/') if path == gs_path] or \
+                    self._list_objects(gs_path, f'{object_name}/' if object_name else '', delimiter='/')
+
+        if not paths:
+            error = f'One or more URLs matched no objects: {gs_path}'
+            if not allow_missing:
+                raise Exception(error)
+            logger.info(error, user)
+        return paths
+
+
+GS_STORAGE_BACKENDS = {
+    'gsutil': GsutilStorageBackend,
+    'api': GcsApiStorageBackend,
+}
+_gs_storage_backends = {}
+
+
+def _get_storage_backend(file_path):
+    if not is_google_bucket_file_path(file_path):
+        return LocalStorageBackend()
+    return _get_gs_storage_backend()
+
+
+def _get_gs_storage_backend():
+    backend_key = (GS_STORAGE_BACKEND, GS_STORAGE_URL)
+    if backend_key not in _gs_storage_backends:
+        backend_cls = GS_STORAGE_BACKENDS[GS_STORAGE_BACKEND]
+        _gs_storage_backends[backend_key] = backend_cls(GS_STORAGE_URL) \
+            if backend_cls == GcsApiStorageBackend else backend_cls()
+    return _gs_storage_backends[backend_key]
+
+
+def does_file_exist(file_path, user=None):
+    return _get_storage_backend(file_path).does_file_exist(file_path, user=user)
+
+
+def get_files_exist(file_paths, user=None):
+    """Checks whether each of the given files exists, batching the checks for files in google buckets"""
+    files_exist = LocalStorageBackend().get_files_exist(
+        [file_path for file_path in file_paths if not is_google_bucket_file_path(file_path)])
+    gs_file_paths = [file_path for file_path in file_paths if is_google_bucket_file_path(file_path)]
+    if gs_file_paths:
+        files_exist.update(_get_gs_storage_backend().get_files_exist(gs_file_paths, user=user))
+    return files_exist
+
+
+def file_iter(file_path, byte_range=None, raw_content=False, user=None):
+    for line in _get_storage_backend(file_path).file_iter(
+            file_path, byte_range=byte_range, raw_content=raw_content, user=user):
         yield line
 
 
-def mv_file_to_gs(local_path, gs_path, user=None):
-    command = 'mv {}'.format(local_path)
-    _run_gsutil_with_wait(command, gs_path, user)
+def _local_file_range_iter(file_path, byte_range):
+    """Iterate over fixed size chunks of the given inclusive byte range"""
+    remaining = byte_range[1] - byte_range[0] + 1
+    with open(file_path, 'rb') as f:
+        f.seek(byte_range[0])
+        while remaining > 0:
+            chunk = f.read(min(LOCAL_FILE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
 
 
-def get_gs_file_list(gs_path, user=None, check_subfolders=True, allow_missing=False):
-    gs_path = gs_path.rstrip('/')
-    command = 'ls'
+def mv_file_to_gs(local_path, gs_path, user=None):
+    if not is_google_bucket_file_path(gs_path):
+        raise Exception('A Google Storage path is expected.')
+    _get_gs_storage_backend().mv_file(local_path, gs_path, user=user)
 
-    if check_subfolders:
-        # If a bucket is empty gsutil throws an error when running ls with ** instead of returning an empty list
-        subfolders = _run_gsutil_with_stdout(command, gs_path, user)
-        if not subfolders:
-            return []
-        gs_path = f'{gs_path}/**'
 
-    all_lines = _run_gsutil_with_stdout(command, gs_path, user, allow_missing=allow_missing)
-    return [line for line in all_lines if is_google_bucket_file_path(line)]
+def get_gs_file_list(gs_path, user=None, check_subfolders=True, allow_missing=False):
+    if not is_google_bucket_file_path(gs_path):
+        raise Exception('A Google Storage path is expected.')
+    return _get_gs_storage_backend().get_file_list(
+        gs_path.rstrip('/'), user=user, check_subfolders=check_subfolders, allow_missing=allow_missing)
 
 
 def _run_gsutil_with_wait(command, gs_path, user=None):
@@ -107,6 +347,18 @@ def _run_gsutil_with_wait(command, gs_path, user=None):
     return process
 
 
+def _get_existing_gs_paths(gs_paths, user):
+    # gsutil lists all the paths that exist and exits with an error if any path does not
+    process = _run_gsutil_command('ls', ' '.join(gs_paths), user=user, pipe_errors=True)
+    output, errs = process.communicate()
+    errors = [line.strip() for line in errs.decode('utf-8').split('\n') if line.strip()]
+    if process.returncode and errors != [GSUTIL_NO_MATCH_ERROR]:
+        raise Exception(f'Run command failed: {" ".join(errors)}')
+    if errors:
+        logger.info(' '.join(errors), user)
+    return [line for line in output.decode('utf-8').split('\n') if line]
+
+
 def _run_gsutil_with_stdout(command, gs_path, user=None, allow_missing=False):
     process = _run_gsutil_command(command, gs_path, user=user, pipe_errors=True)
     output, errs = process.communicate()
@@ -1,7 +1,14 @@
+import gzip
+import json
 import mock
+import os
+import responses
+import tempfile
 
 from unittest import TestCase
-from seqr.utils.file_utils import mv_file_to_gs, get_gs_file_list
+from seqr.utils.file_utils import mv_file_to_gs, get_gs_file_list, file_iter, does_file_exist, get_files_exist
+
+EMULATOR_URL = 'http://localhost:4443'
 
 
 class FileUtilsTest(TestCase):
@@ -59,3 +66,227 @@ class FileUtilsTest(TestCase):
         mock_logger.info.assert_called_with('==> gsutil ls gs://bucket/target_path/**', None)
         process.communicate.assert_called_with()
         self.assertEqual(file_list, ['gs://bucket/target_path/id_file.txt', 'gs://bucket/target_path/data.vcf.gz'])
+
+    @mock.patch('seqr.utils.file_utils.LOCAL_FILE_CHUNK_SIZE', 4)
+    def test_local_file_iter_byte_range(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, 'test.bam')
+            with open(file_path, 'wb') as f:
+                f.write(b'0123456789')
+
+            self.assertListEqual(
+                list(file_iter(file_path, byte_range=(1, 9), raw_content=True)), [b'1234', b'5678', b'9'])
+            self.assertListEqual(list(file_iter(file_path, byte_range=(6, 6), raw_content=True)), [b'6'])
+            self.assertListEqual(list(file_iter(file_path, byte_range=(8, 20), raw_content=True)), [b'89'])
+
+            file_path = os.path.join(temp_dir, 'test.txt')
+            with open(file_path, 'w') as f:
+                f.write('##header\n#CHROM\tPOS\n1\t100\n')
+            self.assertListEqual(list(file_iter(file_path, byte_range=(2, 20))), ['header\n', '#CHROM\tPOS\n', '1'])
+
+            # test multi-member (bgzipped) files are decompressed
+            file_path = os.path.join(temp_dir, 'test.vcf.gz')
+            with open(file_path, 'wb') as f:
+                f.write(gzip.compress(b'##header\n#CHR') + gzip.compress(b'OM\tPOS\n1\t100\n'))
+            self.assertListEqual(
+                list(file_iter(file_path, byte_range=(0, 1000))), ['##header\n', '#CHROM\tPOS\n', '1\t100\n'])
+
+            self.assertTrue(does_file_exist(file_path))
+            self.assertFalse(does_file_exist(os.path.join(temp_dir, 'missing.vcf')))
+
+    @mock.patch('seqr.utils.file_utils.subprocess')
+    @mock.patch('seqr.utils.file_utils.logger')
+    def test_get_files_exist(self, mock_logger, mock_subproc):
+        mock_subproc.Popen.return_value.communicate.side_effect = [
+            (b'gs://bucket/sample_1.cram\n', b'CommandException: One or more URLs matched no objects.\n'),
+            (b'gs://fc-secure-bucket/sample_3.cram\n', b''),
+        ]
+        type(mock_subproc.Popen.return_value).returncode = mock.PropertyMock(side_effect=[1, 0, 1])
+        self.assertDictEqual(get_files_exist([
+            'gs://bucket/sample_1.cram', '/missing/sample_1.cram', 'gs://fc-secure-bucket/sample_3.cram',
+            'gs://bucket/sample_2.cram',
+        ]), {
+            'gs://bucket/sample_1.cram': True,
+            'gs://bucket/sample_2.cram': False,
+            'gs://fc-secure-bucket/sample_3.cram': True,
+            '/missing/sample_1.cram': False,
+        })
+        mock_subproc.Popen.assert_has_calls([
+            mock.call('gsutil ls gs://bucket/sample_1.cram gs://bucket/sample_2.cram', stdout=mock_subproc.PIPE,
+                      stderr=mock_subproc.PIPE, shell=True),
+            mock.call().communicate(),
+            mock.call('gsutil -u anvil-datastorage ls gs://fc-secure-bucket/sample_3.cram',
+                      stdout=mock_subproc.PIPE, stderr=mock_subproc.PIPE, shell=True),
+            mock.call().communicate(),
+        ])
+        mock_logger.info.assert_any_call('CommandException: One or more URLs matched no objects.', None)
+
+        mock_subproc.reset_mock()
+        self.assertDictEqual(get_files_exist(['/missing/sample_1.cram']), {'/missing/sample_1.cram': False})
+        mock_subproc.Popen.assert_not_called()
+
+        # Test failed gsutil command
+        mock_subproc.Popen.return_value.communicate.side_effect = None
+        mock_subproc.Popen.return_value.communicate.return_value = (
+            b'', b'BucketNotFoundException: 404 gs://bucket bucket does not exist.\n')
+        with self.assertRaises(Exception) as ee:
+            get_files_exist(['gs://bucket/sample_1.cram'])
+        self.assertEqual(
+            str(ee.exception), 'Run command failed: BucketNotFoundException: 404 gs://bucket bucket does not exist.')
+
+    @mock.patch('seqr.utils.file_utils.GSUTIL_LS_BATCH_SIZE', 2)
+    @mock.patch('seqr.utils.file_utils.subprocess')
+    @mock.patch('seqr.utils.file_utils.logger')
+    def test_get_files_exist_batched(self, mock_logger, mock_subproc):
+        file_paths = [f'gs://bucket/sample_{i}.cram' for i in range(5)]
+        mock_subproc.Popen.return_value.communicate.side_effect = [
+            (b'gs://bucket/sample_0.cram\ngs://bucket/sample_1.cram\n', b''),
+            (b'gs://bucket/sample_3.cram\n', b'CommandException: One or more URLs matched no objects.\n'),
+            (b'gs://bucket/sample_4.cram\n', b''),
+        ]
+        mock_subproc.Popen.return_value.returncode = 0
+        self.assertDictEqual(get_files_exist(file_paths), {
+            'gs://bucket/sample_0.cram': True,
+            'gs://bucket/sample_1.cram': True,
+            'gs://bucket/sample_2.cram': False,
+            'gs://bucket/sample_3.cram': True,
+            'gs://bucket/sample_4.cram': True,
+        })
+        self.assertListEqual([call.args[0] for call in mock_subproc.Popen.call_args_list], [
+            'gsutil ls gs://bucket/sample_0.cram gs://bucket/sample_1.cram',
+            'gsutil ls gs://bucket/sample_2.cram gs://bucket/sample_3.cram',
+            'gsutil ls gs://bucket/sample_4.cram',
+        ])
+
+
+@mock.patch('seqr.utils.file_utils.GS_STORAGE_URL', EMULATOR_URL)
+@mock.patch('seqr.utils.file_utils.GS_STORAGE_BACKEND', 'api')
+@mock.patch('seqr.utils.file_utils.logger')
+class GcsApiStorageBackendTest(TestCase):
+
+    @responses.activate
+    def test_does_file_exist(self, mock_logger):
+        responses.add(responses.GET, f'{EMULATOR_URL}/storage/v1/b/bucket/o/path%2Fsample_1.cram?fields=name',
+                      match_querystring=True, json={'name': 'path/sample_1.cram'})
+        responses.add(
+            responses.GET,
+            f'{EMULATOR_URL}/storage/v1/b/fc-secure-bucket/o/sample_2.cram?fields=name&userProject=anvil-datastorage',
+            match_querystring=True, status=404)
+        responses.add(responses.GET, f'{EMULATOR_URL}/storage/v1/b/bucket/o/error.cram?fields=name',
+                      match_querystring=True, status=403, body='Forbidden')
+
+        self.assertTrue(does_file_exist('gs://bucket/path/sample_1.cram'))
+        self.assertFalse(does_file_exist('gs://fc-secure-bucket/sample_2.cram', user='test_user'))
+        mock_logger.info.assert_called_with('gs://fc-secure-bucket/sample_2.cram not found', 'test_user')
+        with self.assertRaises(Exception) as ee:
+            does_file_exist('gs://bucket/error.cram')
+        self.assertEqual(str(ee.exception), 'Google Storage request for gs://bucket/error.cram failed: 403 Forbidden')
+
+        self.assertDictEqual(get_files_exist([
+            'gs://bucket/path/sample_1.cram', 'gs://fc-secure-bucket/sample_2.cram',
+        ]), {'gs://bucket/path/sample_1.cram': True, 'gs://fc-secure-bucket/sample_2.cram': False})
+        self.assertEqual(len(responses.calls), 5)
+
+    @mock.patch('seqr.utils.file_utils.google.auth.default')
+    @responses.activate
+    def test_file_iter(self, mock_auth, mock_logger):
+        mock_credentials = mock.MagicMock()
+        mock_credentials.before_request.side_effect = lambda request, method, url, headers: headers.update(
+            {'Authorization': 'Bearer token'})
+        mock_auth.return_value = (mock_credentials, 'project')
+
+        url = 'https://storage.googleapis.com/download/storage/v1/b/bucket/o/data%2Ftest.vcf.gz?alt=media'
+        file_content = gzip.compress(b'##header\n#CHROM\tPOS\n') + gzip.compress(b'1\t100\n')
+        responses.add(responses.GET, url, match_querystring=True, body=file_content)
+        with mock.patch('seqr.utils.file_utils.GS_STORAGE_URL', 'https://storage.googleapis.com'):
+            self.assertListEqual(
+                list(file_iter('gs://bucket/data/test.vcf.gz')), ['##header\n', '#CHROM\tPOS\n', '1\t100\n'])
+        mock_auth.assert_called_with(scopes=['https://www.googleapis.com/auth/devstorage.read_write'])
+        self.assertEqual(responses.calls[0].request.headers['Authorization'], 'Bearer token')
+        self.assertIsNone(responses.calls[0].request.headers.get('Range'))
+
+        with mock.patch('seqr.utils.file_utils.GS_STORAGE_URL', 'https://storage.googleapis.com'):
+            self.assertListEqual(
+                list(file_iter('gs://bucket/data/test.vcf.gz', byte_range=(0, 100), raw_content=True)),
+                [file_content])
+        self.assertEqual(responses.calls[1].request.headers['Range'], 'bytes=0-100')
+        mock_auth.assert_called_once()
+
+    @responses.activate
+    def test_mv_file_to_gs(self, mock_logger):
+        uploaded = []
+
+        def _upload_callback(request):
+            uploaded.append(request.body.read())
+            return 200, {}, json.dumps({'name': 'target/data.txt'})
+
+        responses.add_callback(
+            responses.POST, f'{EMULATOR_URL}/upload/storage/v1/b/bucket/o?uploadType=media&name=target%2Fdata.txt',
+            match_querystring=True, callback=_upload_callback)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            local_path = os.path.join(temp_dir, 'data.txt')
+            with open(local_path, 'w') as f:
+                f.write('test data')
+            mv_file_to_gs(local_path, 'gs://bucket/target/data.txt', user='test_user')
+            self.assertFalse(os.path.exists(local_path))
+        self.assertListEqual(uploaded, [b'test data'])
+        mock_logger.info.assert_called_with(f'==> upload {local_path} to gs://bucket/target/data.txt', 'test_user')
+
+        with self.assertRaises(Exception) as ee:
+            mv_file_to_gs('/temp_path', '/another_path', user=None)
+        self.assertEqual(str(ee.exception),  'A Google Storage path is expected.')
+
+    @responses.activate
+    def test_get_gs_file_list(self, mock_logger):
+        list_url = f'{EMULATOR_URL}/storage/v1/b/bucket/o'
+
+        def _list_callback(request):
+            params = request.params
+            items = ['data/sample.vcf.gz', 'data/sub/sample-1.vcf.gz', 'data/sub/sample-2.vcf.gz', 'data/sub/sample.tbi']
+            items = [item for item in items if item.startswith(params['prefix'])]
+            response = {}
+            if params.get('delimiter'):
+                response['prefixes'] = sorted({
+                    params['prefix'] + item[len(params['prefix']):].split('/')[0] + '/'
+                    for item in items if '/' in item[len(params['prefix']):]
+                })
+                items = [item for item in items if '/' not in item[len(params['prefix']):]]
+            if params.get('pageToken'):
+                items = items[2:]
+            elif len(items) > 2:
+                items = items[:2]
+                response['nextPageToken'] = 'next'
+            response['items'] = [{'name': item} for item in items]
+            return 200, {}, json.dumps(response)
+
+        responses.add_callback(responses.GET, list_url, callback=_list_callback)
+
+        self.assertListEqual(get_gs_file_list('gs://bucket/data/'), [
+            'gs://bucket/data/sample.vcf.gz', 'gs://bucket/data/sub/sample-1.vcf.gz',
+            'gs://bucket/data/sub/sample-2.vcf.gz', 'gs://bucket/data/sub/sample.tbi',
+        ])
+        self.assertEqual(responses.calls[0].request.params['prefix'], 'data/')
+        self.assertEqual(len(responses.calls), 2)
+
+        self.assertListEqual(get_gs_file_list('gs://bucket/data', check_subfolders=False), [
+            'gs://bucket/data/sample.vcf.gz', 'gs://bucket/data/sub/',
+        ])
+        self.assertListEqual(get_gs_file_list('gs://bucket/data/sample.vcf.gz', check_subfolders=False), [
+            'gs://bucket/data/sample.vcf.gz',
+        ])
+        self.assertListEqual(get_gs_file_list('gs://bucket/data/sub/sample-*.vcf.gz', check_subfolders=False), [
+            'gs://bucket/data/sub/sample-1.vcf.gz', 'gs://bucket/data/sub/sample-2.vcf.gz',
+        ])
+        self.assertListEqual(get_gs_file_list('gs://bucket/data/*.vcf.gz', check_subfolders=False), [
+            'gs://bucket/data/sample.vcf.gz',
+        ])
+        self.assertListEqual(get_gs_file_list('gs://bucket/data/**.vcf.gz', check_subfolders=False), [
+            'gs://bucket/data/sample.vcf.gz', 'gs://bucket/data/sub/sample-1.vcf.gz',
+            'gs://bucket/data/sub/sample-2.vcf.gz',
+        ])
+
+        self.assertListEqual(get_gs_file_list('gs://bucket/missing', check_subfolders=False, allow_missing=True), [])
+        mock_logger.info.assert_called_with('One or more URLs matched no objects: gs://bucket/missing', None)
+        with self.assertRaises(Exception) as ee:
+            get_gs_file_list('gs://bucket/missing/*.vcf', check_subfolders=False)
+        self.assertEqual(str(ee.exception), 'One or more URLs matched no objects: gs://bucket/missing/*.vcf')
@@ -3,6 +3,7 @@ SEQR_DATSETS_GS_PATH = 'gs://seqr-datasets/v02'
 VCF_FILE_EXTENSIONS = ('.vcf', '.vcf.gz', '.vcf.bgz')
 
 MAX_EXPORT_VARIANTS = 1000
+MAX_SEARCH_AFTER_EXPORT_VARIANTS = 50000
 MAX_NO_LOCATION_COMP_HET_FAMILIES = 100
 
 XPOS_SORT_KEY = 'xpos'
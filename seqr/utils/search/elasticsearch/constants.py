@@ -7,11 +7,10 @@ from seqr.utils.search.constants import COMPOUND_HET, RECESSIVE, XPOS_SORT_KEY,
 
 
 MAX_VARIANTS = 10000
-MAX_COMPOUND_HET_GENES = 1000
+GENE_AGG_PAGE_SIZE = 1000
 MAX_INDEX_NAME_LENGTH = 4000
 MAX_SEARCH_CLAUSES = 1024
-MAX_INDEX_SEARCHES = 75
-PREFILTER_SEARCH_SIZE = 200
+MAX_MSEARCH_BATCH_SIZE = 25
 
 
 AFFECTED = Individual.AFFECTED_STATUS_AFFECTED
@@ -284,6 +283,7 @@ SORT_FIELDS.update({
     sort: [{sort_field: {'order': 'desc', 'unmapped_type': 'double', 'numeric_type': 'double'}}]
     for sort, sort_field in PREDICTOR_SORT_FIELDS.items()
 })
+SEARCH_AFTER_TIEBREAKER_SORT = '_index'
 
 SCREEN_KEY = 'SCREEN'
 CLINVAR_KEY = 'clinvar'
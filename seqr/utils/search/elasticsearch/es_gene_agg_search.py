@@ -1,7 +1,7 @@
 from collections import defaultdict
 
-from seqr.utils.search.elasticsearch.constants import MAX_COMPOUND_HET_GENES, HAS_ALT_FIELD_KEYS
-from seqr.utils.search.elasticsearch.es_search import EsSearch
+from seqr.utils.search.elasticsearch.constants import HAS_ALT_FIELD_KEYS
+from seqr.utils.search.elasticsearch.es_search import EsSearch, _gene_agg_bucket
 
 
 class EsGeneAggSearch(EsSearch):
@@ -18,9 +18,7 @@ class EsGeneAggSearch(EsSearch):
             searches += [index_search for index_search in index_searches]
 
         for search in searches:
-            agg = search.aggs.bucket(
-                'genes', 'terms', field='mainTranscript_gene_id', size=MAX_COMPOUND_HET_GENES+1
-            )
+            agg = _gene_agg_bucket(search, 'mainTranscript_gene_id')
             if self._no_sample_filters or self._any_affected_sample_filters:
                 for key in HAS_ALT_FIELD_KEYS:
                     agg.bucket(key, 'terms', field=key, size=10000)
@@ -57,14 +55,16 @@ class EsGeneAggSearch(EsSearch):
 
         return gene_aggs
 
-    def _parse_response(self, response):
-        if len(response.aggregations.genes.buckets) > MAX_COMPOUND_HET_GENES:
-            from seqr.utils.search.utils import InvalidSearchException
-            raise InvalidSearchException('This search returned too many genes')
+    def _parse_response(self, response, search=None):
+        families_by_sample = {}
+        for index_samples_by_family in self.samples_by_family_index.values():
+            for family_guid, samples_by_id in index_samples_by_family.items():
+                for sample_id in samples_by_id.keys():
+                    families_by_sample[sample_id] = family_guid
 
         gene_counts = defaultdict(lambda: {'total': 0, 'families': defaultdict(int), 'sample_ids': set()})
-        for gene_agg in response.aggregations.genes.buckets:
-            gene_id = gene_agg['key']
+        for gene_agg in self._iter_gene_agg_buckets(response, search):
+            gene_id = gene_agg['key']['gene_id']
             gene_counts[gene_id]['total'] += gene_agg['doc_count']
             if 'vars_by_gene' in gene_agg:
                 for hit in gene_agg['vars_by_gene']:
@@ -72,12 +72,6 @@ class EsGeneAggSearch(EsSearch):
                     for family_guid in hit.meta.matched_queries:
                         gene_counts[gene_id]['families'][family_guid] += 1
             else:
-                families_by_sample = {}
-                for index_samples_by_family in self.samples_by_family_index.values():
-                    for family_guid, samples_by_id in index_samples_by_family.items():
-                        for sample_id in samples_by_id.keys():
-                            families_by_sample[sample_id] = family_guid
-
                 for key in HAS_ALT_FIELD_KEYS:
                     for sample_agg in gene_agg[key]['buckets']:
                         family_guid = families_by_sample.get(sample_agg['key'])
@@ -1,12 +1,15 @@
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 import elasticsearch
 from elasticsearch_dsl import Search, Q, MultiSearch
 import hashlib
 import json
+import math
 from pyliftover.liftover import LiftOver
 from sys import maxsize
-from itertools import combinations
+from itertools import combinations, chain, islice
+import time
 
 from reference_data.models import GENOME_VERSION_GRCh38, GENOME_VERSION_GRCh37
 from seqr.models import Sample, Individual
@@ -15,15 +18,17 @@ from seqr.utils.search.elasticsearch.constants import \
     HAS_ALT_FIELD_KEYS, GENOTYPES_FIELD_KEY, POPULATION_RESPONSE_FIELD_CONFIGS, POPULATIONS, \
     SORTED_TRANSCRIPTS_FIELD_KEY, CORE_FIELDS_CONFIG, NESTED_FIELDS, PREDICTION_FIELDS_RESPONSE_CONFIG, INHERITANCE_FILTERS, \
     QUERY_FIELD_NAMES, REF_REF, ANY_AFFECTED, GENOTYPE_QUERY_MAP, HGMD_CLASS_MAP, \
-    SORT_FIELDS, MAX_VARIANTS, MAX_COMPOUND_HET_GENES, MAX_INDEX_NAME_LENGTH, QUALITY_QUERY_FIELDS, \
+    SORT_FIELDS, MAX_VARIANTS, GENE_AGG_PAGE_SIZE, MAX_INDEX_NAME_LENGTH, QUALITY_QUERY_FIELDS, \
     GRCH38_LOCUS_FIELD, MAX_SEARCH_CLAUSES, SV_SAMPLE_OVERRIDE_FIELD_CONFIGS, \
     PREDICTION_FIELD_LOOKUP, MULTI_FIELD_PREDICTORS, SPLICE_AI_FIELD, CLINVAR_KEY, HGMD_KEY, CLINVAR_PATH_SIGNIFICANCES, \
     PATH_FREQ_OVERRIDE_CUTOFF, AFFECTED, UNAFFECTED, HAS_ALT, CANONICAL_TRANSCRIPT_FILTER, \
-    get_prediction_response_key, XSTOP_FIELD, GENOTYPE_FIELDS, SCREEN_KEY, MAX_INDEX_SEARCHES, PREFILTER_SEARCH_SIZE
+    get_prediction_response_key, XSTOP_FIELD, GENOTYPE_FIELDS, SCREEN_KEY, SEARCH_AFTER_TIEBREAKER_SORT, \
+    MAX_MSEARCH_BATCH_SIZE
 from seqr.utils.logging_utils import SeqrLogger
 from seqr.utils.redis_utils import safe_redis_get_json, safe_redis_set_json
 from seqr.utils.xpos_utils import get_xpos, MIN_POS, MAX_POS, get_chrom_pos
 from seqr.views.utils.json_utils import _to_camel_case
+from settings import ELASTICSEARCH_MAX_PARALLEL_SEARCHES
 
 logger = SeqrLogger(__name__)
 
@@ -32,7 +37,8 @@ class EsSearch(object):
     AGGREGATION_NAME = 'compound het'
     CACHED_COUNTS_KEY = 'loaded_variant_counts'
 
-    def __init__(self, samples, genome_version, previous_search_results=None, return_all_queried_families=False, user=None, sort=None, skipped_samples=None):
+    def __init__(self, samples, genome_version, previous_search_results=None, return_all_queried_families=False, user=None, sort=None,
+                 skipped_samples=None, search_after=False):
         from seqr.utils.search.utils import InvalidSearchException
         from seqr.utils.search.elasticsearch.es_utils import get_es_client, InvalidIndexException
         self._client = get_es_client()
@@ -81,8 +87,11 @@ class EsSearch(object):
         self._paired_index_comp_het = False
         self._no_sample_filters = False
         self._any_affected_sample_filters = False
+        self._index_hit_parsers = {}
 
         self._sort = deepcopy(SORT_FIELDS.get(sort, [])) if sort else None
+        # search_after pagination requires a deterministic sort order for all hits
+        self._use_search_after = search_after and self._sort is not None
         if self._sort:
             self._sort_variants(samples)
 
@@ -195,6 +204,10 @@ class EsSearch(object):
         if 'variantId' not in self._sort:
             self._sort.append('variantId')
 
+        # the same variant may be present in multiple indices, so search_after needs an additional unique sort
+        if self._use_search_after and SEARCH_AFTER_TIEBREAKER_SORT not in self._sort:
+            self._sort.append(SEARCH_AFTER_TIEBREAKER_SORT)
+
         self._search = self._search.sort(*self._sort)
 
     def _filter(self, new_filter):
@@ -499,11 +512,7 @@ class EsSearch(object):
             ] if len(compound_het_qs) > MAX_SEARCH_CLAUSES else [compound_het_qs]
             for compound_het_q in comp_het_qs_list:
                 compound_het_search = comp_het_search.filter(_or_filters(compound_het_q))
-                compound_het_search.aggs.bucket(
-                    'genes', 'terms', field='geneIds', min_doc_count=2, size=MAX_COMPOUND_HET_GENES + 1
-                ).metric(
-                    'vars_by_gene', 'top_hits', size=100, sort=self._sort, _source=QUERY_FIELD_NAMES
-                )
+                _gene_agg_bucket(compound_het_search, 'geneIds')
                 self._index_searches[index].append(compound_het_search)
 
     def _get_paired_indices_comp_het_queries(self, comp_het_qs_by_index, quality_filters_by_family):
@@ -589,14 +598,15 @@ class EsSearch(object):
 
         if is_single_search and not self.previous_search_results.get('grouped_results'):
             start_index = None
-            if (page - 1) * num_results < num_loaded:
+            # search_after can only continue from the last loaded result, so it can not skip pages
+            if self._use_search_after or (page - 1) * num_results < num_loaded:
                 start_index = num_loaded
             return True, {'page': page, 'num_results': num_results, 'start_index': start_index}
         elif not self._index_searches:
             # If doing all project-families all inheritance search, do it as a single query
             # Load all variants, do not skip pages
             num_loaded += self.previous_search_results.get('duplicate_doc_count', 0)
-            if num_loaded >= (page - 1) * num_results:
+            if self._use_search_after or num_loaded >= (page - 1) * num_results:
                 start_index = num_loaded
             else:
                 start_index = 0
@@ -609,12 +619,14 @@ class EsSearch(object):
         if num_results_for_search > MAX_VARIANTS and deduplicate:
             num_results_for_search = MAX_VARIANTS
         searches, log_messages = self._get_paginated_searches(
-            self.index_name, page=page, num_results=num_results_for_search, start_index=start_index
+            self.index_name, page=page, num_results=num_results_for_search, start_index=start_index,
+            search_after=self._get_search_after(self.index_name, start_index),
         )
         logger.info(log_messages[0], self._user)
         search = searches[0]
         response = self._execute_search(search)
-        parsed_response = self._parse_response(response)
+        parsed_response = self._parse_response(response, search)
+        self._save_search_after(self.index_name, 0, search, response)
         return self._process_single_search_response(
             parsed_response, page=page, num_results=num_results, deduplicate=deduplicate, **kwargs)
 
@@ -632,9 +644,9 @@ class EsSearch(object):
         if deduplicate:
             variant_results = self._deduplicate_results(variant_results)
 
-        # Only save contiguous pages of results:
+        # Only save contiguous pages of results, search_after results are always contiguous
         previous_all_results = self.previous_search_results.get('all_results', [])
-        if len(previous_all_results) >= results_start_index:
+        if len(previous_all_results) >= results_start_index or self._use_search_after:
             self.previous_search_results['all_results'] = self.previous_search_results.get('all_results', []) + variant_results
             variant_results = self.previous_search_results['all_results'][results_start_index:]
 
@@ -659,47 +671,74 @@ class EsSearch(object):
                 else:
                     self.previous_search_results[self.CACHED_COUNTS_KEY][index_name] = {'loaded': 0, 'total': 0}
 
-            searches, log_messages = self._get_paginated_searches(index_name, start_index=start_index, **kwargs)
+            searches, log_messages = self._get_paginated_searches(
+                index_name, start_index=start_index, search_after=self._get_search_after(index_name, start_index),
+                **kwargs)
             if searches:
                 paginated_index_searches[index_name] = searches
                 index_logs[index_name] = log_messages
 
-        if len(paginated_index_searches) > MAX_INDEX_SEARCHES:
-            index_possible_variants, all_inheritance_response = self._get_possible_hit_indices()
-            if index_possible_variants:
-                paginated_index_searches = {
-                    index_name: [
-                        search.query('ids', values=possible_ids) for search in paginated_index_searches[index_name]
-                    ] for index_name, possible_ids in index_possible_variants.items()
-                    if paginated_index_searches.get(index_name)
-                }
-            elif all_inheritance_response is not None:
-                # all inheritance search succeeded but has no results, return an empty response
-                return self._process_single_search_response(self._parse_response(all_inheritance_response), **kwargs)
-
-        ms = MultiSearch()
-        for index_name, searches in paginated_index_searches.items():
-            for search in searches:
-                ms = ms.add(search)
+        searches = []
+        search_keys = []
+        for index_name, index_searches in paginated_index_searches.items():
+            searches += index_searches
+            search_keys += [(index_name, i) for i in range(len(index_searches))]
             for message in index_logs[index_name]:
                 logger.info(message, self._user)
 
-        responses = self._execute_search(ms) if ms._searches else []
-        parsed_responses = [self._parse_response(response) for response in responses]
+        responses = self._execute_batched_multi_search(searches, num_searches=len(searches))
+        parsed_responses = []
+        for (index_name, i), search, response in zip(search_keys, searches, responses):
+            parsed_responses.append(self._parse_response(response, search))
+            self._save_search_after(index_name, i, search, response)
         return self._process_multi_search_responses(parsed_responses, **kwargs)
 
-    def _get_possible_hit_indices(self):
-        no_inheritance_search = self._search.index(self.index_name).source('')[:PREFILTER_SEARCH_SIZE]
-        response = no_inheritance_search.using(self._client).execute()
-        if response.hits.total['value'] > len(response.hits):
-            return None, None
+    def _get_search_after(self, index_name, start_index):
+        """Returns the sort values of the last loaded hit for each of the searches for the given index"""
+        if not (self._use_search_after and start_index):
+            return None
+        return self.previous_search_results.get('search_after', {}).get(index_name)
 
-        index_possible_variants = defaultdict(list)
-        for hit in response.hits:
-            index_possible_variants[hit.meta.index].append(hit.meta.id)
+    def _save_search_after(self, index_name, search_index, search, response):
+        if not (self._use_search_after and response.hits) or search.aggs.to_dict():
+            return
+        index_search_after = self.previous_search_results.setdefault('search_after', {}).setdefault(index_name, [])
+        index_search_after += [None] * (search_index + 1 - len(index_search_after))
+        index_search_after[search_index] = list(response.hits[-1].meta.sort)
+
+    def _execute_batched_multi_search(self, searches, num_searches=None):
+        """Yields the responses for the given searches in order, with at most ELASTICSEARCH_MAX_PARALLEL_SEARCHES msearch
+        batches in flight. Searches are only consumed as batches are submitted, so they may be lazily generated"""
+        searches = iter(searches)
+        batches = iter(lambda: list(islice(searches, MAX_MSEARCH_BATCH_SIZE)), [])
+        first_batches = list(islice(batches, 2))
+        if len(first_batches) < 2:
+            for batch in first_batches:
+                yield from self._execute_multi_search_batch(batch)
+            return
 
-        logger.info(f'Filtering search to {len(index_possible_variants)} indices with possible hits', self._user)
-        return index_possible_variants, response
+        num_batches = '/{}'.format(math.ceil(num_searches / MAX_MSEARCH_BATCH_SIZE)) if num_searches else ''
+        with ThreadPoolExecutor(max_workers=ELASTICSEARCH_MAX_PARALLEL_SEARCHES) as executor:
+            in_flight = deque()
+            for batch_index, batch in enumerate(chain(first_batches, batches)):
+                if len(in_flight) >= ELASTICSEARCH_MAX_PARALLEL_SEARCHES:
+                    yield from in_flight.popleft().result()
+                in_flight.append(executor.submit(
+                    self._execute_multi_search_batch, batch,
+                    batch_name=' batch {}{}'.format(batch_index + 1, num_batches)))
+            # responses are yielded in the order the batches were submitted, so are in the same order as the searches
+            while in_flight:
+                yield from in_flight.popleft().result()
+
+    def _execute_multi_search_batch(self, searches, batch_name=''):
+        ms = MultiSearch()
+        for search in searches:
+            ms = ms.add(search)
+        start = time.time()
+        responses = self._execute_search(ms)
+        logger.info('Executed {} searches in msearch{} ({} seconds)'.format(
+            len(searches), batch_name, round(time.time() - start, 3)), self._user)
+        return responses
 
     def _process_multi_search_responses(self, parsed_responses, page=1, num_results=100):
         new_results = []
@@ -752,10 +791,10 @@ class EsSearch(object):
             self.previous_search_results['variant_results'] = variant_results[num_loaded:]
             return self.previous_search_results['all_results'][end_index-num_results:end_index]
 
-    def _parse_response(self, response):
+    def _parse_response(self, response, search=None):
         index_name = response.hits[0].meta.index if response.hits else None
         if hasattr(response.aggregations, 'genes') and response.hits:
-            response_hits, response_total = self._parse_compound_het_response(response)
+            response_hits, response_total = self._parse_compound_het_response(response, search)
             return response_hits, response_total, True, index_name
 
         response_total = response.hits.total['value']
@@ -763,18 +802,55 @@ class EsSearch(object):
         return [self._parse_hit(hit) for hit in response], response_total, False, index_name
 
 
+    def _get_index_hit_parser(self, index_name):
+        """Field extractors and sample lookups used to parse hits, compiled once per index"""
+        if index_name not in self._index_hit_parsers:
+            index_family_samples = self.samples_by_family_index[index_name]
+            samples_by_id = defaultdict(list)
+            for family_guid, family_samples in index_family_samples.items():
+                for sample_id, sample in family_samples.items():
+                    samples_by_id[sample_id].append((family_guid, sample))
+
+            data_type = self._get_index_dataset_type(index_name)
+            index_fields = self.index_metadata[index_name]['fields']
+            self._index_hit_parsers[index_name] = {
+                'family_samples': index_family_samples,
+                'samples_by_id': dict(samples_by_id),
+                'data_type': data_type,
+                'clinvar_version': self.index_metadata[index_name].get('clinvar_version'),
+                'genotype_fields': _compile_field_values_getter(GENOTYPE_FIELDS[data_type]),
+                'core_fields': _compile_field_values_getter(CORE_FIELDS_CONFIG, format_response_key=str),
+                'nested_fields': {
+                    field_name: _compile_field_values_getter(fields, lookup_field_prefix=field_name)
+                    for field_name, fields in NESTED_FIELDS.items()
+                },
+                'population_fields': {
+                    population: _compile_field_values_getter(
+                        POPULATION_RESPONSE_FIELD_CONFIGS, format_response_key=lambda key: key.lower(),
+                        lookup_field_prefix=population,
+                        existing_fields=index_fields,
+                        get_addl_fields=lambda field, pop_config=pop_config: pop_config[field] if isinstance(pop_config[field], list) else [pop_config[field]],
+                        skip_fields=[field for field, val in pop_config.items() if val is None],
+                    )
+                    for population, pop_config in POPULATIONS.items()
+                },
+                'prediction_fields': _compile_field_values_getter(
+                    PREDICTION_FIELDS_RESPONSE_CONFIG, format_response_key=get_prediction_response_key,
+                    get_addl_fields=lambda field: MULTI_FIELD_PREDICTORS.get(field, [])
+                ),
+            }
+        return self._index_hit_parsers[index_name]
+
     def _parse_hit(self, raw_hit):
         hit = {k: raw_hit[k] for k in QUERY_FIELD_NAMES if k in raw_hit}
-        index_name = raw_hit.meta.index
-        index_family_samples = self.samples_by_family_index[index_name]
-        data_type = self._get_index_dataset_type(index_name)
+        hit_parser = self._get_index_hit_parser(raw_hit.meta.index)
+        data_type = hit_parser['data_type']
 
-        family_guids, genotypes = self._parse_genotypes(raw_hit, hit, index_family_samples, data_type)
+        family_guids, genotypes = self._parse_genotypes(raw_hit, hit, hit_parser)
 
-        result = _get_field_values(hit, CORE_FIELDS_CONFIG, format_response_key=str)
+        result = hit_parser['core_fields'](hit)
         result.update({
-            field_name: _get_field_values(hit, fields, lookup_field_prefix=field_name)
-            for field_name, fields in NESTED_FIELDS.items()
+            field_name: get_field_values(hit) for field_name, get_field_values in hit_parser['nested_fields'].items()
         })
         if hasattr(raw_hit.meta, 'sort'):
             result['_sort'] = [_parse_es_sort(sort, self._sort[i]) for i, sort in enumerate(raw_hit.meta.sort)]
@@ -783,21 +859,15 @@ class EsSearch(object):
         if self._genome_version == GENOME_VERSION_GRCh38:
             self._add_liftover(result, hit)
         self._parse_xstop(result)
-        result[CLINVAR_KEY]['version'] = self.index_metadata[index_name].get('clinvar_version')
+        result[CLINVAR_KEY]['version'] = hit_parser['clinvar_version']
 
         # If an SV has genotype-specific coordinates that differ from the main coordinates, use those
         if data_type == Sample.DATASET_TYPE_SV_CALLS and genotypes:
             self._set_sv_genotype_coords(genotypes, result)
 
         populations = {
-            population: _get_field_values(
-                hit, POPULATION_RESPONSE_FIELD_CONFIGS, format_response_key=lambda key: key.lower(),
-                lookup_field_prefix=population,
-                existing_fields=self.index_metadata[index_name]['fields'],
-                get_addl_fields=lambda field: pop_config[field] if isinstance(pop_config[field], list) else [pop_config[field]],
-                skip_fields=[field for field, val in pop_config.items() if val is None],
-            )
-            for population, pop_config in POPULATIONS.items()
+            population: get_field_values(hit)
+            for population, get_field_values in hit_parser['population_fields'].items()
         }
 
         sorted_transcripts = [
@@ -828,15 +898,14 @@ class EsSearch(object):
             'mainTranscriptId': main_transcript_id,
             'selectedMainTranscriptId': selected_main_transcript_id,
             'populations': populations,
-            'predictions': _get_field_values(
-                hit, PREDICTION_FIELDS_RESPONSE_CONFIG, format_response_key=get_prediction_response_key,
-                get_addl_fields=lambda field: MULTI_FIELD_PREDICTORS.get(field, [])
-            ),
+            'predictions': hit_parser['prediction_fields'](hit),
             'transcripts': dict(transcripts),
         })
         return result
 
-    def _parse_genotypes(self, raw_hit, hit, index_family_samples, data_type):
+    def _parse_genotypes(self, raw_hit, hit, hit_parser):
+        index_family_samples = hit_parser['family_samples']
+        samples_by_id = hit_parser['samples_by_id']
         if hasattr(raw_hit.meta, 'matched_queries'):
             family_guids = list(raw_hit.meta.matched_queries)
         elif self._return_all_queried_families:
@@ -856,26 +925,27 @@ class EsSearch(object):
             else:
                 _is_matched_sample = lambda *args: True
 
-            family_guids = [family_guid for family_guid, samples_by_id in index_family_samples.items()
-                if any(sample_id in alt_allele_samples and _is_matched_sample(family_guid, sample)
-                       for sample_id, sample in samples_by_id.items())]
+            matched_family_guids = {
+                family_guid for sample_id in alt_allele_samples for family_guid, sample in samples_by_id.get(sample_id, [])
+                if _is_matched_sample(family_guid, sample)
+            }
+            family_guids = [family_guid for family_guid in index_family_samples if family_guid in matched_family_guids]
 
         genotypes = {}
-        genotype_fields_config = GENOTYPE_FIELDS[data_type]
-        for family_guid in family_guids:
-            samples_by_id = index_family_samples[family_guid]
-            for genotype_hit in hit[GENOTYPES_FIELD_KEY]:
-                sample = samples_by_id.get(genotype_hit['sample_id'])
-                if sample:
+        get_genotype_fields = hit_parser['genotype_fields']
+        family_guid_set = set(family_guids)
+        for genotype_hit in hit[GENOTYPES_FIELD_KEY]:
+            for family_guid, sample in samples_by_id.get(genotype_hit['sample_id'], []):
+                if family_guid in family_guid_set:
                     genotype_hit['sample_type'] = sample.sample_type
-                    genotypes[sample.individual.guid] = _get_field_values(genotype_hit, genotype_fields_config)
+                    genotypes[sample.individual.guid] = get_genotype_fields(genotype_hit)
 
-            if len(samples_by_id) != len(genotypes) and data_type == Sample.DATASET_TYPE_SV_CALLS:
-                # Family members with no variants are not included in the SV index
-                for sample_id, sample in samples_by_id.items():
+        if hit_parser['data_type'] == Sample.DATASET_TYPE_SV_CALLS:
+            # Family members with no variants are not included in the SV index
+            for family_guid in family_guids:
+                for sample_id, sample in index_family_samples.get(family_guid, {}).items():
                     if sample.individual.guid not in genotypes:
-                        genotypes[sample.individual.guid] = _get_field_values(
-                            {'sample_id': sample_id}, genotype_fields_config)
+                        genotypes[sample.individual.guid] = get_genotype_fields({'sample_id': sample_id})
                         genotypes[sample.individual.guid]['isRef'] = True
                         genotypes[sample.individual.guid]['cn'] = \
                             1 if hit['contig'] == 'X' and sample.individual.sex == Individual.SEX_MALE else 2
@@ -964,11 +1034,47 @@ class EsSearch(object):
             'liftedOverPos': lifted_over_pos,
         })
 
-    def _parse_compound_het_response(self, response):
-        if len(response.aggregations.genes.buckets) > MAX_COMPOUND_HET_GENES:
-            from seqr.utils.search.utils import InvalidSearchException
-            raise InvalidSearchException('This search returned too many compound heterozygous variants. Please add stricter filters')
+    def _iter_gene_agg_buckets(self, response, search):
+        """Yields the buckets for every page of the composite gene aggregation, fetching pages as they are needed"""
+        page = 1
+        while True:
+            buckets = response.aggregations.genes.buckets
+            for bucket in buckets:
+                yield bucket
 
+            after_key = getattr(response.aggregations.genes, 'after_key', None)
+            if not (buckets and after_key):
+                return
+
+            page += 1
+            search_body = search.to_dict()
+            search_body['aggs']['genes']['composite']['after'] = after_key.to_dict()
+            search = search.extra().update_from_dict(search_body)
+            logger.info('Loading {}s page {}'.format(self.AGGREGATION_NAME, page), self._user)
+            response = self._execute_search(search)
+
+    def _iter_gene_variant_buckets(self, search, gene_ids):
+        """Yields a bucket with the top variant hits for each of the given genes, loaded in batched searches as the
+        gene ids are iterated"""
+        for response in self._execute_batched_multi_search(self._iter_gene_variant_searches(search, gene_ids)):
+            for bucket in response.aggregations.genes.buckets:
+                yield bucket
+
+    def _iter_gene_variant_searches(self, search, gene_ids):
+        search_body = search.to_dict()
+        gene_field = search_body['aggs']['genes']['composite']['sources'][0]['gene_id']['terms']['field']
+        gene_ids = iter(gene_ids)
+        page_gene_ids = list(islice(gene_ids, GENE_AGG_PAGE_SIZE))
+        while page_gene_ids:
+            logger.info('Loading variants for {} {} genes'.format(len(page_gene_ids), self.AGGREGATION_NAME), self._user)
+            search_body['aggs'] = {'genes': {
+                'terms': {'field': gene_field, 'include': page_gene_ids, 'size': len(page_gene_ids)},
+                'aggs': {'vars_by_gene': {'top_hits': {'size': 100, 'sort': self._sort, '_source': QUERY_FIELD_NAMES}}},
+            }}
+            yield search.extra().update_from_dict(search_body)
+            page_gene_ids = list(islice(gene_ids, GENE_AGG_PAGE_SIZE))
+
+    def _parse_compound_het_response(self, response, search):
         family_unaffected_individual_guids = {
             family_guid: {individual_guid for individual_guid, affected_status in individual_affected_status.items() if
                           affected_status == Individual.AFFECTED_STATUS_UNAFFECTED}
@@ -979,8 +1085,14 @@ class EsSearch(object):
         if self._allowed_consequences_secondary:
             self._allowed_consequences_secondary += self._consequence_overrides.keys()
 
+        # Composite aggregations do not support a min_doc_count, so variants are only loaded for genes with multiple
+        # variants as the gene aggregation pages are read, rather than returning hits for every single variant gene
+        gene_ids = (
+            gene_agg['key']['gene_id'] for gene_agg in self._iter_gene_agg_buckets(response, search)
+            if gene_agg['doc_count'] > 1
+        )
         compound_het_pairs_by_gene = {}
-        for gene_agg in response.aggregations.genes.buckets:
+        for gene_agg in self._iter_gene_variant_buckets(search, gene_ids):
             self._parse_compound_het_gene(gene_agg, compound_het_pairs_by_gene, family_unaffected_individual_guids)
 
         total_compound_het_results = sum(len(compound_het_pairs) for compound_het_pairs in compound_het_pairs_by_gene.values())
@@ -992,12 +1104,12 @@ class EsSearch(object):
         return compound_het_results, total_compound_het_results
 
     def _parse_compound_het_gene(self, gene_agg, compound_het_pairs_by_gene, family_unaffected_individual_guids):
-        gene_variants = [self._parse_hit(hit) for hit in gene_agg['vars_by_gene']]
         gene_id = gene_agg['key']
-
         if gene_id in compound_het_pairs_by_gene:
             return
 
+        gene_variants = [self._parse_hit(hit) for hit in gene_agg['vars_by_gene']]
+
         # Variants are returned if any transcripts have the filtered consequence, but to be compound het
         # the filtered consequence needs to be present in at least one transcript in the gene of interest
         if self._allowed_consequences:
@@ -1240,10 +1352,10 @@ class EsSearch(object):
         self.previous_search_results['variant_results'] = variant_results[num_single_variants:]
         return merged_variant_results
 
-    def _get_paginated_searches(self, index_name, page=1, num_results=100, start_index=None):
+    def _get_paginated_searches(self, index_name, page=1, num_results=100, start_index=None, search_after=None):
         searches = []
         log_messages = []
-        for search in self._index_searches.get(index_name, [self._search]):
+        for i, search in enumerate(self._index_searches.get(index_name, [self._search])):
             search = search.index(index_name.split(','))
 
             if search.aggs.to_dict():
@@ -1255,9 +1367,19 @@ class EsSearch(object):
                 if start_index is None:
                     start_index = end_index - num_results
 
-                search = search[start_index:end_index]
+                search_after_values = search_after[i] if search_after and i < len(search_after) else None
+                if self._use_search_after:
+                    # Continue from the last loaded hit instead of having elasticsearch skip over all previous hits,
+                    # so pages are never limited by the max result window
+                    if search_after_values:
+                        search = search.extra(search_after=search_after_values)
+                    search = search[:min(end_index - start_index, MAX_VARIANTS)]
+                else:
+                    search = search[start_index:end_index]
                 search = search.source(QUERY_FIELD_NAMES)
-                log_messages.append('Loading {} records {}-{}'.format(index_name, start_index, end_index))
+                log_messages.append('Loading {} records {}-{}{}'.format(
+                    index_name, start_index, end_index,
+                    ' (search after {})'.format(search_after_values) if search_after_values else ''))
 
             searches.append(search)
         return searches, log_messages
@@ -1546,6 +1668,12 @@ def _or_filters(filter_qs):
     return q
 
 
+def _gene_agg_bucket(search, field):
+    return search.aggs.bucket(
+        'genes', 'composite', sources=[{'gene_id': {'terms': {'field': field}}}], size=GENE_AGG_PAGE_SIZE,
+    )
+
+
 def _sort_compound_hets(grouped_variants):
     return sorted(grouped_variants, key=lambda variants: next(iter(variants.values()))[0]['_sort'])
 
@@ -1579,21 +1707,33 @@ def _parse_es_sort(sort, sort_config):
     return sort
 
 
-def _get_field_values(hit, field_configs, format_response_key=_to_camel_case, get_addl_fields=None, lookup_field_prefix='', existing_fields=None, skip_fields=None):
-    return {
-        field_config.get('response_key') or format_response_key(field): _value_if_has_key(
-            hit,
-            (get_addl_fields(field) if get_addl_fields else []) +
-            ['{}_{}'.format(lookup_field_prefix, field) if lookup_field_prefix else field],
-            existing_fields=existing_fields,
-            **field_config
-        ) if field not in (skip_fields or []) else None
-        for field, field_config in field_configs.items()
-    }
-
-
-def _value_if_has_key(hit, keys, format_value=None, default_value=None, existing_fields=None, **kwargs):
-    for key in keys:
-        if key in hit:
-            return format_value(default_value if hit[key] is None else hit[key]) if format_value else hit[key]
-    return default_value if not existing_fields or any(key in existing_fields for key in keys) else None
+def _compile_field_values_getter(field_configs, format_response_key=_to_camel_case, get_addl_fields=None, lookup_field_prefix='', existing_fields=None, skip_fields=None):
+    """Resolves the response keys, lookup keys and defaults for the given field configs up front, and returns a function
+    which extracts the configured fields from a single hit"""
+    field_getters = []
+    for field, field_config in field_configs.items():
+        response_key = field_config.get('response_key') or format_response_key(field)
+        if field in (skip_fields or []):
+            field_getters.append((response_key, (), None, None, None))
+            continue
+        keys = tuple((get_addl_fields(field) if get_addl_fields else []) + [
+            '{}_{}'.format(lookup_field_prefix, field) if lookup_field_prefix else field
+        ])
+        default_value = field_config.get('default_value')
+        missing_value = default_value if not existing_fields or any(key in existing_fields for key in keys) else None
+        field_getters.append((response_key, keys, field_config.get('format_value'), default_value, missing_value))
+
+    def _get_field_values(hit):
+        field_values = {}
+        for response_key, keys, format_value, default_value, missing_value in field_getters:
+            value = missing_value
+            for key in keys:
+                if key in hit:
+                    value = hit[key]
+                    if format_value:
+                        value = format_value(default_value if value is None else value)
+                    break
+            field_values[response_key] = value
+        return field_values
+
+    return _get_field_values
@@ -49,18 +49,49 @@ def es_backend_enabled():
     return bool(ELASTICSEARCH_SERVICE_HOSTNAME)
 
 
-def get_es_client(timeout=60, **kwargs):
+# Clients are thread safe and hold their own urllib3 connection pool, so they are shared for the lifetime of the process
+ES_CLIENT_POOL_SIZE = 25
+ES_CLIENT_DEFAULT_KWARGS = {
+    'maxsize': ES_CLIENT_POOL_SIZE,
+    'http_compress': True,
+    'sniff_on_start': False,
+    'sniff_on_connection_fail': False,
+    'sniffer_timeout': None,
+}
+_es_clients = {}
+
+
+def _create_es_client(timeout, **kwargs):
     client_kwargs = {
         'hosts': [{'host': ELASTICSEARCH_SERVICE_HOSTNAME, 'port': ELASTICSEARCH_SERVICE_PORT}],
         'timeout': timeout,
     }
+    client_kwargs.update(ES_CLIENT_DEFAULT_KWARGS)
     if ELASTICSEARCH_CREDENTIALS:
         client_kwargs['http_auth'] = ELASTICSEARCH_CREDENTIALS
     if ELASTICSEARCH_PROTOCOL:
         client_kwargs['scheme'] = ELASTICSEARCH_PROTOCOL
     if ES_SSL_CONTEXT:
         client_kwargs['ssl_context'] = ES_SSL_CONTEXT
-    return Elasticsearch(**client_kwargs, **kwargs)
+    client_kwargs.update(kwargs)
+    return Elasticsearch(**client_kwargs)
+
+
+def get_es_client(timeout=60, client_factory=_create_es_client, **kwargs):
+    """Returns a cached client for the given default timeout and retry options.
+
+    Timeouts for individual requests can still be overridden with the "request_timeout" request option
+    """
+    cache_key = (client_factory, ELASTICSEARCH_SERVICE_HOSTNAME, timeout, tuple(sorted(kwargs.items())))
+    if cache_key not in _es_clients:
+        _es_clients[cache_key] = client_factory(timeout, **kwargs)
+    return _es_clients[cache_key]
+
+
+def clear_es_client_cache():
+    for client in _es_clients.values():
+        client.transport.close()
+    _es_clients.clear()
 
 
 def ping_elasticsearch():
@@ -271,7 +302,7 @@ def get_es_variants_for_variant_ids(samples, genome_version, variants_by_id, use
 
 
 def get_es_variants(samples, search, user, previous_search_results, genome_version, sort=None, page=None, num_results=None,
-                    gene_agg=False, skip_genotype_filter=False):
+                    gene_agg=False, skip_genotype_filter=False, search_after=False):
     es_search_cls = EsGeneAggSearch if gene_agg else EsSearch
 
     es_search = es_search_cls(
@@ -281,6 +312,7 @@ def get_es_variants(samples, search, user, previous_search_results, genome_versi
         user=user,
         sort=sort,
         skipped_samples=search.get('skipped_samples'),
+        search_after=search_after,
     )
 
     es_search.filter_variants(
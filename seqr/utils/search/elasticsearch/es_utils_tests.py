@@ -1,4 +1,5 @@
 from copy import deepcopy
+import gzip
 import mock
 import jmespath
 import json
@@ -15,7 +16,7 @@ from seqr.models import Project, Family, Sample, VariantSearch, VariantSearchRes
 from seqr.utils.search.utils import get_single_variant, query_variants, \
     get_variant_query_gene_counts, get_variants_for_variant_ids, InvalidSearchException
 from seqr.utils.search.elasticsearch.es_search import _get_family_affected_status, _liftover_grch38_to_grch37
-from seqr.utils.search.elasticsearch.es_utils import InvalidIndexException
+from seqr.utils.search.elasticsearch.es_utils import InvalidIndexException, get_es_client, clear_es_client_cache
 from seqr.views.utils.test_utils import PARSED_VARIANTS, PARSED_SV_VARIANT, PARSED_SV_WGS_VARIANT,\
     PARSED_MITO_VARIANT, TRANSCRIPT_2, PARSED_COMPOUND_HET_VARIANTS_MULTI_PROJECT
 
@@ -35,8 +36,23 @@ class Urllib3Responses(Responses):
         self.add_json(url, *args, **kwargs)
         self._urls[existing_index] = self._urls.pop()
 
+    def search_calls(self):
+        # Variants for compound het genes are loaded in separate searches after their gene aggregation search
+        return [call for call in self.calls if not is_gene_variants_request(call.request)]
+
     def call_request_json(self, index=-1):
-        return json.loads(self.calls[index].request.body)
+        return json.loads(get_request_body(self.search_calls()[index].request))
+
+
+def get_request_body(request):
+    # The es client compresses request bodies
+    return gzip.decompress(request.body)
+
+
+def is_gene_variants_request(request):
+    return request.url == '/_msearch' and any(
+        'terms' in search.get('aggs', {}).get('genes', {}) for search in parse_msearch_body(get_request_body(request))
+    )
 
 
 urllib3_responses = Urllib3Responses()
@@ -1248,19 +1264,31 @@ def create_mock_response(search, index=INDEX_NAME):
 
     if search.get('aggs'):
         index_vars = COMPOUND_HET_INDEX_VARIANTS.get(index, {})
-        buckets = [{'key': gene_id, 'doc_count': 3} for gene_id in ['ENSG00000135953', 'ENSG00000228198']]
-        if search['aggs']['genes']['aggs'].get('vars_by_gene'):
-            for bucket in buckets:
+        genes_agg = search['aggs']['genes']
+        gene_ids = ['ENSG00000135953', 'ENSG00000228198']
+        if 'terms' in genes_agg:
+            gene_ids = [gene_id for gene_id in gene_ids if gene_id in genes_agg['terms']['include']]
+            buckets = [{'key': gene_id, 'doc_count': 3} for gene_id in gene_ids]
+        else:
+            composite_agg = genes_agg['composite']
+            after_gene_id = composite_agg.get('after', {}).get('gene_id')
+            if after_gene_id:
+                gene_ids = gene_ids[gene_ids.index(after_gene_id) + 1:]
+            has_next_page = len(gene_ids) > composite_agg['size']
+            gene_ids = gene_ids[:composite_agg['size']]
+            buckets = [{'key': {'gene_id': gene_id}, 'doc_count': 3} for gene_id in gene_ids]
+        if genes_agg.get('aggs', {}).get('vars_by_gene'):
+            for gene_id, bucket in zip(gene_ids, buckets):
                 bucket['vars_by_gene'] = {
                     'hits': {
-                        'hits': mock_hits(index_vars.get(bucket['key'], ES_VARIANTS), increment_sort=True, index=index)
+                        'hits': mock_hits(index_vars.get(gene_id, ES_VARIANTS), increment_sort=True, index=index)
                     }}
-        else:
-            for bucket in buckets:
+        elif genes_agg.get('aggs'):
+            for gene_id, bucket in zip(gene_ids, buckets):
                 doc_count = 0
                 for sample_field in ['samples', 'samples_num_alt_1', 'samples_num_alt_2']:
                     gene_samples = defaultdict(int)
-                    for var in index_vars.get(bucket['key'], ES_VARIANTS):
+                    for var in index_vars.get(gene_id, ES_VARIANTS):
                         for sample in var['_source'].get(sample_field, []):
                             gene_samples[sample] += 1
                     bucket[sample_field] = {'buckets': [{'key': k, 'doc_count': v} for k, v in gene_samples.items()]}
@@ -1268,11 +1296,11 @@ def create_mock_response(search, index=INDEX_NAME):
                 bucket['doc_count'] = doc_count
 
         response_dict['aggregations'] = {'genes': {'buckets': buckets}}
+        if 'composite' in genes_agg and has_next_page:
+            response_dict['aggregations']['genes']['after_key'] = buckets[-1]['key']
 
     if len(response_dict['hits']['hits']) == 0:
         response_dict['hits']['total']['value'] = 0
-    elif gene_ids_filters == {'ENSG00000186092'}:
-        response_dict['hits']['total']['value'] = 1
 
 
     return response_dict
@@ -1286,7 +1314,7 @@ def get_metadata_callback(request):
     return 200, {}, json.dumps(response)
 
 def get_search_callback(request):
-    body = json.loads(request.body)
+    body = json.loads(get_request_body(request))
     response = create_mock_response(body, get_indices_from_url(request.url))
     return 200, {}, json.dumps(response)
 
@@ -1294,7 +1322,7 @@ def parse_msearch_body(body):
     return [json.loads(row) for row in body.decode().split('\n') if row]
 
 def get_msearch_callback(request):
-    body = parse_msearch_body(request.body)
+    body = parse_msearch_body(get_request_body(request))
     response = {
         'responses': [
             create_mock_response(exec_search, index=','.join(body[i-1]['index']))
@@ -1329,7 +1357,7 @@ class EsUtilsTest(TestCase):
 
     def assertExecutedSearch(self, filters=None, start_index=0, size=2, index=INDEX_NAME, expected_source_fields=SOURCE_FIELDS, call_index=-1, **kwargs):
         executed_search = urllib3_responses.call_request_json(index=call_index)
-        searched_indices = get_indices_from_url(urllib3_responses.calls[call_index].request.url)
+        searched_indices = get_indices_from_url(urllib3_responses.search_calls()[call_index].request.url)
         self.assertListEqual(sorted(searched_indices.split(',')), sorted(index.split(',')))
         self.assertSameSearch(
             executed_search,
@@ -1338,7 +1366,7 @@ class EsUtilsTest(TestCase):
         )
 
     def assertExecutedSearches(self, searches):
-        executed_search = parse_msearch_body(urllib3_responses.calls[-1].request.body)
+        executed_search = parse_msearch_body(get_request_body(urllib3_responses.search_calls()[-1].request))
         self.assertEqual(len(executed_search), len(searches) * 2)
         for i, expected_search in enumerate(searches):
             self.assertDictEqual(executed_search[i * 2], {'index': expected_search.get('index', INDEX_NAME).split(',')})
@@ -1357,22 +1385,24 @@ class EsUtilsTest(TestCase):
                 }
             }
 
-        if expected_search_params.get('query'):
-            expected_search['query']['bool']['must'] = expected_search_params['query']
-
         if not expected_search_params.get('unsorted'):
             expected_search['sort'] = expected_search_params.get('sort') or ['xpos', 'variantId']
 
+        if expected_search_params.get('search_after'):
+            expected_search['search_after'] = expected_search_params['search_after']
+
+        gene_agg_page_size = expected_search_params.get('gene_agg_page_size', 1000)
         if expected_search_params.get('gene_aggs'):
             expected_search['aggs'] = {
-                'genes': {'terms': {'field': 'geneIds', 'min_doc_count': 2, 'size': 1001}, 'aggs': {
-                    'vars_by_gene': {
-                        'top_hits': {'sort': expected_search['sort'], '_source': mock.ANY, 'size': 100}
-                    }
+                'genes': {'composite': {
+                    'sources': [{'gene_id': {'terms': {'field': 'geneIds'}}}], 'size': gene_agg_page_size,
                 }}}
         elif expected_search_params.get('gene_count_aggs'):
             expected_search['aggs'] = {'genes': {
-                'terms': {'field': 'mainTranscript_gene_id', 'size': 1001},
+                'composite': {
+                    'sources': [{'gene_id': {'terms': {'field': 'mainTranscript_gene_id'}}}],
+                    'size': gene_agg_page_size,
+                },
                 'aggs': expected_search_params['gene_count_aggs']
             }}
             del expected_search['sort']
@@ -1381,13 +1411,11 @@ class EsUtilsTest(TestCase):
 
         self.assertDictEqual(executed_search, expected_search)
 
-        if not expected_search_params.get('gene_count_aggs'):
-            source = executed_search['aggs']['genes']['aggs']['vars_by_gene']['top_hits']['_source'] \
-                if expected_search_params.get('gene_aggs')  else executed_search['_source']
-            self.assertSetEqual(expected_source_fields, set(source))
+        if not (expected_search_params.get('gene_count_aggs') or expected_search_params.get('gene_aggs')):
+            self.assertSetEqual(expected_source_fields, set(executed_search['_source']))
 
-    def assertCachedResults(self, results_model, expected_results, sort='xpos'):
-        cache_key = 'search_results__{}__{}'.format(results_model.guid, sort)
+    def assertCachedResults(self, results_model, expected_results, sort='xpos', search_after=False):
+        cache_key = 'search_results__{}__{}{}'.format(results_model.guid, sort, '__search_after' if search_after else '')
         self.assertIn(cache_key, REDIS_CACHE.keys())
         self.assertDictEqual(json.loads(REDIS_CACHE[cache_key]), expected_results)
         MOCK_REDIS.expire.assert_called_with(cache_key, timedelta(weeks=2))
@@ -1439,8 +1467,6 @@ class EsUtilsTest(TestCase):
             get_single_variant(self.families, '10-10334333-A-G')
         self.assertEqual(str(cm.exception), 'Variant 10-10334333-A-G not found')
 
-    @mock.patch('seqr.utils.search.elasticsearch.es_search.MAX_COMPOUND_HET_GENES', 1)
-    @mock.patch('seqr.utils.search.elasticsearch.es_gene_agg_search.MAX_COMPOUND_HET_GENES', 1)
     @mock.patch('seqr.utils.search.elasticsearch.es_search.logger')
     @urllib3_responses.activate
     def test_invalid_get_es_variants(self, mock_logger):
@@ -1457,23 +1483,6 @@ class EsUtilsTest(TestCase):
         )
         Sample.objects.filter(elasticsearch_index=HG38_INDEX_NAME).update(elasticsearch_index=INDEX_NAME)
 
-        results_model.families.set(self.families)
-        search_model.search = {
-            'inheritance': {'mode': 'compound_het'},
-            'locus': {'rawItems': 'DDX11L1'},
-            'annotations': {'frameshift': ['frameshift_variant']},
-        }
-        search_model.save()
-        with self.assertRaises(InvalidSearchException) as cm:
-            query_variants(results_model)
-        self.assertEqual(
-            str(cm.exception),
-            'This search returned too many compound heterozygous variants. Please add stricter filters')
-
-        with self.assertRaises(InvalidSearchException) as cm:
-            get_variant_query_gene_counts(results_model, None)
-        self.assertEqual(str(cm.exception), 'This search returned too many genes')
-
         search_model.search = {'qualityFilter': {'min_gq': 7}}
         search_model.save()
         with self.assertRaises(Exception) as cm:
@@ -1575,6 +1584,118 @@ class EsUtilsTest(TestCase):
         self.assertEqual(len(variants), 5)
         self.assertListEqual(variants, PARSED_VARIANTS + PARSED_VARIANTS + PARSED_VARIANTS[:1])
 
+    @urllib3_responses.activate
+    def test_get_es_variants_search_after(self):
+        setup_responses()
+        Sample.objects.get(elasticsearch_index=MITO_WGS_INDEX_NAME).delete()
+        search_model = VariantSearch.objects.create(search={'annotations': {'frameshift': ['frameshift_variant']}})
+        results_model = VariantSearchResults.objects.create(variant_search=search_model)
+        results_model.families.set(self.families)
+        search_after_sort = ['xpos', 'variantId', '_index']
+
+        variants, total_results = query_variants(results_model, num_results=2, search_after=True)
+        self.assertListEqual(variants, PARSED_VARIANTS)
+        self.assertEqual(total_results, 5)
+        self.assertCachedResults(
+            results_model, {'all_results': variants, 'total_results': 5, 'search_after': {INDEX_NAME: [[2103343353]]}},
+            search_after=True)
+        self.assertExecutedSearch(filters=[ANNOTATION_QUERY, ALL_INHERITANCE_QUERY], sort=search_after_sort)
+
+        # loads skipped pages after the last loaded result, and is not limited by the max result window
+        with mock.patch('seqr.utils.search.utils.MAX_VARIANTS', 4):
+            variants, total_results = query_variants(results_model, page=3, num_results=2, search_after=True)
+        self.assertListEqual(variants, [])
+        self.assertEqual(total_results, 5)
+        self.assertCachedResults(results_model, {
+            'all_results': PARSED_VARIANTS + PARSED_VARIANTS, 'total_results': 5,
+            'search_after': {INDEX_NAME: [[2103343353]]},
+        }, search_after=True)
+        self.assertExecutedSearch(
+            filters=[ANNOTATION_QUERY, ALL_INHERITANCE_QUERY], sort=search_after_sort, size=4,
+            search_after=[2103343353],
+        )
+
+        variants, _ = query_variants(results_model, page=2, num_results=2, search_after=True)
+        self.assertListEqual(variants, PARSED_VARIANTS)
+
+        # from/size pages are cached separately and do not use the stored search_after values
+        query_variants(results_model, num_results=2)
+        self.assertCachedResults(results_model, {'all_results': PARSED_VARIANTS, 'total_results': 5})
+        self.assertExecutedSearch(filters=[ANNOTATION_QUERY, ALL_INHERITANCE_QUERY], sort=['xpos', 'variantId'])
+
+        # fully loaded from/size results are reused
+        REDIS_CACHE['search_results__{}__xpos'.format(results_model.guid)] = json.dumps(
+            {'all_results': PARSED_VARIANTS, 'total_results': 2})
+        num_calls = len(urllib3_responses.calls)
+        variants, total_results = query_variants(results_model, load_all=True, search_after=True)
+        self.assertListEqual(variants, PARSED_VARIANTS)
+        self.assertEqual(total_results, 2)
+        self.assertEqual(len(urllib3_responses.calls), num_calls)
+
+        # load all results page by page, each page continuing from the last loaded result
+        _set_cache('search_results__{}__xpos'.format(results_model.guid), None)
+        _set_cache('search_results__{}__xpos__search_after'.format(results_model.guid), None)
+        num_calls = len(urllib3_responses.search_calls())
+        with mock.patch('seqr.utils.search.utils.MAX_VARIANTS', 1):
+            variants, total_results = query_variants(results_model, load_all=True, search_after=True)
+        self.assertListEqual(variants, PARSED_VARIANTS + PARSED_VARIANTS + PARSED_VARIANTS[:1])
+        self.assertEqual(total_results, 5)
+        self.assertEqual(len(urllib3_responses.search_calls()) - num_calls, 3)
+        self.assertExecutedSearch(
+            filters=[ANNOTATION_QUERY, ALL_INHERITANCE_QUERY], sort=search_after_sort, size=1, call_index=-3)
+        self.assertExecutedSearch(
+            filters=[ANNOTATION_QUERY, ALL_INHERITANCE_QUERY], sort=search_after_sort, size=1,
+            search_after=[2103343353], call_index=-2,
+        )
+        self.assertExecutedSearch(
+            filters=[ANNOTATION_QUERY, ALL_INHERITANCE_QUERY], sort=search_after_sort, size=1,
+            search_after=[2103343353],
+        )
+
+        with mock.patch('seqr.utils.search.utils.MAX_SEARCH_AFTER_EXPORT_VARIANTS', 4):
+            with self.assertRaises(InvalidSearchException) as cm:
+                query_variants(results_model, load_all=True, search_after=True)
+        self.assertEqual(str(cm.exception), 'Unable to export more than 4 variants (5 requested)')
+
+        # each search_after page is still limited by the max result window
+        _set_cache('search_results__{}__xpos__search_after'.format(results_model.guid), None)
+        with mock.patch('seqr.utils.search.utils.MAX_VARIANTS', 4):
+            with self.assertRaises(InvalidSearchException) as cm:
+                query_variants(results_model, page=10, num_results=5, search_after=True)
+        self.assertEqual(str(cm.exception), 'Unable to load more than 4 variants (5 requested)')
+
+    @urllib3_responses.activate
+    def test_multi_index_get_es_variants_search_after(self):
+        setup_responses()
+        search_model = VariantSearch.objects.create(search={'pathogenicity': {'clinvar': ['pathogenic']}})
+        results_model = VariantSearchResults.objects.create(variant_search=search_model)
+        results_model.families.set(self.families)
+        path_filter = {'regexp': {'clinvar_clinical_significance': '.*Pathogenic.*'}}
+        search_after_sort = ['xpos', 'variantId', '_index']
+
+        query_variants(results_model, num_results=2, search_after=True)
+        self.assertExecutedSearches([
+            dict(filters=[path_filter], size=2, index=SV_INDEX_NAME, sort=search_after_sort, start_index=0),
+            dict(filters=[path_filter], size=2, index=MITO_WGS_INDEX_NAME, sort=search_after_sort, start_index=0),
+            dict(filters=[path_filter, ALL_INHERITANCE_QUERY], size=2, index=INDEX_NAME, sort=search_after_sort,
+                 start_index=0),
+        ])
+
+        # each index continues from its own last loaded result
+        query_variants(results_model, page=2, num_results=2, search_after=True)
+        cached_results = json.loads(REDIS_CACHE['search_results__{}__xpos__search_after'.format(results_model.guid)])
+        self.assertDictEqual(cached_results['search_after'], {
+            SV_INDEX_NAME: [[1049045387]], MITO_WGS_INDEX_NAME: [[25000010195]], INDEX_NAME: [[2103343353]],
+        })
+        self.assertExecutedSearches([
+            dict(filters=[path_filter], size=3, index=SV_INDEX_NAME, sort=search_after_sort, start_index=0,
+                 search_after=[1049045387]),
+            dict(filters=[path_filter], size=3, index=MITO_WGS_INDEX_NAME, sort=search_after_sort, start_index=0,
+                 search_after=[25000010195]),
+            dict(filters=[path_filter, ALL_INHERITANCE_QUERY], size=2, index=INDEX_NAME, sort=search_after_sort,
+                 start_index=0, search_after=[2103343353]),
+        ])
+
     @urllib3_responses.activate
     def test_filtered_get_es_variants(self):
         setup_responses()
@@ -2014,6 +2135,73 @@ class EsUtilsTest(TestCase):
         urllib3_responses.reset()
         query_variants(results_model, page=2, num_results=2)
 
+    @mock.patch('seqr.utils.search.elasticsearch.es_search.GENE_AGG_PAGE_SIZE', 1)
+    @mock.patch('seqr.utils.search.elasticsearch.es_search.logger')
+    @urllib3_responses.activate
+    def test_paged_gene_agg_get_es_variants(self, mock_logger):
+        setup_responses()
+        search_model = VariantSearch.objects.create(search={
+            'qualityFilter': {'min_gq': 10},
+            'annotations': {'frameshift': ['frameshift_variant']},
+            'inheritance': {'mode': 'compound_het'},
+        })
+        results_model = VariantSearchResults.objects.create(variant_search=search_model)
+        results_model.families.set(self.families)
+
+        variants, total_results = query_variants(results_model, num_results=2)
+        self.assertListEqual(variants, [PARSED_COMPOUND_HET_VARIANTS])
+        self.assertEqual(total_results, 1)
+
+        search_calls = [call for call in urllib3_responses.calls if call.request.method == 'POST']
+        self.assertEqual(len(search_calls), 3)
+        self.assertExecutedSearch(
+            filters=[ANNOTATION_QUERY, COMPOUND_HET_INHERITANCE_QUERY],
+            gene_aggs=True, gene_agg_page_size=1, start_index=0, size=1, call_index=-2,
+        )
+        # Pages are loaded until the response has no after_key
+        executed_search = urllib3_responses.call_request_json(index=-1)
+        self.assertDictEqual(
+            executed_search['aggs']['genes']['composite'],
+            {'sources': [{'gene_id': {'terms': {'field': 'geneIds'}}}], 'size': 1, 'after': {'gene_id': 'ENSG00000135953'}}
+        )
+        mock_logger.info.assert_has_calls([
+            mock.call('Loading variants for 1 compound het genes', None),
+            mock.call('Loading compound hets page 2', None),
+            mock.call('Loading variants for 1 compound het genes', None),
+        ])
+
+        # Variants are loaded for the genes in batched searches
+        self.assertTrue(is_gene_variants_request(search_calls[-1].request))
+        gene_variants_searches = parse_msearch_body(get_request_body(search_calls[-1].request))
+        self.assertListEqual([search['aggs'] for search in gene_variants_searches[1::2]], [{'genes': {
+            'terms': {'field': 'geneIds', 'include': [gene_id], 'size': 1},
+            'aggs': {'vars_by_gene': {'top_hits': {'size': 100, 'sort': ['xpos', 'variantId'], '_source': mock.ANY}}},
+        }} for gene_id in ['ENSG00000135953', 'ENSG00000228198']])
+        self.assertSetEqual(
+            set(gene_variants_searches[1]['aggs']['genes']['aggs']['vars_by_gene']['top_hits']['_source']),
+            SOURCE_FIELDS,
+        )
+
+        # Variants are not loaded for genes with a single variant
+        def _mock_single_variant_gene_response(search, index=INDEX_NAME, create_response=create_mock_response):
+            response = create_response(search, index=index)
+            for bucket in response.get('aggregations', {}).get('genes', {}).get('buckets', []):
+                if bucket['key'] == {'gene_id': 'ENSG00000135953'}:
+                    bucket['doc_count'] = 1
+            return response
+
+        results_model = VariantSearchResults.objects.create(variant_search=search_model, search_hash='single_gene')
+        results_model.families.set(self.families)
+        urllib3_responses.reset()
+        setup_responses()
+        with mock.patch(f'{__name__}.create_mock_response', _mock_single_variant_gene_response):
+            query_variants(results_model, num_results=2)
+        gene_variants_searches = parse_msearch_body(get_request_body(urllib3_responses.calls[-1].request))
+        self.assertListEqual(
+            [search['aggs']['genes']['terms']['include'] for search in gene_variants_searches[1::2]],
+            [['ENSG00000228198']],
+        )
+
     @urllib3_responses.activate
     def test_compound_het_get_es_variants_secondary_annotation(self):
         setup_responses()
@@ -2669,6 +2857,49 @@ class EsUtilsTest(TestCase):
         project_2_search['size'] = 4
         self.assertExecutedSearches([project_2_search])
 
+    @mock.patch('seqr.utils.search.elasticsearch.es_search.ELASTICSEARCH_MAX_PARALLEL_SEARCHES', 1)
+    @mock.patch('seqr.utils.search.elasticsearch.es_search.MAX_MSEARCH_BATCH_SIZE', 3)
+    @mock.patch('seqr.utils.search.elasticsearch.es_search.time')
+    @mock.patch('seqr.utils.search.elasticsearch.es_search.logger')
+    @urllib3_responses.activate
+    def test_multi_project_batched_get_es_variants(self, mock_logger, mock_time):
+        mock_time.time.return_value = 1700000000
+        setup_responses()
+        search_model = VariantSearch.objects.create(search={
+            'annotations': {'frameshift': ['frameshift_variant']},
+            'qualityFilter': {'min_gq': 10},
+            'inheritance': {'mode': 'recessive'},
+        })
+        results_model = VariantSearchResults.objects.create(variant_search=search_model)
+        results_model.families.set(Family.objects.filter(guid__in=['F000011_11', 'F000003_3', 'F000002_2']))
+
+        variants, total_results = query_variants(results_model, num_results=2)
+        self.assertEqual(len(variants), 2)
+        self.assertDictEqual(variants[0], PARSED_VARIANTS[0])
+        self.assertDictEqual(variants[1][0], PARSED_COMPOUND_HET_VARIANTS_PROJECT_2[0])
+        self.assertDictEqual(variants[1][1], PARSED_COMPOUND_HET_VARIANTS_PROJECT_2[1])
+        self.assertEqual(total_results, 11)
+
+        self.assertCachedResults(results_model, {
+            'compound_het_results': [{'ENSG00000228198': PARSED_COMPOUND_HET_VARIANTS_MULTI_PROJECT}],
+            'variant_results': [PARSED_MULTI_INDEX_VARIANT],
+            'grouped_results': [{'null': [PARSED_VARIANTS[0]]}, {'ENSG00000135953': PARSED_COMPOUND_HET_VARIANTS_PROJECT_2}],
+            'duplicate_doc_count': 2,
+            'loaded_variant_counts': {
+                SECOND_INDEX_NAME: {'loaded': 1, 'total': 5},
+                '{}_compound_het'.format(SECOND_INDEX_NAME): {'total': 2, 'loaded': 2},
+                INDEX_NAME: {'loaded': 2, 'total': 5},
+                '{}_compound_het'.format(INDEX_NAME): {'total': 1, 'loaded': 1},
+            },
+            'total_results': 11,
+        })
+
+        msearch_calls = [call for call in urllib3_responses.search_calls() if call.request.url == '/_msearch']
+        self.assertListEqual(
+            sorted([len(parse_msearch_body(get_request_body(call.request))) for call in msearch_calls]), [2, 6])
+        mock_logger.info.assert_any_call('Executed 3 searches in msearch batch 1/2 (0 seconds)', None)
+        mock_logger.info.assert_any_call('Executed 1 searches in msearch batch 2/2 (0 seconds)', None)
+
     @urllib3_responses.activate
     def test_multi_project_all_samples_all_inheritance_get_es_variants(self):
         setup_responses()
@@ -2764,145 +2995,6 @@ class EsUtilsTest(TestCase):
                 ], start_index=0, size=2, index=INDEX_NAME)
         ])
 
-    @mock.patch('seqr.utils.search.elasticsearch.es_search.MAX_INDEX_SEARCHES', 1)
-    @urllib3_responses.activate
-    def test_multi_project_prefilter_indices_get_es_variants(self):
-        setup_responses()
-        search_model = VariantSearch.objects.create(search={
-            'inheritance': {'mode': 'de_novo'},
-            'qualityFilter': {'min_gq': 10},
-            'locus': {'rawItems': 'ENSG00000228198'},
-        })
-        results_model = VariantSearchResults.objects.create(variant_search=search_model)
-        results_model.families.set(Family.objects.filter(project__id__in=[1, 3]))
-
-        _, total_results = query_variants(results_model, num_results=2)
-        self.assertEqual(total_results, 14)
-        self.assertTrue('index_metadata__{},{},{}'.format(INDEX_NAME, MITO_WGS_INDEX_NAME, SV_INDEX_NAME) in REDIS_CACHE)
-
-        gene_filter = {'terms': {'geneIds': ['ENSG00000228198']}}
-        prefilter_search = dict(
-            filters=[gene_filter], index=f'{SV_INDEX_NAME},{SECOND_INDEX_NAME},{INDEX_NAME}',
-            size=200, expected_source_fields=set(),
-        )
-        sv_search = dict(
-            filters=[
-                gene_filter,
-                {'bool': {
-                    'must': [
-                        {'bool': {
-                            'must_not': [{'term': {'samples': 'HG00732'}}, {'term': {'samples': 'HG00733'}}],
-                            'must': [{'term': {'samples': 'HG00731'}}],
-                        }},
-                        {'bool': {
-                            'must_not': [
-                                {'term': {'samples_gq_0_to_5': 'HG00731'}},
-                                {'term': {'samples_gq_5_to_10': 'HG00731'}},
-                                {'term': {'samples_gq_0_to_5': 'HG00732'}},
-                                {'term': {'samples_gq_5_to_10': 'HG00732'}},
-                                {'term': {'samples_gq_0_to_5': 'HG00733'}},
-                                {'term': {'samples_gq_5_to_10': 'HG00733'}},
-                            ],
-                        }},
-                    ],
-                    '_name': 'F000002_2'
-                }}
-            ], start_index=0, size=2, index=SV_INDEX_NAME)
-        num_calls = 3
-        self.assertEqual(len(urllib3_responses.calls), num_calls)
-        self.assertExecutedSearch(call_index=num_calls-2, **prefilter_search)
-        # Search total is greater than returned hits, so proceed with regular multi-search
-        self.assertExecutedSearches([
-            sv_search,
-            dict(filters=[
-                gene_filter,
-                {
-                    'bool': {'must': [
-                        {'bool': {'should': [
-                            {'term': {'samples_num_alt_1': 'NA20885'}},
-                            {'term': {'samples_num_alt_2': 'NA20885'}},
-                        ]}}, {'bool': {'must_not': [
-                            {'term': {'samples_gq_0_to_5': 'NA20885'}},
-                            {'term': {'samples_gq_5_to_10': 'NA20885'}},
-                        ]}}
-                    ],
-                        '_name': 'F000011_11'
-                    }}
-            ], start_index=0, size=2, index=SECOND_INDEX_NAME),
-            dict(filters=[
-                    gene_filter,
-                    {'bool': {'should': [
-                        {'bool': {'must': [
-                            {'bool': {'should': [
-                                {'term': {'samples_num_alt_1': 'NA19675'}},
-                                {'term': {'samples_num_alt_2': 'NA19675'}},
-                            ]}}, {'bool': {'must_not': [
-                                {'term': {'samples_gq_0_to_5': 'NA19675'}},
-                                {'term': {'samples_gq_5_to_10': 'NA19675'}},
-                            ]}}], '_name': 'F000001_1'}},
-                        {'bool': {'must': [
-                            {'bool': {'should': [
-                                {'term': {'samples_num_alt_1': 'HG00731'}},
-                                {'term': {'samples_num_alt_2': 'HG00731'}},
-                            ], 'must_not': [
-                                {'term': {'samples_no_call': 'HG00732'}},
-                                {'term': {'samples_num_alt_1': 'HG00732'}},
-                                {'term': {'samples_num_alt_2': 'HG00732'}},
-                                {'term': {'samples_no_call': 'HG00733'}},
-                                {'term': {'samples_num_alt_1': 'HG00733'}},
-                                {'term': {'samples_num_alt_2': 'HG00733'}},
-                            ], 'minimum_should_match': 1}},
-                            {'bool': {
-                                'must_not': [
-                                    {'term': {'samples_gq_0_to_5': 'HG00731'}},
-                                    {'term': {'samples_gq_5_to_10': 'HG00731'}},
-                                    {'term': {'samples_gq_0_to_5': 'HG00732'}},
-                                    {'term': {'samples_gq_5_to_10': 'HG00732'}},
-                                    {'term': {'samples_gq_0_to_5': 'HG00733'}},
-                                    {'term': {'samples_gq_5_to_10': 'HG00733'}},
-                                ],
-                            }},
-                        ],
-                            '_name': 'F000002_2'
-                        }},
-                        {'bool': {'must': [
-                            {'bool': {'should': [
-                                {'term': {'samples_num_alt_1': 'NA20870'}},
-                                {'term': {'samples_num_alt_2': 'NA20870'}},
-                            ]}}, {'bool': {'must_not': [
-                                {'term': {'samples_gq_0_to_5': 'NA20870'}},
-                                {'term': {'samples_gq_5_to_10': 'NA20870'}},
-                            ]}}], '_name': 'F000003_3'}},
-                    ]}}], start_index=0, size=2, index=INDEX_NAME),
-        ])
-
-        # Test successful prefilter
-        _set_cache('search_results__{}__xpos'.format(results_model.guid), None)
-        gene_filter['terms']['geneIds'] = ['ENSG00000186092']
-        search_model.search['locus']['rawItems'] = 'ENSG00000186092'
-        search_model.save()
-
-        _, total_results = query_variants(results_model, num_results=2)
-        self.assertEqual(total_results, 1)
-        num_calls += 2
-        self.assertEqual(len(urllib3_responses.calls), num_calls)
-        self.assertExecutedSearch(call_index=num_calls-2, **prefilter_search)
-        sv_search['query'] = [{'ids': {'values': ['prefix_19107_DEL']}}]
-        self.assertExecutedSearches([sv_search])
-
-        # Test no results in prefilter
-        _set_cache('search_results__{}__xpos'.format(results_model.guid), None)
-        gene_filter['terms']['geneIds'] = ['ENSG00000269732']
-        search_model.search['locus']['rawItems'] = 'ENSG00000269732'
-        search_model.save()
-
-        _, total_results = query_variants(results_model, num_results=2)
-        self.assertEqual(total_results, 0)
-        # Only the prefliter search is run, no multi-search
-        self.assertEqual(len(urllib3_responses.calls), num_calls + 1)
-        self.assertExecutedSearch(**prefilter_search)
-
-
     @mock.patch('seqr.utils.search.elasticsearch.es_search.MAX_VARIANTS', 3)
     @urllib3_responses.activate
     def test_skip_genotype_filter(self):
@@ -3270,6 +3362,32 @@ class EsUtilsTest(TestCase):
         self.assertDictEqual(custom_affected_status, {
             'I000004_hg00731': 'A', 'I000005_hg00732': 'A', 'I000006_hg00733': 'N'})
 
+    def test_get_es_client(self):
+        client = get_es_client()
+        self.assertIs(get_es_client(), client)
+        connection = client.transport.get_connection()
+        self.assertEqual(connection.host, 'http://testhost:9200')
+        self.assertEqual(connection.timeout, 60)
+        self.assertTrue(connection.http_compress)
+        self.assertEqual(connection.pool.pool.maxsize, 25)
+        self.assertIsNone(client.transport.sniffer_timeout)
+        self.assertFalse(client.transport.sniff_on_connection_fail)
+
+        ping_client = get_es_client(timeout=3, max_retries=0)
+        self.assertIsNot(ping_client, client)
+        self.assertIs(get_es_client(timeout=3, max_retries=0), ping_client)
+        self.assertEqual(ping_client.transport.get_connection().timeout, 3)
+        self.assertEqual(ping_client.transport.max_retries, 0)
+
+        mock_factory = mock.MagicMock()
+        self.assertEqual(get_es_client(timeout=10, client_factory=mock_factory), mock_factory.return_value)
+        get_es_client(timeout=10, client_factory=mock_factory)
+        mock_factory.assert_called_once_with(10)
+
+        clear_es_client_cache()
+        mock_factory.return_value.transport.close.assert_called_once()
+        self.assertIsNot(get_es_client(), client)
+
     @urllib3_responses.activate
     def test_sort(self):
         setup_responses()
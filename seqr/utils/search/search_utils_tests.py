@@ -261,19 +261,19 @@ class SearchUtilsTests(SearchTestHelper):
         results_cache = {'all_results': PARSED_VARIANTS, 'total_results': 5}
         self.assert_cached_results(results_cache)
         self._test_expected_search_call(
-            mock_get_variants, results_cache, sort='xpos', page=1, num_results=100, skip_genotype_filter=False,
+            mock_get_variants, results_cache, sort='xpos', page=1, num_results=100, skip_genotype_filter=False, search_after=False,
         )
 
         query_variants(
             self.results_model, user=self.user, sort='cadd', skip_genotype_filter=True, page=3, num_results=10,
         )
         self._test_expected_search_call(
-            mock_get_variants, results_cache, sort='cadd', page=3, num_results=10, skip_genotype_filter=True,
+            mock_get_variants, results_cache, sort='cadd', page=3, num_results=10, skip_genotype_filter=True, search_after=False,
         )
 
         query_variants(self.results_model, user=self.user, load_all=True)
         self._test_expected_search_call(
-            mock_get_variants, results_cache, sort='xpos', page=1, num_results=1000, skip_genotype_filter=False,
+            mock_get_variants, results_cache, sort='xpos', page=1, num_results=1000, skip_genotype_filter=False, search_after=False,
         )
 
         with mock.patch('seqr.utils.search.utils.MAX_EXPORT_VARIANTS', 4):
@@ -281,19 +281,19 @@ class SearchUtilsTests(SearchTestHelper):
                 query_variants(self.results_model, user=self.user, load_all=True)
         self.assertEqual(str(cm.exception), 'Unable to export more than 4 variants (5 requested)')
         self._test_expected_search_call(
-            mock_get_variants, results_cache, sort='xpos', page=1, num_results=4, skip_genotype_filter=False,
+            mock_get_variants, results_cache, sort='xpos', page=1, num_results=4, skip_genotype_filter=False, search_after=False,
         )
 
         self.set_cache({'total_results': 22})
         query_variants(self.results_model, user=self.user, load_all=True)
         self._test_expected_search_call(
-            mock_get_variants, results_cache, sort='xpos', page=1, num_results=22, skip_genotype_filter=False,
+            mock_get_variants, results_cache, sort='xpos', page=1, num_results=22, skip_genotype_filter=False, search_after=False,
         )
 
         self.search_model.search['locus'] = {'rawVariantItems': '1-248367227-TC-T,2-103343353-GAGA-G'}
         query_variants(self.results_model, user=self.user)
         self._test_expected_search_call(
-            mock_get_variants, results_cache, sort='xpos', page=1, num_results=2, skip_genotype_filter=False,
+            mock_get_variants, results_cache, sort='xpos', page=1, num_results=2, skip_genotype_filter=False, search_after=False,
             search_fields=['locus'], rs_ids=[],  variant_ids=['1-248367227-TC-T', '2-103343353-GAGA-G'],
             parsed_variant_ids=[('1', 248367227, 'TC', 'T'), ('2', 103343353, 'GAGA', 'G')], dataset_type='SNV_INDEL',
             omitted_sample_guids=['S000145_hg00731', 'S000146_hg00732', 'S000148_hg00733', 'S000149_hg00733'],
@@ -302,14 +302,14 @@ class SearchUtilsTests(SearchTestHelper):
         self.search_model.search['locus']['rawVariantItems'] = 'rs9876'
         query_variants(self.results_model, user=self.user)
         self._test_expected_search_call(
-            mock_get_variants, results_cache, sort='xpos', page=1, num_results=100, skip_genotype_filter=False,
+            mock_get_variants, results_cache, sort='xpos', page=1, num_results=100, skip_genotype_filter=False, search_after=False,
             search_fields=['locus'], rs_ids=['rs9876'], variant_ids=[], parsed_variant_ids=[],
         )
 
         self.search_model.search['locus']['rawItems'] = 'DDX11L1, chr2:1234-5678, chr7:100-10100%10, ENSG00000186092'
         query_variants(self.results_model, user=self.user)
         self._test_expected_search_call(
-            mock_get_variants, results_cache, sort='xpos', page=1, num_results=100, skip_genotype_filter=False,
+            mock_get_variants, results_cache, sort='xpos', page=1, num_results=100, skip_genotype_filter=False, search_after=False,
             search_fields=['locus'], genes={
                 'ENSG00000223972': mock.ANY, 'ENSG00000186092': mock.ANY,
             }, intervals=[
@@ -328,7 +328,7 @@ class SearchUtilsTests(SearchTestHelper):
         }
         query_variants(self.results_model, user=self.user)
         self._test_expected_search_call(
-            mock_get_variants, results_cache, sort='xpos', page=1, num_results=100, skip_genotype_filter=False,
+            mock_get_variants, results_cache, sort='xpos', page=1, num_results=100, skip_genotype_filter=False, search_after=False,
             inheritance_mode='recessive', dataset_type='SNV_INDEL', secondary_dataset_type=None,
             search_fields=['annotations'], omitted_sample_guids=['S000145_hg00731', 'S000146_hg00732', 'S000148_hg00733'],
         )
@@ -336,7 +336,7 @@ class SearchUtilsTests(SearchTestHelper):
         self.search_model.search['annotations_secondary'] = {'structural_consequence': ['LOF']}
         query_variants(self.results_model, user=self.user)
         self._test_expected_search_call(
-            mock_get_variants, results_cache, sort='xpos', page=1, num_results=100, skip_genotype_filter=False,
+            mock_get_variants, results_cache, sort='xpos', page=1, num_results=100, skip_genotype_filter=False, search_after=False,
             inheritance_mode='recessive', dataset_type='SNV_INDEL', secondary_dataset_type='SV',
             search_fields=['annotations', 'annotations_secondary']
         )
@@ -344,7 +344,7 @@ class SearchUtilsTests(SearchTestHelper):
         self.search_model.search['annotations_secondary'].update({'SCREEN': ['dELS', 'DNase-only']})
         query_variants(self.results_model, user=self.user)
         self._test_expected_search_call(
-            mock_get_variants, results_cache, sort='xpos', page=1, num_results=100, skip_genotype_filter=False,
+            mock_get_variants, results_cache, sort='xpos', page=1, num_results=100, skip_genotype_filter=False, search_after=False,
             inheritance_mode='recessive', dataset_type='SNV_INDEL', secondary_dataset_type='ALL',
             search_fields=['annotations', 'annotations_secondary']
         )
@@ -352,7 +352,7 @@ class SearchUtilsTests(SearchTestHelper):
         self.search_model.search['annotations_secondary']['structural_consequence'] = []
         query_variants(self.results_model, user=self.user)
         self._test_expected_search_call(
-            mock_get_variants, results_cache, sort='xpos', page=1, num_results=100, skip_genotype_filter=False,
+            mock_get_variants, results_cache, sort='xpos', page=1, num_results=100, skip_genotype_filter=False, search_after=False,
             inheritance_mode='recessive', dataset_type='SNV_INDEL', secondary_dataset_type='SNV_INDEL',
             search_fields=['annotations', 'annotations_secondary'],
             omitted_sample_guids=['S000145_hg00731', 'S000146_hg00732', 'S000148_hg00733'],
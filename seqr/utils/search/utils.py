@@ -5,7 +5,8 @@ from datetime import timedelta
 from seqr.models import Sample, Individual, Project
 from seqr.utils.redis_utils import safe_redis_get_json, safe_redis_set_json
 from seqr.utils.search.constants import XPOS_SORT_KEY, PRIORITIZED_GENE_SORT, RECESSIVE, COMPOUND_HET, \
-    MAX_NO_LOCATION_COMP_HET_FAMILIES, SV_ANNOTATION_TYPES, ALL_DATA_TYPES, MAX_EXPORT_VARIANTS
+    MAX_NO_LOCATION_COMP_HET_FAMILIES, SV_ANNOTATION_TYPES, ALL_DATA_TYPES, MAX_EXPORT_VARIANTS, \
+    MAX_SEARCH_AFTER_EXPORT_VARIANTS
 from seqr.utils.search.elasticsearch.constants import MAX_VARIANTS
 from seqr.utils.search.elasticsearch.es_utils import ping_elasticsearch, delete_es_index, get_elasticsearch_status, \
     get_es_variants, get_es_variants_for_variant_ids, process_es_previously_loaded_results, process_es_previously_loaded_gene_aggs, \
@@ -160,21 +161,38 @@ def variant_lookup(user, variant_id, **kwargs):
     return lookup_func(user, parsed_variant_id, **kwargs)
 
 
-def _get_search_cache_key(search_model, sort=None):
-    return 'search_results__{}__{}'.format(search_model.guid, sort or XPOS_SORT_KEY)
+def _get_search_cache_key(search_model, sort=None, search_after=False):
+    cache_key = 'search_results__{}__{}'.format(search_model.guid, sort or XPOS_SORT_KEY)
+    # search_after pages continue from the stored sort values of the last loaded hit, so they are cached separately
+    # from from/size pages to keep those values in sync with the loaded results
+    return '{}__search_after'.format(cache_key) if search_after else cache_key
 
 
-def _get_cached_search_results(search_model, sort=None):
-    return safe_redis_get_json(_get_search_cache_key(search_model, sort=sort)) or {}
+def _get_cached_search_results(search_model, sort=None, search_after=False):
+    return safe_redis_get_json(_get_search_cache_key(search_model, sort=sort, search_after=search_after)) or {}
 
 
-def _validate_export_variant_count(total_variants):
-    if total_variants > MAX_EXPORT_VARIANTS:
-        raise InvalidSearchException(f'Unable to export more than {MAX_EXPORT_VARIANTS} variants ({total_variants} requested)')
+def _has_loaded_all_results(previous_search_results):
+    total_results = previous_search_results.get('total_results')
+    return total_results is not None and len(previous_search_results.get('all_results') or []) >= total_results
+
+
+def _validate_export_variant_count(total_variants, max_variants=None):
+    max_variants = max_variants or MAX_EXPORT_VARIANTS
+    if total_variants > max_variants:
+        raise InvalidSearchException(f'Unable to export more than {max_variants} variants ({total_variants} requested)')
 
 
-def query_variants(search_model, sort=XPOS_SORT_KEY, skip_genotype_filter=False, load_all=False, user=None, page=1, num_results=100):
+def query_variants(search_model, sort=XPOS_SORT_KEY, skip_genotype_filter=False, load_all=False, user=None, page=1,
+                   num_results=100, search_after=False):
+    # search_after pagination is only supported in elasticsearch, and requires a deterministic sort order
+    search_after = bool(search_after and sort and es_backend_enabled())
+    if load_all and search_after:
+        return _query_all_variants_search_after(search_model, sort, skip_genotype_filter, user)
+
     previous_search_results = _get_cached_search_results(search_model, sort=sort)
+    if search_after and not _has_loaded_all_results(previous_search_results):
+        previous_search_results = _get_cached_search_results(search_model, sort=sort, search_after=True)
     total_results = previous_search_results.get('total_results')
 
     if load_all:
@@ -196,12 +214,14 @@ def query_variants(search_model, sort=XPOS_SORT_KEY, skip_genotype_filter=False,
     if previously_loaded_results is not None:
         return previously_loaded_results, total_results
 
-    if end_index > MAX_VARIANTS:
-        raise InvalidSearchException(f'Unable to load more than {MAX_VARIANTS} variants ({end_index} requested)')
+    # search_after pagination in elasticsearch is only limited by the max result window for each individual page
+    num_requested = num_results if search_after else end_index
+    if num_requested > MAX_VARIANTS:
+        raise InvalidSearchException(f'Unable to load more than {MAX_VARIANTS} variants ({num_requested} requested)')
 
     variants, total_results = _query_variants(
         search_model, user, previous_search_results, sort=sort, page=page, num_results=num_results,
-        skip_genotype_filter=skip_genotype_filter)
+        skip_genotype_filter=skip_genotype_filter, search_after=search_after)
 
     if load_all:
         _validate_export_variant_count(total_results)
@@ -209,6 +229,22 @@ def query_variants(search_model, sort=XPOS_SORT_KEY, skip_genotype_filter=False,
     return variants, total_results
 
 
+def _query_all_variants_search_after(search_model, sort, skip_genotype_filter, user):
+    """Loads all results one max result window sized page at a time, continuing each page from the stored sort values
+    of the last loaded result"""
+    variants = []
+    page = 1
+    while True:
+        page_variants, total_results = query_variants(
+            search_model, sort=sort, skip_genotype_filter=skip_genotype_filter, user=user, page=page,
+            num_results=MAX_VARIANTS, search_after=True)
+        _validate_export_variant_count(total_results, max_variants=MAX_SEARCH_AFTER_EXPORT_VARIANTS)
+        variants += page_variants
+        if not page_variants or len(variants) >= total_results:
+            return variants, total_results
+        page += 1
+
+
 def _query_variants(search_model, user, previous_search_results, sort=None, num_results=100, **kwargs):
     search = deepcopy(search_model.variant_search.search)
 
@@ -254,7 +290,7 @@ def _query_variants(search_model, user, previous_search_results, sort=None, num_
         sort=sort, num_results=num_results, **kwargs,
     )
 
-    cache_key = _get_search_cache_key(search_model, sort=sort)
+    cache_key = _get_search_cache_key(search_model, sort=sort, search_after=kwargs.get('search_after'))
     safe_redis_set_json(cache_key, previous_search_results, expire=timedelta(weeks=2))
 
     return variant_results, previous_search_results.get('total_results')
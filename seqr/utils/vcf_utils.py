@@ -1,12 +1,16 @@
 import re
+import zlib
 
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 from seqr.utils.middleware import ErrorsWarningsException
-from seqr.utils.file_utils import file_iter, does_file_exist, get_gs_file_list
+from seqr.utils.file_utils import file_iter, does_file_exist, get_gs_file_list, iter_gunzipped_chunks, \
+    iter_decoded_lines
 from seqr.utils.search.constants import VCF_FILE_EXTENSIONS
 
 BLOCK_SIZE = 65536
+MAX_PARALLEL_SHARD_VALIDATIONS = 10
 
 EXPECTED_META_FIELDS ={
     'FORMAT': {
@@ -48,26 +52,47 @@ def _get_vcf_meta_info(line):
     return None
 
 
-def validate_vcf_and_get_samples(vcf_filename):
-    byte_range = None if vcf_filename.endswith('.vcf') else (0, BLOCK_SIZE)
+def _iter_raw_blocks(vcf_filename, user):
+    """Lazily read the raw file in fixed size blocks, so only as much of the file as is consumed is ever fetched"""
+    start = 0
+    while True:
+        block = b''.join(file_iter(vcf_filename, byte_range=(start, start + BLOCK_SIZE - 1), raw_content=True, user=user))
+        if block:
+            yield block
+        if len(block) < BLOCK_SIZE:
+            return
+        start += BLOCK_SIZE
+
+
+def _iter_vcf_header_lines(vcf_filename, user):
+    blocks = _iter_raw_blocks(vcf_filename, user)
+    if not vcf_filename.endswith('.vcf'):
+        blocks = iter_gunzipped_chunks(blocks)
+    return iter_decoded_lines(blocks)
+
+
+def _validate_vcf_header_and_get_samples(vcf_filename, user):
     samples = {}
     header = []
     meta = defaultdict(dict)
-    for line in file_iter(vcf_filename, byte_range=byte_range):
-        if line.startswith('#'):
-            if line.startswith('#CHROM'):
-                header_cols = line.rstrip().split('\t')
-                format_indices = [index for index, col in enumerate(header_cols) if col == 'FORMAT']
-                format_index = format_indices[0] + 1 if format_indices else len(header_cols)
-                header = header_cols[0:format_index]
-                samples = set(header_cols[format_index:])
-                break
+    try:
+        for line in _iter_vcf_header_lines(vcf_filename, user):
+            if line.startswith('#'):
+                if line.startswith('#CHROM'):
+                    header_cols = line.rstrip().split('\t')
+                    format_indices = [index for index, col in enumerate(header_cols) if col == 'FORMAT']
+                    format_index = format_indices[0] + 1 if format_indices else len(header_cols)
+                    header = header_cols[0:format_index]
+                    samples = set(header_cols[format_index:])
+                    break
+                else:
+                    meta_info = _get_vcf_meta_info(line)
+                    if meta_info:
+                        meta[meta_info['field']].update({meta_info['id']: meta_info['type']})
             else:
-                meta_info = _get_vcf_meta_info(line)
-                if meta_info:
-                    meta[meta_info['field']].update({meta_info['id']: meta_info['type']})
-        else:
-            raise ErrorsWarningsException(['No header found in the VCF file.'], [])
+                raise ErrorsWarningsException(['No header found in the VCF file.'], [])
+    except zlib.error:
+        raise ErrorsWarningsException([f'Unable to decompress VCF file {vcf_filename}.'], [])
 
     _validate_vcf_header(header)
     if not samples:
@@ -77,22 +102,42 @@ def validate_vcf_and_get_samples(vcf_filename):
     return samples
 
 
+def validate_vcf_and_get_samples(data_path, user, path_name=None):
+    vcf_files = _get_vcf_files(data_path, user, path_name=path_name)
+    if len(vcf_files) == 1:
+        return _validate_vcf_header_and_get_samples(vcf_files[0], user)
+
+    with ThreadPoolExecutor(max_workers=min(len(vcf_files), MAX_PARALLEL_SHARD_VALIDATIONS)) as executor:
+        shard_samples = list(executor.map(lambda vcf_file: _validate_vcf_header_and_get_samples(vcf_file, user), vcf_files))
+
+    samples = shard_samples[0]
+    mismatched_files = [vcf_file for vcf_file, file_samples in zip(vcf_files, shard_samples) if file_samples != samples]
+    if mismatched_files:
+        raise ErrorsWarningsException([
+            'Samples in {} do not match the samples in {}'.format(', '.join(mismatched_files), vcf_files[0])
+        ], [])
+
+    return samples
+
+
 def validate_vcf_exists(data_path, user, path_name=None, allowed_exts=None):
+    return _get_vcf_files(data_path, user, path_name=path_name, allowed_exts=allowed_exts)[0]
+
+
+def _get_vcf_files(data_path, user, path_name=None, allowed_exts=None):
     file_extensions = (allowed_exts or ()) + VCF_FILE_EXTENSIONS
     if not data_path.endswith(file_extensions):
         raise ErrorsWarningsException([
             'Invalid VCF file format - file path must end with {}'.format(' or '.join(file_extensions))
         ])
 
-    file_to_check = None
+    files = []
     if '*' in data_path:
         files = get_gs_file_list(data_path, user, check_subfolders=False, allow_missing=True)
-        if files:
-            file_to_check = files[0]
     elif does_file_exist(data_path, user=user):
-        file_to_check = data_path
+        files = [data_path]
 
-    if not file_to_check:
+    if not files:
         raise ErrorsWarningsException(['Data file or path {} is not found.'.format(path_name or data_path)])
 
-    return file_to_check
+    return files
@@ -1,7 +1,9 @@
 from copy import deepcopy
 from datetime import datetime
+import gzip
 import json
 import mock
+import re
 from django.urls.base import reverse
 import responses
 
@@ -81,20 +83,20 @@ PROJECT2_GUID = 'R0003_test'
 BASIC_META = [
     b'##fileformat=VCFv4.3\n',
     b'##source=myImputationProgramV3.1\n',
-    b'##FILTER=<ID=q10,Description="Quality below 10">',
-    b'##FILTER=<ID=s50,Description="Less than 50% of samples have data">',
+    b'##FILTER=<ID=q10,Description="Quality below 10">\n',
+    b'##FILTER=<ID=s50,Description="Less than 50% of samples have data">\n',
 ]
 
 BAD_INFO_META = [
-    b'##INFO=<ID=AA,Number=1,Type=String,Description="Ancestral Allele">',
-    b'##INFO=<ID=DB,Number=0,Type=Flag,Description="dbSNP membership, build 129">',
-    b'##INFO=<ID=H2,Number=0,Type=Flag,Description="HapMap2 membership">',
+    b'##INFO=<ID=AA,Number=1,Type=String,Description="Ancestral Allele">\n',
+    b'##INFO=<ID=DB,Number=0,Type=Flag,Description="dbSNP membership, build 129">\n',
+    b'##INFO=<ID=H2,Number=0,Type=Flag,Description="HapMap2 membership">\n',
     b'##INFO=<ID=AC,Number=A,Type=Integer,Description="Allele count in genotypes, for each ALT allele, in the same order as listed">\n',
     b'##INFO=<ID=AF,Number=A,Type=Integer,Description="Allele Frequency, for each ALT allele, in the same order as listed">\n',
 ]
 
 INFO_META = [
-    b'##INFO=<ID=AA,Number=1,Type=String,Description="Ancestral Allele">',
+    b'##INFO=<ID=AA,Number=1,Type=String,Description="Ancestral Allele">\n',
     b'##INFO=<ID=AC,Number=A,Type=Integer,Description="Allele count in genotypes, for each ALT allele, in the same order as listed">\n',
     b'##INFO=<ID=AF,Number=A,Type=Float,Description="Allele Frequency, for each ALT allele, in the same order as listed">\n',
     b'##INFO=<ID=AN,Number=1,Type=Integer,Description="Total number of alleles in called genotypes">\n',
@@ -121,6 +123,11 @@ DATA_LINES = [
 ]
 
 
+def _bgzip(lines):
+    # bgzipped files are a series of independently gzipped blocks
+    return [gzip.compress(b''.join(lines[:2])), gzip.compress(b''.join(lines[2:]))]
+
+
 @mock.patch('seqr.views.utils.permissions_utils.logger')
 class AnvilWorkspaceAPITest(AnvilAuthenticationTestCase):
     fixtures = ['users', 'social_auth', '1kg_project']
@@ -309,23 +316,23 @@ class AnvilWorkspaceAPITest(AnvilAuthenticationTestCase):
         # test no header line
         mock_subprocess.reset_mock()
         mock_subprocess.return_value.wait.return_value = 0
-        mock_subprocess.return_value.stdout = BASIC_META + DATA_LINES
+        mock_subprocess.return_value.stdout = _bgzip(BASIC_META + DATA_LINES)
         response = self.client.post(url, content_type='application/json', data=json.dumps(REQUEST_BODY_GZ_DATA_PATH))
         self.assertEqual(response.status_code, 400)
         self.assertListEqual(response.json()['errors'], ['No header found in the VCF file.'])
         mock_subprocess.assert_has_calls([
             mock.call('gsutil ls gs://test_bucket/test_path.vcf.gz', stdout=-1, stderr=-2, shell=True),
             mock.call().wait(),
-            mock.call('gsutil cat -r 0-65536 gs://test_bucket/test_path.vcf.gz | gunzip -c -q - ',
-                      stdout=-1, stderr=-2, shell=True),
+            mock.call('gsutil cat -r 0-65535 gs://test_bucket/test_path.vcf.gz', stdout=-1, stderr=-2, shell=True),
         ])
         mock_file_logger.info.assert_has_calls([
             mock.call('==> gsutil ls gs://test_bucket/test_path.vcf.gz', self.manager_user),
-            mock.call('==> gsutil cat -r 0-65536 gs://test_bucket/test_path.vcf.gz | gunzip -c -q - ', None),
+            mock.call('==> gsutil cat -r 0-65535 gs://test_bucket/test_path.vcf.gz', self.manager_user),
         ])
 
         # test header errors
-        mock_subprocess.return_value.stdout = BASIC_META + BAD_INFO_META + BAD_FORMAT_META + BAD_HEADER_LINE + DATA_LINES
+        mock_subprocess.return_value.stdout = _bgzip(
+            BASIC_META + BAD_INFO_META + BAD_FORMAT_META + BAD_HEADER_LINE + DATA_LINES)
         response = self.client.post(url, content_type='application/json', data=json.dumps(REQUEST_BODY_GZ_DATA_PATH))
         self.assertEqual(response.status_code, 400)
         self.assertListEqual(response.json()['errors'], [
@@ -333,13 +340,14 @@ class AnvilWorkspaceAPITest(AnvilAuthenticationTestCase):
         ])
 
         # test no samples
-        mock_subprocess.return_value.stdout = BASIC_META + NO_SAMPLE_HEADER_LINE + DATA_LINES
+        mock_subprocess.return_value.stdout = _bgzip(BASIC_META + NO_SAMPLE_HEADER_LINE + DATA_LINES)
         response = self.client.post(url, content_type='application/json', data=json.dumps(REQUEST_BODY_GZ_DATA_PATH))
         self.assertEqual(response.status_code, 400)
         self.assertListEqual(response.json()['errors'], ['No samples found in the provided VCF.'])
 
         # test meta info errors
-        mock_subprocess.return_value.stdout = BASIC_META + BAD_INFO_META + BAD_FORMAT_META + HEADER_LINE + DATA_LINES
+        mock_subprocess.return_value.stdout = _bgzip(
+            BASIC_META + BAD_INFO_META + BAD_FORMAT_META + HEADER_LINE + DATA_LINES)
         response = self.client.post(url, content_type='application/json', data=json.dumps(REQUEST_BODY_GZ_DATA_PATH))
         self.assertEqual(response.status_code, 400)
         self.assertListEqual(response.json()['errors'], [
@@ -347,6 +355,12 @@ class AnvilWorkspaceAPITest(AnvilAuthenticationTestCase):
             'Incorrect meta Type for FORMAT.GQ - expected "Integer", got "String"'
         ])
 
+        # test file which is not validly compressed
+        mock_subprocess.return_value.stdout = BASIC_META + HEADER_LINE
+        response = self.client.post(url, content_type='application/json', data=json.dumps(REQUEST_BODY_GZ_DATA_PATH))
+        self.assertEqual(response.status_code, 400)
+        self.assertListEqual(response.json()['errors'], ['Unable to decompress VCF file gs://test_bucket/test_path.vcf.gz.'])
+
         # Test valid operations
         mock_subprocess.reset_mock()
         mock_file_logger.reset_mock()
@@ -357,30 +371,68 @@ class AnvilWorkspaceAPITest(AnvilAuthenticationTestCase):
         mock_subprocess.assert_has_calls([
             mock.call('gsutil ls gs://test_bucket/test_path.vcf', stdout=-1, stderr=-2, shell=True),
             mock.call().wait(),
-            mock.call('gsutil cat gs://test_bucket/test_path.vcf', stdout=-1, stderr=-2, shell=True),
+            mock.call('gsutil cat -r 0-65535 gs://test_bucket/test_path.vcf', stdout=-1, stderr=-2, shell=True),
         ])
         mock_file_logger.info.assert_has_calls([
             mock.call('==> gsutil ls gs://test_bucket/test_path.vcf', self.manager_user),
-            mock.call('==> gsutil cat gs://test_bucket/test_path.vcf', None),
+            mock.call('==> gsutil cat -r 0-65535 gs://test_bucket/test_path.vcf', self.manager_user),
         ])
 
+        # Test a header which spans multiple blocks
+        mock_subprocess.reset_mock()
+        with mock.patch('seqr.utils.vcf_utils.BLOCK_SIZE', 100):
+            vcf_content = b''.join(BASIC_META + INFO_META + FORMAT_META + HEADER_LINE + DATA_LINES)
+            mock_subprocess.side_effect = lambda command, **kwargs: mock.MagicMock(stdout=[
+                vcf_content[int(start):int(end) + 1] for start, end in re.findall(r'-r (\d+)-(\d+)', command)
+            ], **{'wait.return_value': 0})
+            response = self.client.post(url, content_type='application/json', data=json.dumps(VALIDATE_VCF_BODY))
+        self.assertEqual(response.status_code, 200)
+        self.assertDictEqual(response.json(), VALIDATE_VFC_RESPONSE)
+        header_end = vcf_content.index(HEADER_LINE[0]) + len(HEADER_LINE[0])
+        self.assertEqual(mock_subprocess.call_count, (header_end // 100) + 2)
+        mock_subprocess.assert_called_with(
+            f'gsutil cat -r {(header_end // 100) * 100}-{(header_end // 100) * 100 + 99} gs://test_bucket/test_path.vcf',
+            stdout=-1, stderr=-2, shell=True)
+
         # Test a valid sharded VCF file path
         mock_subprocess.reset_mock()
-        mock_file_exist_or_list_subproc = mock.MagicMock()
-        mock_get_header_subproc = mock.MagicMock()
-        mock_subprocess.side_effect = [mock_file_exist_or_list_subproc, mock_get_header_subproc]
-        mock_file_exist_or_list_subproc.communicate.return_value = b'gs://test_bucket/test_path-001.vcf.gz\ngs://test_bucket/test_path-102.vcf.gz\n', None
-        mock_get_header_subproc.stdout = BASIC_META + INFO_META + FORMAT_META + HEADER_LINE + DATA_LINES
+        mock_file_logger.reset_mock()
+        shard_headers = {
+            'gs://test_bucket/test_path-001.vcf.gz': HEADER_LINE,
+            'gs://test_bucket/test_path-102.vcf.gz': HEADER_LINE,
+        }
+
+        def _mock_sharded_subprocess(command, **kwargs):
+            if command.startswith('gsutil ls'):
+                process = mock.MagicMock()
+                process.communicate.return_value = '\n'.join(list(shard_headers.keys()) + ['']).encode(), None
+                return process
+            return mock.MagicMock(stdout=_bgzip(
+                BASIC_META + INFO_META + FORMAT_META + shard_headers[command.split(' ')[-1]] + DATA_LINES))
+        mock_subprocess.side_effect = _mock_sharded_subprocess
+
         response = self.client.post(url, content_type='application/json', data=json.dumps(REQUEST_BODY_SHARDED_DATA_PATH))
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json(), {'fullDataPath': 'gs://test_bucket/test_path-*.vcf.gz', 'vcfSamples': ['HG00735', 'NA19675', 'NA19678']})
+        self.assertEqual(mock_subprocess.call_count, 3)
         mock_subprocess.assert_has_calls([
             mock.call('gsutil ls gs://test_bucket/test_path-*.vcf.gz', stdout=-1, stderr=-1, shell=True),
-            mock.call('gsutil cat -r 0-65536 gs://test_bucket/test_path-001.vcf.gz | gunzip -c -q - ', stdout=-1, stderr=-2, shell=True),
-        ])
+            mock.call('gsutil cat -r 0-65535 gs://test_bucket/test_path-001.vcf.gz', stdout=-1, stderr=-2, shell=True),
+            mock.call('gsutil cat -r 0-65535 gs://test_bucket/test_path-102.vcf.gz', stdout=-1, stderr=-2, shell=True),
+        ], any_order=True)
         mock_file_logger.info.assert_has_calls([
             mock.call('==> gsutil ls gs://test_bucket/test_path-*.vcf.gz', self.manager_user),
-            mock.call('==> gsutil cat -r 0-65536 gs://test_bucket/test_path-001.vcf.gz | gunzip -c -q - ', None),
+            mock.call('==> gsutil cat -r 0-65535 gs://test_bucket/test_path-001.vcf.gz', self.manager_user),
+            mock.call('==> gsutil cat -r 0-65535 gs://test_bucket/test_path-102.vcf.gz', self.manager_user),
+        ], any_order=True)
+
+        # Test sharded VCF files with mismatched samples
+        shard_headers['gs://test_bucket/test_path-102.vcf.gz'] = [
+            b'#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tHG00735\tNA19675\n']
+        response = self.client.post(url, content_type='application/json', data=json.dumps(REQUEST_BODY_SHARDED_DATA_PATH))
+        self.assertEqual(response.status_code, 400)
+        self.assertListEqual(response.json()['errors'], [
+            'Samples in gs://test_bucket/test_path-102.vcf.gz do not match the samples in gs://test_bucket/test_path-001.vcf.gz',
         ])
 
         # Test logged in locally
@@ -25,7 +25,7 @@ from seqr.views.utils.airflow_utils import trigger_data_loading
 from seqr.views.utils.dataset_utils import load_rna_seq_outlier, load_rna_seq_tpm, load_phenotype_prioritization_data_file, \
     load_rna_seq_splice_outlier
 from seqr.views.utils.export_utils import write_multiple_files_to_gs
-from seqr.views.utils.file_utils import parse_file, get_temp_upload_directory, load_uploaded_file
+from seqr.views.utils.file_utils import iter_file_rows, get_temp_upload_directory, load_uploaded_file
 from seqr.views.utils.json_utils import create_json_response
 from seqr.views.utils.permissions_utils import data_manager_required, pm_or_data_manager_required, get_internal_projects
 
@@ -54,9 +54,9 @@ def upload_qc_pipeline_output(request):
     file_path = json.loads(request.body)['file'].strip()
     if not does_file_exist(file_path, user=request.user):
         return create_json_response({'errors': ['File not found: {}'.format(file_path)]}, status=400)
-    raw_records = parse_file(file_path, file_iter(file_path, user=request.user))
-
-    json_records = [dict(zip(raw_records[0], row)) for row in raw_records[1:]]
+    rows = iter_file_rows(file_path, file_iter(file_path, user=request.user))
+    header = next(rows)
+    json_records = [dict(zip(header, row)) for row in rows]
 
     try:
         dataset_type, data_type, records_by_sample_id = _parse_raw_qc_records(json_records)
@@ -314,7 +314,7 @@ def load_rna_seq_sample_data(request, sample_guid):
         data_by_gene = json.loads(row.split('\t\t')[1])
 
     model_cls = RNA_DATA_TYPE_CONFIGS[data_type]['model_class']
-    model_cls.bulk_create(request.user, [model_cls(sample=sample, **data) for data in data_by_gene.values()])
+    model_cls.bulk_copy_create(request.user, (model_cls(sample=sample, **data) for data in data_by_gene.values()))
 
     return create_json_response({'success': True})
 
@@ -1,5 +1,6 @@
 from datetime import datetime
 from django.urls.base import reverse
+from itertools import cycle
 import json
 import mock
 from requests import HTTPError
@@ -784,11 +785,14 @@ class DataManagerAPITest(AuthenticationTestCase):
         },
     }
 
-    def _has_expected_file_loading_logs(self, file, info=None, warnings=None, additional_logs=None, additional_logs_offset=None):
+    def _has_expected_file_loading_logs(self, file, info=None, warnings=None, additional_logs=None, additional_logs_offset=None,
+                                        num_parsed_rows=None):
         expected_logs = [
             (f'==> gsutil ls {file}', None),
             (f'==> gsutil cat {file} | gunzip -c -q - ', None),
-        ] + [(info_log, None) for info_log in info or []] + [
+        ] + ([] if num_parsed_rows is None else [
+            (f'Parsed {num_parsed_rows} RNA-seq rows in 0.5 seconds ({num_parsed_rows * 2} rows/second)', None),
+        ]) + [(info_log, None) for info_log in info or []] + [
             (warn_log, {'severity': 'WARNING'}) for warn_log in warnings or []
         ]
         if additional_logs:
@@ -820,6 +824,8 @@ class DataManagerAPITest(AuthenticationTestCase):
     def test_update_rna_splice_outlier(self, *args, **kwargs):
         self._test_update_rna_seq('splice_outlier', *args, **kwargs)
 
+    @mock.patch('seqr.models.BulkOperationBase.DELETE_BATCH_SIZE', 2)
+    @mock.patch('seqr.views.utils.dataset_utils.time', mock.Mock(perf_counter=mock.Mock(side_effect=cycle([0, 0.5]))))
     @mock.patch('seqr.views.utils.dataset_utils.BASE_URL', 'https://test-seqr.org/')
     @mock.patch('seqr.views.utils.dataset_utils.SEQR_SLACK_DATA_ALERTS_NOTIFICATION_CHANNEL', 'seqr-data-loading')
     @mock.patch('seqr.views.utils.dataset_utils.safe_post_to_slack')
@@ -912,7 +918,8 @@ class DataManagerAPITest(AuthenticationTestCase):
         ]
         warnings = ['Skipped loading for 1 samples already loaded from this file']
         self.assertDictEqual(response.json(), {'info': info, 'warnings': warnings, 'sampleGuids': [], 'fileName': mock.ANY})
-        self._has_expected_file_loading_logs('gs://rna_data/muscle_samples.tsv.gz', info=info, warnings=warnings)
+        self._has_expected_file_loading_logs(
+            'gs://rna_data/muscle_samples.tsv.gz', info=info, warnings=warnings, num_parsed_rows=1)
         self.assertEqual(model_cls.objects.count(), params['initial_model_count'])
         mock_send_slack.assert_not_called()
 
@@ -943,7 +950,7 @@ class DataManagerAPITest(AuthenticationTestCase):
             }})] + (additional_logs or [])
             self._has_expected_file_loading_logs(
                 'gs://rna_data/new_muscle_samples.tsv.gz', info=info, warnings=warnings,
-                additional_logs=additional_logs, additional_logs_offset=3)
+                additional_logs=additional_logs, additional_logs_offset=4, num_parsed_rows=len(data))
 
             return response_json, new_sample_guid
 
@@ -1009,6 +1016,7 @@ class DataManagerAPITest(AuthenticationTestCase):
                                  num_created_samples=2)
         self.assertSetEqual(set([s.split('_', 1)[1] for s in mock_writes]), params['write_data'])
 
+    @mock.patch('seqr.models.BulkOperationBase.COPY_BATCH_SIZE', 1)
     @mock.patch('seqr.views.apis.data_manager_api.os')
     @mock.patch('seqr.views.apis.data_manager_api.gzip.open')
     def test_load_rna_seq_sample_data(self, mock_open, mock_os):
@@ -1053,6 +1061,8 @@ class DataManagerAPITest(AuthenticationTestCase):
     def _join_data(cls, data):
         return ['\t'.join(line).encode('utf-8') for line in data]
 
+    # Deleting records which can not be fast deleted falls back to the django collector
+    @mock.patch('seqr.models.Collector.can_fast_delete', mock.Mock(return_value=False))
     @mock.patch('seqr.utils.file_utils.subprocess.Popen')
     def test_load_phenotype_prioritization_data(self, mock_subprocess):
         url = reverse(load_phenotype_prioritization_data)
@@ -1193,7 +1203,7 @@ class DataManagerAPITest(AuthenticationTestCase):
         self.assertDictEqual(response.json(), {'success': True})
 
         mock_open.assert_called_with(f'/mock/tmp/{PROJECT_GUID}_pedigree.tsv', 'w')
-        write_call = mock_open.return_value.__enter__.return_value.write.call_args.args[0]
+        write_call = ''.join(mock_open.return_value.__enter__.return_value.writelines.call_args.args[0])
         file = [row.split('\t') for row in write_call.split('\n')]
         self.assertEqual(len(file), 15)
         self.assertListEqual(file[:5], [
@@ -49,10 +49,7 @@ def family_page_data(request, family_guid):
     family_response = response['familiesByGuid'][family_guid]
 
     discovery_variants = family.savedvariant_set.filter(varianttag__variant_tag_type__category=DISCOVERY_CATEGORY)
-    gene_ids = {
-        gene_id for transcripts in discovery_variants.values_list('saved_variant_json__transcripts', flat=True)
-        for gene_id in (transcripts or {}).keys()
-    }
+    gene_ids = {gene_id for gene_ids in discovery_variants.values_list('gene_ids', flat=True) for gene_id in gene_ids}
     omims = Omim.objects.filter(
         Q(phenotype_mim_number__in=family_response['postDiscoveryOmimNumbers']) | Q(gene__gene_id__in=gene_ids)
     ).exclude(phenotype_mim_number__isnull=True).distinct()
@@ -461,8 +458,9 @@ def get_family_rna_seq_data(request, family_guid, gene_id):
         response[tpm.sample.tissue_type]['individualData'][indiv.display_name or indiv.individual_id] = tpm.tpm
 
     for tissue in response.keys():
-        response[tissue]['rdgData'] = list(
-            RnaSeqTpm.objects.filter(sample__tissue_type=tissue, gene_id=gene_id).order_by('tpm').values_list('tpm', flat=True))
+        tissue_samples = Sample.objects.filter(tissue_type=tissue, sample_type=Sample.SAMPLE_TYPE_RNA)
+        response[tissue]['rdgData'] = list(RnaSeqTpm.objects.filter(
+            sample__in=tissue_samples, gene_id=gene_id).order_by('tpm').values_list('tpm', flat=True))
 
     return create_json_response(response)
 
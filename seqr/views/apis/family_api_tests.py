@@ -13,8 +13,9 @@ from seqr.views.apis.family_api import update_family_pedigree_image, update_fami
     family_variant_tag_summary, update_family_analysis_groups, get_family_rna_seq_data, get_family_phenotype_gene_scores
 from seqr.views.utils.test_utils import AuthenticationTestCase, FAMILY_NOTE_FIELDS, FAMILY_FIELDS, IGV_SAMPLE_FIELDS, \
     SAMPLE_FIELDS, INDIVIDUAL_FIELDS, INTERNAL_INDIVIDUAL_FIELDS, INTERNAL_FAMILY_FIELDS, CASE_REVIEW_FAMILY_FIELDS, \
-    MATCHMAKER_SUBMISSION_FIELDS, TAG_TYPE_FIELDS, CASE_REVIEW_INDIVIDUAL_FIELDS
+    MATCHMAKER_SUBMISSION_FIELDS, TAG_TYPE_FIELDS, CASE_REVIEW_INDIVIDUAL_FIELDS, SAVED_VARIANT_FIELDS
 from seqr.models import FamilyAnalysedBy, AnalysisGroup
+from seqr.views.utils.rna_seq_tpm_utils import convert_rna_seq_tpm_rows_to_arrays
 
 FAMILY_GUID = 'F000001_1'
 FAMILY_GUID2 = 'F000002_2'
@@ -163,6 +164,8 @@ class FamilyAPITest(AuthenticationTestCase):
         family = response_json['familiesByGuid'][FAMILY_GUID]
         self.assertSetEqual(set(family.keys()), {'familyGuid', 'discoveryTags'})
         self.assertSetEqual({tag['variantGuid'] for tag in family['discoveryTags']}, {'SV0000001_2103343353_r0390_100'})
+        self.assertSetEqual(
+            set(family['discoveryTags'][0].keys()), {*SAVED_VARIANT_FIELDS, 'transcripts', 'mainTranscriptId'})
 
         project = response_json['projectsByGuid'][PROJECT_GUID]
         self.assertSetEqual(set(project.keys()), {'variantTagTypes', 'variantFunctionalTagTypes'})
@@ -534,6 +537,15 @@ class FamilyAPITest(AuthenticationTestCase):
             'M': {'individualData': {'NA19675_1': 8.38}, 'rdgData': [8.38]}
         })
 
+        # Test samples converted to arrays return the same data as samples with TPM rows
+        convert_rna_seq_tpm_rows_to_arrays(None, [152])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertDictEqual(response.json(), {
+            'F': {'individualData': {'NA19675_1': 1.01}, 'rdgData': [1.01]},
+            'M': {'individualData': {'NA19675_1': 8.38}, 'rdgData': [8.38]}
+        })
+
     def test_get_family_phenotype_gene_scores(self):
         url = reverse(get_family_phenotype_gene_scores, args=[FAMILY_GUID])
         self.check_collaborator_login(url)
@@ -1,11 +1,16 @@
 from collections import defaultdict
 import json
+import os
 import re
 import requests
+from requests.adapters import HTTPAdapter
+import threading
+import time
 
-from django.http import StreamingHttpResponse, HttpResponse
+from django.http import StreamingHttpResponse, HttpResponse, FileResponse
 
 from seqr.models import Individual, IgvSample
+from seqr.utils.disk_cache_utils import DiskLruCache
 from seqr.utils.file_utils import file_iter, does_file_exist, is_google_bucket_file_path, run_command, get_google_project
 from seqr.utils.redis_utils import safe_redis_get_json, safe_redis_set_json
 from seqr.views.utils.file_utils import save_uploaded_file, load_uploaded_file
@@ -14,13 +19,27 @@ from seqr.views.utils.json_utils import create_json_response
 from seqr.views.utils.orm_to_json_utils import get_json_for_sample
 from seqr.views.utils.permissions_utils import get_project_and_check_permissions, check_project_permissions, \
     login_and_policies_required, pm_or_data_manager_required, get_project_guids_user_can_view
+from settings import GS_STORAGE_URL, IGV_GENOMES_CACHE_DIR, IGV_GENOMES_CACHE_MAX_SIZE, IGV_INDEX_CACHE_DIR, \
+    IGV_INDEX_CACHE_MAX_SIZE
 
 GS_STORAGE_ACCESS_CACHE_KEY = 'gs_storage_access_cache_entry'
-GS_STORAGE_URL = 'https://storage.googleapis.com'
+# Tokens are refreshed this long before they actually expire, so in-flight requests never use an expired token
+GS_STORAGE_ACCESS_TOKEN_REFRESH_SECONDS = 60
+# The shared redis entry does not track its own expiry, so tokens loaded from it are only kept in-process briefly
+GS_STORAGE_ACCESS_TOKEN_REDIS_CHECK_SECONDS = 30
+STORAGE_POOL_SIZE = 25
+IGV_FILE_EXISTS_CACHE_KEY = 'igv_file_exists'
+IGV_INDEX_GENERATION_CACHE_KEY = 'igv_index_generation'
+# How long file existence and index generations are cached before checking the bucket again
+IGV_FILE_CACHE_EXPIRE_SECONDS = 600
+IGV_INDEX_FILE_EXTENSIONS = ('.bai', '.crai', '.tbi', '.csi')
+STREAMING_CHUNK_SIZE = 65536
+PROXY_RESPONSE_HEADERS = ['Content-Type', 'Content-Range']
 CLOUD_STORAGE_URLS = {
     's3': 'https://s3.amazonaws.com',
     'gs': GS_STORAGE_URL,
 }
+RANGE_HEADER_REGEX = re.compile(r'bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*$', re.I)
 
 
 def _process_alignment_records(rows, num_id_cols=1, **kwargs):
@@ -177,7 +196,7 @@ def fetch_igv_track(request, project_guid, igv_track_path):
 
     get_project_and_check_permissions(project_guid, request.user)
 
-    if igv_track_path.endswith('.bam.bai') and not does_file_exist(igv_track_path, user=request.user):
+    if igv_track_path.endswith('.bam.bai') and not _does_igv_file_exist(igv_track_path, user=request.user):
         igv_track_path = igv_track_path.replace('.bam.bai', '.bai')
 
     if is_google_bucket_file_path(igv_track_path):
@@ -186,16 +205,59 @@ def fetch_igv_track(request, project_guid, igv_track_path):
     return _stream_file(request, igv_track_path)
 
 
+_storage_sessions = {}
+_gs_access_token = {}
+_gs_access_token_lock = threading.Lock()
+
+igv_genomes_cache = DiskLruCache(IGV_GENOMES_CACHE_DIR, IGV_GENOMES_CACHE_MAX_SIZE)
+igv_index_cache = DiskLruCache(IGV_INDEX_CACHE_DIR, IGV_INDEX_CACHE_MAX_SIZE)
+
+
+def _does_igv_file_exist(file_path, user):
+    cache_key = f'{IGV_FILE_EXISTS_CACHE_KEY}__{file_path}'
+    file_exists = safe_redis_get_json(cache_key)
+    if file_exists is None:
+        file_exists = does_file_exist(file_path, user=user)
+        safe_redis_set_json(cache_key, file_exists, expire=IGV_FILE_CACHE_EXPIRE_SECONDS)
+    return file_exists
+
+
+def _get_storage_session(storage_url):
+    """Keep-alive session shared by all requests to the given storage host in this process"""
+    if storage_url not in _storage_sessions:
+        session = requests.Session()
+        session.mount(storage_url, HTTPAdapter(pool_maxsize=STORAGE_POOL_SIZE))
+        _storage_sessions[storage_url] = session
+    return _storage_sessions[storage_url]
+
+
 def _stream_gs(request, gs_path):
-    headers = _get_gs_rest_api_headers(request.META.get('HTTP_RANGE'), gs_path, user=request.user)
+    content_type = 'application/octet-stream'
+    range_header = request.META.get('HTTP_RANGE')
+
+    # Index files are small and requested in full for every track load, so they are cached locally by object generation
+    is_index_file = not range_header and gs_path.endswith(IGV_INDEX_FILE_EXTENSIONS)
+    generation_cache_key = f'{IGV_INDEX_GENERATION_CACHE_KEY}__{gs_path}'
+    if is_index_file:
+        generation = safe_redis_get_json(generation_cache_key)
+        cached = igv_index_cache.get([gs_path, generation]) if generation else None
+        if cached:
+            return FileResponse(cached[0], content_type=content_type)
+
+    headers = _get_gs_rest_api_headers(range_header, gs_path, user=request.user)
 
-    response = requests.get(
+    response = _get_storage_session(GS_STORAGE_URL).get(
         f"{GS_STORAGE_URL}/{gs_path.replace('gs://', '', 1)}",
         headers=headers,
         stream=True)
 
-    return StreamingHttpResponse(response.iter_content(chunk_size=65536), status=response.status_code,
-                                 content_type='application/octet-stream')
+    content = response.iter_content(chunk_size=STREAMING_CHUNK_SIZE)
+    generation = response.headers.get('x-goog-generation')
+    if is_index_file and response.status_code == 200 and generation:
+        content = igv_index_cache.cache_content([gs_path, generation], content, user=request.user)
+        safe_redis_set_json(generation_cache_key, generation, expire=IGV_FILE_CACHE_EXPIRE_SECONDS)
+
+    return StreamingHttpResponse(content, status=response.status_code, content_type=content_type)
 
 
 def _get_gs_rest_api_headers(range_header, gs_path, user=None):
@@ -220,33 +282,80 @@ def _get_token_expiry(token):
         return 0
 
 
+def _get_cached_access_token():
+    if _gs_access_token.get('refresh_at', 0) > time.time():
+        return _gs_access_token['token']
+    return None
+
+
 def _get_access_token(user):
-    access_token = safe_redis_get_json(GS_STORAGE_ACCESS_CACHE_KEY)
-    if not access_token:
-        process = run_command('gcloud auth print-access-token', user=user)
-        if process.wait() == 0:
+    access_token = _get_cached_access_token()
+    if access_token:
+        return access_token
+
+    # Only one thread per process refreshes the token, any others wait for and then reuse the refreshed token
+    with _gs_access_token_lock:
+        access_token = _get_cached_access_token()
+        if access_token:
+            return access_token
+
+        access_token = safe_redis_get_json(GS_STORAGE_ACCESS_CACHE_KEY)
+        refresh_in = GS_STORAGE_ACCESS_TOKEN_REDIS_CHECK_SECONDS
+        if not access_token:
+            process = run_command('gcloud auth print-access-token', user=user)
+            if process.wait() != 0:
+                return None
             access_token = next(process.stdout).decode('utf-8').strip()
-            expires_in = _get_token_expiry(access_token)
-            safe_redis_set_json(GS_STORAGE_ACCESS_CACHE_KEY, access_token, expire=expires_in-5)
-    return access_token
+            # If the expiry can not be checked or the token is about to expire, check for a new token again shortly
+            refresh_in = max(
+                _get_token_expiry(access_token) - GS_STORAGE_ACCESS_TOKEN_REFRESH_SECONDS,
+                GS_STORAGE_ACCESS_TOKEN_REDIS_CHECK_SECONDS,
+            )
+            safe_redis_set_json(GS_STORAGE_ACCESS_CACHE_KEY, access_token, expire=refresh_in)
+
+        _gs_access_token.update({'token': access_token, 'refresh_at': time.time() + refresh_in})
+        return access_token
+
+
+def _parse_range_header(range_header, file_size):
+    """Returns the inclusive byte range for a single range request, or None if the header should be ignored"""
+    range_match = RANGE_HEADER_REGEX.match(range_header)
+    if not range_match:
+        return None
+    first_byte, last_byte = range_match.groups()
+    if not first_byte:
+        if not last_byte:
+            return None
+        # Suffix ranges request the last N bytes of the file
+        return max(file_size - int(last_byte), 0), file_size - 1
+
+    first_byte = int(first_byte)
+    if not last_byte:
+        return first_byte, file_size - 1
+    last_byte = int(last_byte)
+    if last_byte < first_byte:
+        return None
+    return first_byte, min(last_byte, file_size - 1)
 
 
 def _stream_file(request, path):
-    # based on https://gist.github.com/dcwatson/cb5d8157a8fa5a4a046e
     content_type = 'application/octet-stream'
+    file_size = os.path.getsize(path)
     range_header = request.META.get('HTTP_RANGE', None)
-    if range_header:
-        range_match = re.compile(r'bytes\s*=\s*(\d+)\s*-\s*(\d*)', re.I).match(range_header)
-        first_byte, last_byte = range_match.groups()
-        first_byte = int(first_byte) if first_byte else 0
-        last_byte = int(last_byte)
-        length = last_byte - first_byte + 1
+    byte_range = _parse_range_header(range_header, file_size) if range_header else None
+    if byte_range:
+        first_byte, last_byte = byte_range
+        if first_byte > last_byte:
+            resp = HttpResponse(status=416)
+            resp['Content-Range'] = 'bytes */{}'.format(file_size)
+            return resp
         resp = StreamingHttpResponse(
-            file_iter(path, byte_range=(first_byte, last_byte), raw_content=True, user=request.user), status=206, content_type=content_type)
-        resp['Content-Length'] = str(length)
-        resp['Content-Range'] = 'bytes %s-%s' % (first_byte, last_byte)
+            file_iter(path, byte_range=byte_range, raw_content=True, user=request.user), status=206,
+            content_type=content_type)
+        resp['Content-Length'] = str(last_byte - first_byte + 1)
+        resp['Content-Range'] = 'bytes {}-{}/{}'.format(first_byte, last_byte, file_size)
     else:
-        resp = StreamingHttpResponse(file_iter(path, raw_content=True, user=request.user), content_type=content_type)
+        resp = FileResponse(open(path, 'rb'), content_type=content_type)
     resp['Accept-Ranges'] = 'bytes'
     return resp
 
@@ -254,14 +363,34 @@ def _stream_file(request, path):
 def igv_genomes_proxy(request, cloud_host, file_path):
     # IGV does not properly set CORS header and cannot directly access the genomes resource from the browser without
     # using this server-side proxy
-    headers = {}
     range_header = request.META.get('HTTP_RANGE')
+
+    # Reference genome resources are immutable, so successful responses are cached locally
+    cache_key = [cloud_host, file_path, range_header]
+    cached = igv_genomes_cache.get(cache_key)
+    if cached:
+        cached_file, metadata = cached
+        proxy_response = FileResponse(cached_file, status=metadata['status'])
+        for header, value in metadata['headers'].items():
+            proxy_response[header] = value
+        return proxy_response
+
+    headers = {}
     if range_header:
         headers['Range'] = range_header
 
-    genome_response = requests.get(f'{CLOUD_STORAGE_URLS[cloud_host]}/{file_path}', headers=headers)
-    proxy_response = HttpResponse(
-        content=genome_response.content,
-        status=genome_response.status_code,
-    )
+    storage_url = CLOUD_STORAGE_URLS[cloud_host]
+    genome_response = _get_storage_session(storage_url).get(f'{storage_url}/{file_path}', headers=headers, stream=True)
+    response_headers = {
+        header: genome_response.headers[header] for header in PROXY_RESPONSE_HEADERS if header in genome_response.headers
+    }
+    content = genome_response.iter_content(chunk_size=STREAMING_CHUNK_SIZE)
+    if genome_response.status_code in {200, 206}:
+        content = igv_genomes_cache.cache_content(
+            cache_key, content, metadata={'status': genome_response.status_code, 'headers': response_headers},
+            user=request.user)
+
+    proxy_response = StreamingHttpResponse(content, status=genome_response.status_code)
+    for header, value in response_headers.items():
+        proxy_response[header] = value
     return proxy_response
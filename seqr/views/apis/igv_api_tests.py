@@ -1,13 +1,16 @@
 import json
 import mock
+import os
 import responses
 import subprocess # nosec
+import tempfile
 
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls.base import reverse
 from seqr.views.apis.igv_api import fetch_igv_track, receive_igv_table_handler, update_individual_igv_sample, \
     igv_genomes_proxy, receive_bulk_igv_table_handler
 from seqr.views.apis.igv_api import GS_STORAGE_ACCESS_CACHE_KEY
+from seqr.utils.disk_cache_utils import DiskLruCache
 from seqr.views.utils.test_utils import AuthenticationTestCase
 
 STREAMING_READS_CONTENT = [b'CRAM\x03\x83', b'\\\t\xfb\xa3\xf7%\x01', b'[\xfc\xc9\t\xae']
@@ -19,11 +22,14 @@ class IgvAPITest(AuthenticationTestCase):
     fixtures = ['users', '1kg_project']
 
     @responses.activate
+    @mock.patch.dict('seqr.views.apis.igv_api._gs_access_token', clear=True)
+    @mock.patch('seqr.views.apis.igv_api.time')
     @mock.patch('seqr.utils.file_utils.logger')
     @mock.patch('seqr.utils.file_utils.subprocess.Popen')
     @mock.patch('seqr.views.apis.igv_api.safe_redis_get_json')
     @mock.patch('seqr.views.apis.igv_api.safe_redis_set_json')
-    def test_proxy_google_to_igv(self, mock_set_redis, mock_get_redis, mock_subprocess, mock_file_logger):
+    def test_proxy_google_to_igv(self, mock_set_redis, mock_get_redis, mock_subprocess, mock_file_logger, mock_time):
+        mock_time.time.return_value = 1000
         mock_ls_subprocess = mock.MagicMock()
         mock_access_token_subprocess = mock.MagicMock()
         mock_subprocess.side_effect = [mock_ls_subprocess, mock_access_token_subprocess]
@@ -48,7 +54,7 @@ class IgvAPITest(AuthenticationTestCase):
         self.assertEqual(responses.calls[1].request.headers.get('Authorization'), 'Bearer token1')
         self.assertEqual(responses.calls[1].request.headers.get('x-goog-user-project'), 'anvil-datastorage')
         mock_get_redis.assert_called_with(GS_STORAGE_ACCESS_CACHE_KEY)
-        mock_set_redis.assert_called_with(GS_STORAGE_ACCESS_CACHE_KEY, 'token1', expire=3594)
+        mock_set_redis.assert_called_with(GS_STORAGE_ACCESS_CACHE_KEY, 'token1', expire=3539)
         mock_subprocess.assert_has_calls([
             mock.call('gsutil -u anvil-datastorage ls gs://fc-secure-project_A/sample_1.bam.bai', stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True),
             mock.call('gcloud auth print-access-token', stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True),
@@ -69,33 +75,194 @@ class IgvAPITest(AuthenticationTestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
         self.assertIsNone(responses.calls[2].request.headers.get('Range'))
-        self.assertEqual(responses.calls[2].request.headers.get('Authorization'), 'Bearer token3')
         self.assertIsNone(responses.calls[2].request.headers.get('x-goog-user-project'))
-        mock_get_redis.assert_called_with(GS_STORAGE_ACCESS_CACHE_KEY)
+
+        # test token is cached in process until it needs to be refreshed
+        self.assertEqual(responses.calls[2].request.headers.get('Authorization'), 'Bearer token1')
+        mock_get_redis.assert_not_called()
         mock_set_redis.assert_not_called()
         mock_subprocess.assert_not_called()
 
-    @mock.patch('seqr.utils.file_utils.subprocess.Popen')
-    @mock.patch('seqr.utils.file_utils.open')
-    def test_proxy_local_to_igv(self, mock_open, mock_subprocess):
-        mock_subprocess.return_value.stdout = STREAMING_READS_CONTENT
-        mock_open.return_value.__enter__.return_value.__iter__.return_value = STREAMING_READS_CONTENT
+        mock_time.time.return_value = 4540
+        self.client.get(url)
+        self.assertEqual(responses.calls[3].request.headers.get('Authorization'), 'Bearer token3')
+        mock_get_redis.assert_called_once_with(GS_STORAGE_ACCESS_CACHE_KEY)
+        mock_set_redis.assert_not_called()
+        mock_subprocess.assert_not_called()
+
+        # test tokens loaded from redis are only cached in process briefly
+        mock_get_redis.reset_mock()
+        mock_time.time.return_value = 4560
+        self.client.get(url)
+        self.assertEqual(responses.calls[4].request.headers.get('Authorization'), 'Bearer token3')
+        mock_get_redis.assert_not_called()
+
+        mock_time.time.return_value = 4580
+        mock_get_redis.return_value = None
+        mock_access_token_subprocess.wait.return_value = 1
+        mock_subprocess.side_effect = None
+        mock_subprocess.return_value = mock_access_token_subprocess
+        self.client.get(url)
+        self.assertEqual(responses.calls[5].request.headers.get('Authorization'), 'Bearer None')
+        mock_get_redis.assert_called_once_with(GS_STORAGE_ACCESS_CACHE_KEY)
+        mock_set_redis.assert_not_called()
+        mock_subprocess.assert_called_once_with(
+            'gcloud auth print-access-token', stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True)
+
+        # test configured storage url
+        mock_get_redis.return_value = 'token4'
+        responses.add(responses.GET, 'http://localhost:4443/project_A/sample_1.bed.gz',
+                      stream=True, body=b'\n'.join(STREAMING_READS_CONTENT), status=200)
+        with mock.patch('seqr.views.apis.igv_api.GS_STORAGE_URL', 'http://localhost:4443'):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(responses.calls[6].request.url, 'http://localhost:4443/project_A/sample_1.bed.gz')
+        self.assertEqual(responses.calls[6].request.headers.get('Authorization'), 'Bearer token4')
+
+        # test tokens are refreshed again shortly if their expiry can not be checked
+        mock_time.time.return_value = 5000
+        mock_get_redis.return_value = None
+        mock_set_redis.reset_mock()
+        mock_subprocess.reset_mock()
+        mock_access_token_subprocess.wait.return_value = 0
+        mock_access_token_subprocess.stdout = iter([b'token5\n'])
+        responses.replace(responses.POST, 'https://www.googleapis.com/oauth2/v1/tokeninfo', status=400)
+        self.client.get(url)
+        self.assertEqual(responses.calls[8].request.headers.get('Authorization'), 'Bearer token5')
+        mock_set_redis.assert_called_once_with(GS_STORAGE_ACCESS_CACHE_KEY, 'token5', expire=30)
+
+        mock_subprocess.reset_mock()
+        mock_time.time.return_value = 5020
+        self.client.get(url)
+        self.assertEqual(responses.calls[9].request.headers.get('Authorization'), 'Bearer token5')
+        mock_subprocess.assert_not_called()
+
+        mock_time.time.return_value = 5040
+        mock_access_token_subprocess.stdout = iter([b'token6\n'])
+        self.client.get(url)
+        self.assertEqual(responses.calls[11].request.headers.get('Authorization'), 'Bearer token6')
+        mock_subprocess.assert_called_once()
 
-        url = reverse(fetch_igv_track, args=[PROJECT_GUID, '/project_A/sample_1.bam.bai'])
+    @responses.activate
+    @mock.patch.dict('seqr.views.apis.igv_api._gs_access_token', {'token': 'token1', 'refresh_at': float('inf')})
+    @mock.patch('seqr.views.apis.igv_api.does_file_exist')
+    @mock.patch('seqr.views.apis.igv_api.safe_redis_get_json')
+    @mock.patch('seqr.views.apis.igv_api.safe_redis_set_json')
+    def test_proxy_google_index_to_igv(self, mock_set_redis, mock_get_redis, mock_file_exists):
+        redis_cache = {}
+        mock_get_redis.side_effect = redis_cache.get
+        mock_set_redis.side_effect = lambda key, value, expire: redis_cache.update({key: value})
+        mock_file_exists.return_value = False
+
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        patcher = mock.patch('seqr.views.apis.igv_api.igv_index_cache', DiskLruCache(temp_dir.name, 1000))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        index_url = 'https://storage.googleapis.com/project_A/sample_1.bai'
+        responses.add(responses.GET, index_url, body=b'index_v1', headers={'x-goog-generation': '123'})
+
+        url = reverse(fetch_igv_track, args=[PROJECT_GUID, 'gs://project_A/sample_1.bam.bai'])
         self.check_collaborator_login(url)
-        response = self.client.get(url, HTTP_RANGE='bytes=100-250')
-        self.assertEqual(response.status_code, 206)
-        self.assertListEqual([val for val in response.streaming_content], STREAMING_READS_CONTENT)
-        mock_subprocess.assert_called_with(
-            'dd skip=100 count=150 bs=1 if=/project_A/sample_1.bai',
-            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True)
-        mock_open.assert_not_called()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'index_v1')
+        self.assertEqual(len(responses.calls), 1)
+        mock_file_exists.assert_called_once_with('gs://project_A/sample_1.bam.bai', user=self.collaborator_user)
+        mock_set_redis.assert_has_calls([
+            mock.call('igv_file_exists__gs://project_A/sample_1.bam.bai', False, expire=600),
+            mock.call('igv_index_generation__gs://project_A/sample_1.bai', '123', expire=600),
+        ])
 
-        # test no byte range
+        # test cached index and file existence are used
+        mock_file_exists.reset_mock()
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
-        self.assertListEqual([val for val in response.streaming_content], STREAMING_READS_CONTENT)
-        mock_open.assert_called_with('/project_A/sample_1.bai', 'rb')
+        self.assertEqual(b''.join(response.streaming_content), b'index_v1')
+        self.assertEqual(response.get('Content-Length'), '8')
+        self.assertEqual(len(responses.calls), 1)
+        mock_file_exists.assert_not_called()
+
+        # test index is reloaded once the cached generation expires
+        del redis_cache['igv_index_generation__gs://project_A/sample_1.bai']
+        responses.replace(responses.GET, index_url, body=b'index_v2', headers={'x-goog-generation': '456'})
+        response = self.client.get(url)
+        self.assertEqual(b''.join(response.streaming_content), b'index_v2')
+        self.assertEqual(len(responses.calls), 2)
+        self.assertEqual(responses.calls[1].request.headers.get('Authorization'), 'Bearer token1')
+        response = self.client.get(url)
+        self.assertEqual(b''.join(response.streaming_content), b'index_v2')
+        self.assertEqual(len(responses.calls), 2)
+
+        # test range requests for index files are not cached
+        response = self.client.get(url, HTTP_RANGE='bytes=0-3')
+        b''.join(response.streaming_content)
+        response = self.client.get(url, HTTP_RANGE='bytes=0-3')
+        b''.join(response.streaming_content)
+        self.assertEqual(len(responses.calls), 4)
+
+    @mock.patch('seqr.views.apis.igv_api.does_file_exist')
+    def test_proxy_local_to_igv(self, mock_file_exists):
+        mock_file_exists.return_value = False
+        file_content = os.urandom(200000)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with open(os.path.join(temp_dir, 'sample_1.bai'), 'wb') as f:
+                f.write(file_content)
+
+            url = reverse(fetch_igv_track, args=[PROJECT_GUID, f'{temp_dir}/sample_1.bam.bai'])
+            self.check_collaborator_login(url)
+            response = self.client.get(url, HTTP_RANGE='bytes=100-250')
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(b''.join(response.streaming_content), file_content[100:251])
+            self.assertEqual(response.get('Content-Length'), '151')
+            self.assertEqual(response.get('Content-Range'), 'bytes 100-250/200000')
+            self.assertEqual(response.get('Accept-Ranges'), 'bytes')
+            mock_file_exists.assert_called_with(f'{temp_dir}/sample_1.bam.bai', user=self.collaborator_user)
+
+            # test large range is streamed in chunks
+            response = self.client.get(url, HTTP_RANGE='bytes=10-150009')
+            self.assertEqual(response.status_code, 206)
+            chunks = [chunk for chunk in response.streaming_content]
+            self.assertListEqual([len(chunk) for chunk in chunks], [65536, 65536, 18928])
+            self.assertEqual(b''.join(chunks), file_content[10:150010])
+
+            # test open ended range
+            response = self.client.get(url, HTTP_RANGE='bytes=199900-')
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(b''.join(response.streaming_content), file_content[199900:])
+            self.assertEqual(response.get('Content-Range'), 'bytes 199900-199999/200000')
+
+            # test suffix range
+            response = self.client.get(url, HTTP_RANGE='bytes=-50')
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(b''.join(response.streaming_content), file_content[-50:])
+            self.assertEqual(response.get('Content-Range'), 'bytes 199950-199999/200000')
+
+            # test range past the end of the file is truncated
+            response = self.client.get(url, HTTP_RANGE='bytes=199990-300000')
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(b''.join(response.streaming_content), file_content[199990:])
+            self.assertEqual(response.get('Content-Length'), '10')
+
+            # test unsatisfiable ranges
+            for range_header in ['bytes=200000-', 'bytes=300000-300010', 'bytes=-0']:
+                response = self.client.get(url, HTTP_RANGE=range_header)
+                self.assertEqual(response.status_code, 416)
+                self.assertEqual(response.get('Content-Range'), 'bytes */200000')
+
+            # test invalid ranges are ignored
+            for range_header in ['bytes=250-100', 'bytes=-', 'bytes=0-10,20-30', 'lines=0-10']:
+                response = self.client.get(url, HTTP_RANGE=range_header)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(b''.join(response.streaming_content), file_content)
+
+            # test no byte range
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.get('Content-Length'), '200000')
+            self.assertEqual(response.get('Accept-Ranges'), 'bytes')
+            self.assertEqual(b''.join(response.streaming_content), file_content)
 
     def test_receive_alignment_table_handler(self):
         url = reverse(receive_igv_table_handler, args=[PROJECT_GUID])
@@ -280,6 +447,12 @@ class IgvAPITest(AuthenticationTestCase):
 
     @responses.activate
     def test_igv_genomes_proxy(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        patcher = mock.patch('seqr.views.apis.igv_api.igv_genomes_cache', DiskLruCache(temp_dir.name, 1000))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
         url_path = 'igv.org.genomes/foo?query=true'
         s3_url = reverse(igv_genomes_proxy, args=['s3', url_path])
 
@@ -290,7 +463,8 @@ class IgvAPITest(AuthenticationTestCase):
 
         response = self.client.get(s3_url)
         self.assertEqual(response.status_code, 200)
-        self.assertDictEqual(json.loads(response.content), expected_body)
+        self.assertDictEqual(json.loads(b''.join(response.streaming_content)), expected_body)
+        self.assertEqual(response.get('Content-Type'), 'application/json')
         self.assertIsNone(responses.calls[0].request.headers.get('Range'))
 
         # test with range header proxy
@@ -298,9 +472,40 @@ class IgvAPITest(AuthenticationTestCase):
         expected_content = 'test file content'
         responses.add(
             responses.GET, 'https://storage.googleapis.com/test-bucket/foo.fasta', match_querystring=True,
-            body=expected_content)
+            body=expected_content, status=206, headers={'Content-Range': 'bytes 100-116/5000'})
+
+        response = self.client.get(gs_url, HTTP_RANGE='bytes=100-116')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content).decode(), expected_content)
+        self.assertEqual(response.get('Content-Range'), 'bytes 100-116/5000')
+        self.assertEqual(responses.calls[1].request.headers.get('Range'), 'bytes=100-116')
 
-        response = self.client.get(gs_url, HTTP_RANGE='bytes=100-200')
+        # test cached responses are served locally
+        response = self.client.get(s3_url)
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.content.decode(), expected_content)
-        self.assertEqual(responses.calls[1].request.headers.get('Range'), 'bytes=100-200')
+        self.assertDictEqual(json.loads(b''.join(response.streaming_content)), expected_body)
+        self.assertEqual(response.get('Content-Type'), 'application/json')
+        self.assertEqual(response.get('Content-Length'), str(len(json.dumps(expected_body))))
+
+        response = self.client.get(gs_url, HTTP_RANGE='bytes=100-116')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content).decode(), expected_content)
+        self.assertEqual(response.get('Content-Range'), 'bytes 100-116/5000')
+        self.assertEqual(response.get('Content-Length'), '17')
+        self.assertEqual(len(responses.calls), 2)
+
+        # test different ranges are cached separately
+        response = self.client.get(gs_url, HTTP_RANGE='bytes=200-216')
+        self.assertEqual(response.status_code, 206)
+        b''.join(response.streaming_content)
+        self.assertEqual(len(responses.calls), 3)
+        self.assertEqual(responses.calls[2].request.headers.get('Range'), 'bytes=200-216')
+
+        # test error responses are not cached
+        error_url = reverse(igv_genomes_proxy, args=['gs', 'test-bucket/missing.fasta'])
+        responses.add(responses.GET, 'https://storage.googleapis.com/test-bucket/missing.fasta', status=404)
+        for i in range(2):
+            response = self.client.get(error_url)
+            self.assertEqual(response.status_code, 404)
+            b''.join(response.streaming_content)
+        self.assertEqual(len(responses.calls), 5)
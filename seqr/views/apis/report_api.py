@@ -1183,9 +1183,8 @@ def _update_variant_inheritance(variant, affected_individual_guids, unaffected_i
     for gene_id in potential_compound_het_gene_ids:
         potential_compound_het_genes[gene_id].add(variant)
 
-    main_transcript = _get_variant_model_main_transcript(variant)
-    if main_transcript.get('geneId'):
-        variant.saved_variant_json['mainTranscriptGeneId'] = main_transcript['geneId']
+    if variant.main_transcript_gene_id:
+        variant.saved_variant_json['mainTranscriptGeneId'] = variant.main_transcript_gene_id
 
 
 def _get_variant_model_main_transcript(variant):
@@ -1,9 +1,11 @@
 from django.urls.base import reverse
 from django.utils.dateparse import parse_datetime
+from io import BytesIO
 import json
 import mock
 import pytz
 import responses
+import zipfile
 from settings import AIRTABLE_URL
 
 from seqr.models import Project, SavedVariant
@@ -541,15 +543,13 @@ MOCK_INVALID_DATA_MODEL = {
 
 class ReportAPITest(AirtableTest):
 
-    def _get_zip_files(self, mock_zip, filenames):
-        mock_write_zip = mock_zip.return_value.__enter__.return_value.writestr
-        self.assertEqual(mock_write_zip.call_count, len(filenames))
-        mock_write_zip.assert_has_calls([mock.call(file, mock.ANY) for file in filenames])
-
-        return (
-            [row.split('\t') for row in mock_write_zip.call_args_list[i][0][1].split('\n') if row]
-            for i in range(len(filenames))
-        )
+    def _get_zip_files(self, response, filenames):
+        with zipfile.ZipFile(BytesIO(response.getvalue())) as zip_file:
+            self.assertListEqual(zip_file.namelist(), filenames)
+            return [
+                [row.split('\t') for row in zip_file.read(filename).decode('utf-8').split('\n') if row]
+                for filename in filenames
+            ]
 
     def test_seqr_stats(self):
         no_access_project = Project.objects.get(id=2)
@@ -630,10 +630,9 @@ class ReportAPITest(AirtableTest):
 
         self.check_no_analyst_no_access(url)
 
-    @mock.patch('seqr.views.utils.export_utils.zipfile.ZipFile')
     @mock.patch('seqr.views.utils.airtable_utils.is_google_authenticated')
     @responses.activate
-    def test_anvil_export(self, mock_google_authenticated,  mock_zip):
+    def test_anvil_export(self, mock_google_authenticated):
         mock_google_authenticated.return_value = False
         url = reverse(anvil_export, args=[PROJECT_GUID])
         self.check_analyst_login(url)
@@ -656,7 +655,7 @@ class ReportAPITest(AirtableTest):
             'attachment; filename="1kg project nme with unide_AnVIL_Metadata.zip"'
         )
 
-        subject_file, sample_file, family_file, discovery_file = self._get_zip_files(mock_zip, [
+        subject_file, sample_file, family_file, discovery_file = self._get_zip_files(response, [
             '1kg project n\xe5me with uni\xe7\xf8de_PI_Subject.tsv',
             '1kg project n\xe5me with uni\xe7\xf8de_PI_Sample.tsv',
             '1kg project n\xe5me with uni\xe7\xf8de_PI_Family.tsv',
@@ -877,8 +876,8 @@ class ReportAPITest(AirtableTest):
         self.assertListEqual(
             mock_open.call_args_list, [mock.call(f'/mock/tmp/{file}.tsv', 'w') for file in EXPECTED_GREGOR_FILES])
         files = [
-            [row.split('\t') for row in write_call.args[0].split('\n')]
-            for write_call in mock_open.return_value.__enter__.return_value.write.call_args_list
+            [row.split('\t') for row in ''.join(write_call.args[0]).split('\n')]
+            for write_call in mock_open.return_value.__enter__.return_value.writelines.call_args_list
         ]
         participant_file, family_file, phenotype_file, analyte_file, experiment_file, read_file, read_set_file, \
         called_file, experiment_rna_file, aligned_rna_file, experiment_lookup_file, genetic_findings_file = files
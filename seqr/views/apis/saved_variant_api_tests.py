@@ -877,12 +877,14 @@ class SavedVariantAPITest(object):
         self.assertDictEqual(response.json(), {'error': 'Unable to find the following variant(s): not_variant'})
 
     @mock.patch('seqr.views.utils.variant_utils.MAX_VARIANTS_FETCH', 3)
+    @mock.patch('seqr.views.utils.variant_utils.SAVED_VARIANT_UPDATE_BATCH_SIZE', 2)
     @mock.patch('seqr.views.apis.saved_variant_api.logger')
     @mock.patch('seqr.views.utils.variant_utils.get_variants_for_variant_ids')
     def test_update_saved_variant_json(self, mock_get_variants, mock_logger):
         mock_get_variants.side_effect = lambda families, variant_ids, **kwargs: \
-            [{'variantId': variant_id, 'familyGuids': [family.guid for family in families]}
-             for variant_id in variant_ids]
+            [{'variantId': variant_id, 'familyGuids': [family.guid for family in families],
+              'transcripts': {'ENSG00000233653': [], 'ENSG00000227232': [{'transcriptId': 'ENST00000438943'}]},
+              'mainTranscriptId': 'ENST00000438943'} for variant_id in variant_ids]
 
         url = reverse(update_saved_variant_json, args=['R0001_1kg'])
         self.check_manager_login(url)
@@ -900,8 +902,16 @@ class SavedVariantAPITest(object):
         mock_get_variants.assert_has_calls([
             mock.call(families, ['1-1562437-G-C', '1-46859832-G-A', '12-48367227-TC-T'], user=self.manager_user),
             mock.call(families, ['21-3343353-GAGA-G'], user=self.manager_user),
-        ])
+        ], any_order=True)
         mock_logger.error.assert_not_called()
+        saved_variant = SavedVariant.objects.get(guid='SV0000002_1248367227_r0390_100')
+        self.assertDictEqual(saved_variant.saved_variant_json, {
+            'variantId': '12-48367227-TC-T', 'familyGuids': ['F000001_1', 'F000002_2'],
+            'transcripts': {'ENSG00000233653': [], 'ENSG00000227232': [{'transcriptId': 'ENST00000438943'}]},
+            'mainTranscriptId': 'ENST00000438943',
+        })
+        self.assertListEqual(saved_variant.gene_ids, ['ENSG00000227232', 'ENSG00000233653'])
+        self.assertEqual(saved_variant.main_transcript_gene_id, 'ENSG00000227232')
 
         # Test handles update error
         mock_get_variants.side_effect = Exception('Unable to fetch variants')
@@ -921,6 +931,7 @@ class SavedVariantAPITest(object):
         saved_variants = SavedVariant.objects.filter(guid=VARIANT_GUID)
         self.assertEqual(len(saved_variants), 1)
         self.assertEqual(saved_variants.first().selected_main_transcript_id, transcript_id)
+        self.assertEqual(saved_variants.first().main_transcript_gene_id, 'ENSG00000135953')
         self.assertEqual(get_json_for_saved_variants(saved_variants, add_details=True)[0]['selectedMainTranscriptId'], transcript_id)
 
     def test_update_variant_acmg_classification(self):
@@ -1,7 +1,6 @@
 import json
 import jmespath
 from collections import defaultdict
-from copy import deepcopy
 from django.utils import timezone
 from django.contrib.postgres.aggregates import ArrayAgg
 from django.core.exceptions import MultipleObjectsReturned, PermissionDenied
@@ -235,6 +234,17 @@ VARIANT_SAMPLE_DATA = [
     {'header': 'ab'},
 ]
 
+
+def _compile_export_data(export_data):
+    return [
+        (jmespath.compile(config.get('value_path', config['header'])), config.get('process')) for config in export_data
+    ]
+
+
+VARIANT_EXPORT_FIELDS = _compile_export_data(VARIANT_EXPORT_DATA)
+VARIANT_FAMILY_EXPORT_FIELDS = _compile_export_data(VARIANT_FAMILY_EXPORT_DATA)
+VARIANT_SAMPLE_FIELDS = _compile_export_data(VARIANT_SAMPLE_DATA)
+
 MAX_FAMILIES_PER_ROW = 1000
 
 
@@ -260,11 +270,12 @@ def export_variants_handler(request, search_hash):
     families = results_model.families.all()
     family_ids_by_guid = {family.guid: family.family_id for family in families}
 
-    variants, _ = query_variants(results_model, page=1, load_all=True, user=request.user)
+    variants, _ = query_variants(results_model, page=1, load_all=True, user=request.user, search_after=True)
     variants = _flatten_variants(variants)
 
     saved_variants, variants_by_id = _get_saved_variant_models(variants, families)
-    json_saved_variants = get_json_for_saved_variants_with_tags(saved_variants, add_details=True)
+    json_saved_variants = get_json_for_saved_variants_with_tags(
+        saved_variants, add_details=True, include_functional_data=False)
 
     saved_variants_by_variant_family = {}
     for saved_variant in json_saved_variants['savedVariantsByGuid'].values():
@@ -288,37 +299,24 @@ def export_variants_handler(request, search_hash):
             gens_per_row = ceil(len(variant['genotypes']) / num_split)
             gen_keys = list(variant['genotypes'].keys())
             for i in range(num_split):
-                split_var = deepcopy(variant)
-                split_var['familyGuids'] = variant['familyGuids'][i*MAX_FAMILIES_PER_ROW:(i+1)*MAX_FAMILIES_PER_ROW]
                 split_gen = set(gen_keys[i*gens_per_row:(i+1)*gens_per_row])
-                split_var['genotypes'] = {k: v for k, v in variant['genotypes'].items() if k in split_gen}
-                split_variants.append(split_var)
+                split_variants.append({
+                    **variant,
+                    'familyGuids': variant['familyGuids'][i*MAX_FAMILIES_PER_ROW:(i+1)*MAX_FAMILIES_PER_ROW],
+                    'genotypes': {k: v for k, v in variant['genotypes'].items() if k in split_gen},
+                })
 
         variants = split_variants
 
     max_families_per_variant = max([len(variant['familyGuids']) for variant in variants])
     max_samples_per_variant = max([len(variant['genotypes']) for variant in variants])
 
-    rows = []
-    for variant in variants:
-        row = [_get_field_value(variant, config) for config in VARIANT_EXPORT_DATA]
-
-        family_saved_variants = saved_variants_by_variant_family.get(get_variant_key(**variant), {})
-        for family_guid in variant['familyGuids']:
-            variant_guid = family_saved_variants.get(family_guid, '')
-            family_tags = {
-                'family_id': family_ids_by_guid.get(family_guid),
-                'tags': [tag for tag in json_saved_variants['variantTagsByGuid'].values() if variant_guid in tag['variantGuids']],
-                'notes': [note for note in json_saved_variants['variantNotesByGuid'].values() if variant_guid in note['variantGuids']],
-            }
-            row += [_get_field_value(family_tags, config) for config in VARIANT_FAMILY_EXPORT_DATA]
-        row += ['' for i in range(len(VARIANT_FAMILY_EXPORT_DATA) * (max_families_per_variant - len(variant['familyGuids'])))]
-
-        genotypes = list(variant['genotypes'].values())
-        for genotype in genotypes:
-            row += [_get_field_value(genotype, config) for config in VARIANT_SAMPLE_DATA]
-        row += ['' for i in range(len(VARIANT_SAMPLE_DATA) * (max_samples_per_variant - len(genotypes)))]
-        rows.append(row)
+    rows = _get_variant_export_rows(
+        variants, saved_variants_by_variant_family, family_ids_by_guid,
+        tags_by_variant_guid=_group_by_variant_guid(json_saved_variants['variantTagsByGuid']),
+        notes_by_variant_guid=_group_by_variant_guid(json_saved_variants['variantNotesByGuid']),
+        max_families_per_variant=max_families_per_variant, max_samples_per_variant=max_samples_per_variant,
+    )
 
     header = [config['header'] for config in VARIANT_EXPORT_DATA]
     for i in range(max_families_per_variant):
@@ -331,10 +329,42 @@ def export_variants_handler(request, search_hash):
     return export_table('search_results_{}'.format(search_hash), header, rows, file_format, titlecase_header=False)
 
 
-def _get_field_value(value, config):
-    field_value = jmespath.search(config.get('value_path', config['header']), value)
-    if config.get('process'):
-        field_value = config['process'](field_value)
+def _group_by_variant_guid(json_by_guid):
+    json_by_variant_guid = defaultdict(list)
+    for entity_json in json_by_guid.values():
+        for variant_guid in entity_json['variantGuids']:
+            json_by_variant_guid[variant_guid].append(entity_json)
+    return json_by_variant_guid
+
+
+def _get_variant_export_rows(variants, saved_variants_by_variant_family, family_ids_by_guid, tags_by_variant_guid,
+                             notes_by_variant_guid, max_families_per_variant, max_samples_per_variant):
+    for variant in variants:
+        row = [_get_field_value(variant, field) for field in VARIANT_EXPORT_FIELDS]
+
+        family_saved_variants = saved_variants_by_variant_family.get(get_variant_key(**variant), {})
+        for family_guid in variant['familyGuids']:
+            variant_guid = family_saved_variants.get(family_guid)
+            family_tags = {
+                'family_id': family_ids_by_guid.get(family_guid),
+                'tags': tags_by_variant_guid.get(variant_guid, []),
+                'notes': notes_by_variant_guid.get(variant_guid, []),
+            }
+            row += [_get_field_value(family_tags, field) for field in VARIANT_FAMILY_EXPORT_FIELDS]
+        row += ['' for i in range(len(VARIANT_FAMILY_EXPORT_FIELDS) * (max_families_per_variant - len(variant['familyGuids'])))]
+
+        genotypes = list(variant['genotypes'].values())
+        for genotype in genotypes:
+            row += [_get_field_value(genotype, field) for field in VARIANT_SAMPLE_FIELDS]
+        row += ['' for i in range(len(VARIANT_SAMPLE_FIELDS) * (max_samples_per_variant - len(genotypes)))]
+        yield row
+
+
+def _get_field_value(value, field):
+    expression, process = field
+    field_value = expression.search(value)
+    if process:
+        field_value = process(field_value)
     return field_value
 
 
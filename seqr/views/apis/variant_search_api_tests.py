@@ -398,7 +398,7 @@ class VariantSearchAPITest(object):
              '', 'rs13447464', 'ENST00000428239.5:c.115+890G>A', '', '', '', '', '2', '', '', '', '', '', 'HG00731',
              '1', '99', '1.0', 'HG00732', '0', '99', '0.4594594594594595', 'HG00733', '1', '99', '0.4074074074074074'],
         ]
-        self.assertEqual(response.content, ('\n'.join(['\t'.join(line) for line in expected_content])+'\n').encode('utf-8'))
+        self.assertEqual(response.getvalue(), ('\n'.join(['\t'.join(line) for line in expected_content])+'\n').encode('utf-8'))
 
         # test export with max families
         with mock.patch('seqr.views.apis.variant_search_api.MAX_FAMILIES_PER_ROW', 1):
@@ -433,10 +433,10 @@ class VariantSearchAPITest(object):
                  '1', '99', '1.0', 'HG00732', '0', '99', '0.4594594594594595', 'HG00733', '1', '99',
                  '0.4074074074074074'],
             ]
-            self.assertEqual(response.content,
+            self.assertEqual(response.getvalue(),
                              ('\n'.join(['\t'.join(line) for line in expected_content]) + '\n').encode('utf-8'))
 
-        mock_get_variants.assert_called_with(results_model, page=1, load_all=True, user=self.collaborator_user)
+        mock_get_variants.assert_called_with(results_model, page=1, load_all=True, user=self.collaborator_user, search_after=True)
         mock_error_logger.assert_not_called()
 
         # Test gene breakdown
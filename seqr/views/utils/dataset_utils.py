@@ -1,17 +1,23 @@
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
+from collections.abc import Mapping
 from django.contrib.postgres.aggregates import ArrayAgg
 from django.db.models import Q
 from django.utils import timezone
 from tqdm import tqdm
+import json
+import os
 import random
+import tempfile
+import time
 
-from seqr.models import Sample, Individual, Family, Project, RnaSeqOutlier, RnaSeqTpm, RnaSeqSpliceOutlier
+from seqr.models import Sample, Individual, Family, Project, RnaSeqOutlier, RnaSeqTpm, RnaSeqTpmArray, \
+    RnaSeqSpliceOutlier
 from seqr.utils.communication_utils import safe_post_to_slack
 from seqr.utils.file_utils import file_iter
 from seqr.utils.logging_utils import SeqrLogger
 from seqr.utils.middleware import ErrorsWarningsException
 from seqr.utils.xpos_utils import format_chrom
-from seqr.views.utils.file_utils import parse_file
+from seqr.views.utils.file_utils import iter_file_rows
 from seqr.views.utils.permissions_utils import get_internal_projects
 from seqr.views.utils.json_utils import _to_snake_case, _to_camel_case
 from reference_data.models import GeneInfo
@@ -21,8 +27,7 @@ logger = SeqrLogger(__name__)
 
 
 def load_mapping_file(mapping_file_path, user):
-    file_content = parse_file(mapping_file_path, file_iter(mapping_file_path, user=user))
-    return load_mapping_file_content(file_content)
+    return load_mapping_file_content(iter_file_rows(mapping_file_path, file_iter(mapping_file_path, user=user)))
 
 
 def load_mapping_file_content(file_content):
@@ -247,6 +252,11 @@ SPLICE_OUTLIER_FORMATTER = {
 SPLICE_OUTLIER_HEADER_COLS = {col: _to_camel_case(col) for col in SPLICE_OUTLIER_COLS}
 SPLICE_OUTLIER_HEADER_COLS[SAMPLE_ID_COL] = SPLICE_OUTLIER_HEADER_COLS.pop(INDIV_ID_COL)
 
+# maximum number of samples with parsed rows held in memory at once while loading an RNA-seq file
+RNA_SAMPLE_BUFFER_SIZE = 4
+# maximum number of per-sample spill files kept open for appending while loading an RNA-seq file
+RNA_SPILL_MAX_OPEN_FILES = 256
+
 REVERSE_TISSUE_TYPE = dict(Sample.TISSUE_TYPE_CHOICES)
 TISSUE_TYPE_MAP = {v: k for k, v in REVERSE_TISSUE_TYPE.items() if k != Sample.NO_TISSUE_TYPE}
 
@@ -266,19 +276,19 @@ def _get_splice_id(row):
                     row[SPLICE_TYPE_COL]])
 
 
+def _rank_splice_outliers(sample_data_rows):
+    sorted_data_rows = sorted([data_row for data_row in sample_data_rows.values()], key=lambda d: d[P_VALUE_COL])
+    for i, data_row in enumerate(sorted_data_rows):
+        data_row['rank'] = i
+    return sample_data_rows
+
+
 def load_rna_seq_splice_outlier(*args, **kwargs):
-    samples_to_load, info, warnings = _load_rna_seq(
+    return _load_rna_seq(
         RnaSeqSpliceOutlier, *args, SPLICE_OUTLIER_HEADER_COLS, format_fields=SPLICE_OUTLIER_FORMATTER,
-        get_unique_key=_get_splice_id, allow_missing_gene=True, **kwargs
+        get_unique_key=_get_splice_id, allow_missing_gene=True, format_sample_data=_rank_splice_outliers, **kwargs
     )
 
-    for sample_data_rows in samples_to_load.values():
-        sorted_data_rows = sorted([data_row for data_row in sample_data_rows.values()], key=lambda d: d[P_VALUE_COL])
-        for i, data_row in enumerate(sorted_data_rows):
-            data_row['rank'] = i
-
-    return samples_to_load, info, warnings
-
 
 def _validate_rna_header(header, column_map):
     required_column_map = {
@@ -307,23 +317,133 @@ def _parse_rna_row(row, column_map, required_column_map, missing_required_fields
             yield sample_id, row_dict
 
 
+class RnaSampleData(object):
+    """Parsed RNA-seq data for each (sample_id, project), which is spilled to disk so the full file is never held in
+    memory.
+
+    Rows are buffered in memory for at most RNA_SAMPLE_BUFFER_SIZE samples at a time, and each sample is checked for
+    mismatched entries as it is parsed. For files grouped by sample, every sample is spilled exactly once. Otherwise, a
+    sample may be spilled in multiple fragments, which are merged and checked once the whole file is parsed. The
+    spill files of the most recently spilled samples are kept open, so interleaved samples are not reopened for every
+    fragment. The parsed samples can only be accessed once finalized.
+    """
+
+    def __init__(self, get_unique_key=None):
+        self._get_unique_key = get_unique_key or (lambda row_dict: row_dict[GENE_ID_COL])
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self._buffers = OrderedDict()
+        self._file_paths = {}
+        self._open_files = OrderedDict()
+        self._fragmented_sample_keys = set()
+        self.errors = []
+
+    def __len__(self):
+        return len(self._file_paths)
+
+    def keys(self):
+        return self._file_paths.keys()
+
+    def add(self, sample_key, row_dict):
+        buffer = self._buffers.get(sample_key)
+        if buffer is None:
+            if sample_key in self._file_paths:
+                self._fragmented_sample_keys.add(sample_key)
+            buffer = self._buffers[sample_key] = {}
+            if len(self._buffers) > RNA_SAMPLE_BUFFER_SIZE:
+                self._spill(next(iter(self._buffers)))
+        self._add_row(buffer, sample_key, row_dict)
+
+    def _add_row(self, buffer, sample_key, row_dict):
+        gene_or_unique_id = self._get_unique_key(row_dict)
+        existing_data = buffer.get(gene_or_unique_id)
+        if existing_data and existing_data != row_dict:
+            self.errors.append(f'Error in {sample_key[0]} data for {gene_or_unique_id}: mismatched entries '
+                               f'{existing_data} and {row_dict}')
+        buffer[gene_or_unique_id] = row_dict
+
+    def _spill(self, sample_key):
+        buffer = self._buffers.pop(sample_key)
+        self._get_spill_file(sample_key).writelines(f'{json.dumps(row_dict)}\n' for row_dict in buffer.values())
+
+    def _get_spill_file(self, sample_key):
+        f = self._open_files.get(sample_key)
+        if f is not None:
+            self._open_files.move_to_end(sample_key)
+            return f
+        if sample_key not in self._file_paths:
+            self._file_paths[sample_key] = os.path.join(self._temp_dir.name, str(len(self._file_paths)))
+        f = self._open_files[sample_key] = open(self._file_paths[sample_key], 'a')
+        if len(self._open_files) > RNA_SPILL_MAX_OPEN_FILES:
+            self._open_files.popitem(last=False)[1].close()
+        return f
+
+    def _close_files(self):
+        for f in self._open_files.values():
+            f.close()
+        self._open_files = OrderedDict()
+
+    def finalize(self):
+        """Spill all buffered samples, and merge and validate any fragmented samples"""
+        while self._buffers:
+            self._spill(next(iter(self._buffers)))
+        self._close_files()
+        for sample_key in self._fragmented_sample_keys:
+            buffer = {}
+            with open(self._file_paths[sample_key]) as f:
+                for line in f:
+                    self._add_row(buffer, sample_key, json.loads(line))
+            os.remove(self._file_paths[sample_key])
+            self._buffers[sample_key] = buffer
+            self._spill(sample_key)
+        self._close_files()
+        self._fragmented_sample_keys = set()
+
+    def discard(self, sample_key):
+        os.remove(self._file_paths.pop(sample_key))
+
+    def get(self, sample_key):
+        with open(self._file_paths[sample_key]) as f:
+            return {self._get_unique_key(row_dict): row_dict for row_dict in (json.loads(line) for line in f)}
+
+
+class RnaSampleDataByGuid(Mapping):
+    """Lazily loads the parsed RNA-seq data for each sample guid, so only one sample is held in memory at a time"""
+
+    def __init__(self, sample_data, sample_keys_by_guid, format_sample_data=None):
+        self._sample_data = sample_data
+        self._sample_keys_by_guid = sample_keys_by_guid
+        self._format_sample_data = format_sample_data
+
+    def __getitem__(self, sample_guid):
+        data = self._sample_data.get(self._sample_keys_by_guid[sample_guid])
+        return self._format_sample_data(data) if self._format_sample_data else data
+
+    def __iter__(self):
+        return iter(self._sample_keys_by_guid)
+
+    def __len__(self):
+        return len(self._sample_keys_by_guid)
+
+
 def _load_rna_seq_file(file_path, user, column_map, mapping_file=None, get_unique_key=None, allow_missing_gene=False, **kwargs):
 
     sample_id_to_individual_id_mapping = {}
     if mapping_file:
         sample_id_to_individual_id_mapping = load_mapping_file_content(mapping_file)
 
-    samples_by_id = defaultdict(dict)
+    samples_by_id = RnaSampleData(get_unique_key)
     f = file_iter(file_path, user=user)
     header = _parse_tsv_row(next(f))
     required_column_map = _validate_rna_header(header, column_map)
 
     sample_id_to_tissue_type = {}
     samples_with_conflict_tissues = defaultdict(set)
-    errors = []
     missing_required_fields = defaultdict(list)
     gene_ids = set()
+    num_rows = 0
+    start = time.perf_counter()
     for line in tqdm(f, unit=' rows'):
+        num_rows += 1
         row = dict(zip(header, _parse_tsv_row(line)))
         for sample_id, row_dict in _parse_rna_row(
                 row, column_map, required_column_map, missing_required_fields, allow_missing_gene, **kwargs):
@@ -341,20 +461,17 @@ def _load_rna_seq_file(file_path, user, column_map, mapping_file=None, get_uniqu
             if gene_id:
                 gene_ids.add(gene_id)
 
-            if get_unique_key:
-                gene_or_unique_id = get_unique_key(row_dict)
-            else:
-                gene_or_unique_id = gene_id
-            existing_data = samples_by_id[(sample_id, project)].get(gene_or_unique_id)
-            if existing_data and existing_data != row_dict:
-                errors.append(f'Error in {sample_id} data for {gene_or_unique_id}: mismatched entries '
-                              f'{existing_data} and {row_dict}')
-
             if row.get(INDIV_ID_COL) and sample_id not in sample_id_to_individual_id_mapping:
                 sample_id_to_individual_id_mapping[sample_id] = row[INDIV_ID_COL]
 
-            samples_by_id[(sample_id, project)][gene_or_unique_id] = row_dict
+            samples_by_id.add((sample_id, project), row_dict)
+
+    samples_by_id.finalize()
+    duration = time.perf_counter() - start
+    logger.info(f'Parsed {num_rows} RNA-seq rows in {duration:.1f} seconds '
+                f'({num_rows / duration if duration else 0:.0f} rows/second)', user)
 
+    errors = samples_by_id.errors
     matched_gene_ids = set(GeneInfo.objects.filter(gene_id__in=gene_ids).values_list('gene_id', flat=True))
     unknown_gene_ids = gene_ids - matched_gene_ids
     if allow_missing_gene:
@@ -373,7 +490,7 @@ def _load_rna_seq_file(file_path, user, column_map, mapping_file=None, get_uniqu
     tissue_conflict_messages = []
     for (sample_id, project), tissue_types in samples_with_conflict_tissues.items():
         sample_id_to_tissue_type.pop((sample_id, project))
-        samples_by_id.pop((sample_id, project))
+        samples_by_id.discard((sample_id, project))
         tissue_conflict_messages.append(
             f'{sample_id} ({", ".join(sorted([REVERSE_TISSUE_TYPE[tissue_type] for tissue_type in tissue_types]))})')
     warnings = [f'Skipped data loading for the following {len(samples_with_conflict_tissues)} sample(s) due to mismatched'
@@ -382,7 +499,7 @@ def _load_rna_seq_file(file_path, user, column_map, mapping_file=None, get_uniqu
     return warnings, samples_by_id, sample_id_to_individual_id_mapping, sample_id_to_tissue_type
 
 
-def _load_rna_seq(model_cls, file_path, *args, user=None, ignore_extra_samples=False, **kwargs):
+def _load_rna_seq(model_cls, file_path, *args, user=None, ignore_extra_samples=False, format_sample_data=None, **kwargs):
     warnings, samples_by_id, sample_id_to_individual_id_mapping, sample_id_to_tissue_type = _load_rna_seq_file(
         file_path, user, *args, **kwargs)
     message = f'Parsed {len(samples_by_id)} RNA-seq samples'
@@ -406,18 +523,24 @@ def _load_rna_seq(model_cls, file_path, *args, user=None, ignore_extra_samples=F
     existing_sample_guids = [s['guid'] for s in existing_samples.values()]
 
     # Delete old data
-    to_delete = model_cls.objects.filter(sample__guid__in=existing_sample_guids).exclude(sample__data_source=data_source)
-    prev_loaded_individual_ids = set(to_delete.values_list('sample__individual_id', flat=True))
-    if to_delete:
-        model_cls.bulk_delete(user, to_delete)
+    # TPMs may also have been converted to the compact array representation
+    model_classes = [model_cls, RnaSeqTpmArray] if model_cls == RnaSeqTpm else [model_cls]
+    prev_loaded_individual_ids = set()
+    for cls in model_classes:
+        to_delete = cls.objects.filter(sample__guid__in=existing_sample_guids).exclude(sample__data_source=data_source)
+        prev_loaded_individual_ids.update(to_delete.values_list('sample__individual_id', flat=True).distinct())
+        cls.bulk_delete(user, to_delete)
 
     Sample.bulk_update(user, {'data_source': data_source}, guid__in=existing_sample_guids)
 
-    loaded_sample_guids = set(model_cls.objects.filter(sample__guid__in=existing_sample_guids).values_list('sample__guid', flat=True).distinct())
-    samples_to_load = {
-        sample['guid']: samples_by_id[sample_key] for sample_key, sample in samples.items()
+    loaded_sample_guids = set()
+    for cls in model_classes:
+        loaded_sample_guids.update(cls.objects.filter(
+            sample__guid__in=existing_sample_guids).values_list('sample__guid', flat=True).distinct())
+    samples_to_load = RnaSampleDataByGuid(samples_by_id, {
+        sample['guid']: sample_key for sample_key, sample in samples.items()
         if sample['guid'] not in loaded_sample_guids
-    }
+    }, format_sample_data=format_sample_data)
 
     sample_projects = Project.objects.filter(family__individual__sample__guid__in=samples_to_load.keys()).values(
         'guid', 'name', new_sample_ids=ArrayAgg(
@@ -1,10 +1,11 @@
 from collections import OrderedDict
+from itertools import chain
 import json
 import openpyxl as xl
-from tempfile import NamedTemporaryFile, TemporaryDirectory
+from tempfile import SpooledTemporaryFile, TemporaryDirectory
 import zipfile
 
-from django.http.response import HttpResponse
+from django.http.response import FileResponse, StreamingHttpResponse
 
 from seqr.utils.file_utils import mv_file_to_gs
 from seqr.views.utils.json_utils import _to_title_case
@@ -14,40 +15,47 @@ DELIMITERS = {
     'tsv': '\t',
 }
 
+EXPORT_FILE_EXTENSIONS = {
+    'tsv': 'tsv',
+    'json': 'json',
+    'xls': 'xlsx',
+}
+
+# Exports smaller than this are built in memory, larger ones roll over to a temporary file on disk
+SPOOLED_FILE_MAX_MEMORY_SIZE = 10 * 1024 * 1024
+
 
 def export_table(filename_prefix, header, rows, file_format='tsv', titlecase_header=True):
     """Generates an HTTP response for a table with the given header and rows, exported into the given file_format.
 
+    Rows are consumed lazily, so a generator can be passed to stream the export without holding it in memory. The first
+    row is validated eagerly so that a malformed table results in an error response rather than a truncated file.
+
     Args:
         filename_prefix (string): Filename without the extension.
         header (list): List of column names
-        rows (list): List of rows, where each row is a list of column values
+        rows (iterable): Iterable of rows, where each row is a list of column values
         file_format (string): "tsv", "xls", or "json"
     Returns:
-        Django HttpResponse object with the table data as an attachment.
+        Django StreamingHttpResponse object with the table data as an attachment.
     """
+    if file_format not in EXPORT_FILE_EXTENSIONS:
+        raise ValueError("Invalid file_format: %s" % file_format)
 
-    for i, row in enumerate(rows):
-        if len(header) != len(row):
-            raise ValueError('len(header) != len(row): %s != %s\n%s\n%s' % (
-                len(header), len(row), ','.join(header), ','.join(row)))
-        rows[i] = ['' if value is None else value for value in row]
+    rows = _format_table_rows(header, rows)
+    first_row = next(rows, None)
+    if first_row is not None:
+        rows = chain([first_row], rows)
 
     if file_format == "tsv":
-        response = HttpResponse(content_type='text/tsv')
-        response['Content-Disposition'] = 'attachment; filename="{}.tsv"'.format(filename_prefix).encode('ascii', 'ignore')
-        response.writelines(['\t'.join(header)+'\n'])
-        response.writelines(('\t'.join(map(str, row))+'\n' for row in rows))
-        return response
+        response = StreamingHttpResponse(
+            ('\t'.join(map(str, row))+'\n' for row in chain([header], rows)), content_type='text/tsv')
     elif file_format == "json":
-        response = HttpResponse(content_type='application/json')
-        response['Content-Disposition'] = 'attachment; filename="{}.json"'.format(filename_prefix).encode('ascii', 'ignore')
-        for row in rows:
-            json_keys = [s.replace(" ", "_").lower() for s in header]
-            json_values = list(map(str, row))
-            response.write(json.dumps(OrderedDict(zip(json_keys, json_values)))+'\n')
-        return response
-    elif file_format == "xls":
+        json_keys = [s.replace(" ", "_").lower() for s in header]
+        response = StreamingHttpResponse(
+            (json.dumps(OrderedDict(zip(json_keys, map(str, row))))+'\n' for row in rows),
+            content_type='application/json')
+    else:
         wb = xl.Workbook(write_only=True)
         ws = wb.create_sheet()
         if titlecase_header:
@@ -55,50 +63,67 @@ def export_table(filename_prefix, header, rows, file_format='tsv', titlecase_hea
         ws.append(header)
         for row in rows:
             ws.append(row)
-        with NamedTemporaryFile() as temporary_file:
-            wb.save(temporary_file.name)
-            temporary_file.seek(0)
-            response = HttpResponse(temporary_file.read(), content_type="application/ms-excel")
-            response['Content-Disposition'] = 'attachment; filename="{}.xlsx"'.format(filename_prefix).encode('ascii', 'ignore')
-            return response
-    else:
-        raise ValueError("Invalid file_format: %s" % file_format)
+        response = FileResponse(_save_to_spooled_file(wb.save), content_type="application/ms-excel")
+
+    response['Content-Disposition'] = 'attachment; filename="{}.{}"'.format(
+        filename_prefix, EXPORT_FILE_EXTENSIONS[file_format]).encode('ascii', 'ignore')
+    return response
+
+
+def _format_table_rows(header, rows):
+    for row in rows:
+        if len(header) != len(row):
+            raise ValueError('len(header) != len(row): %s != %s\n%s\n%s' % (
+                len(header), len(row), ','.join(header), ','.join(row)))
+        yield ['' if value is None else value for value in row]
+
+
+def _save_to_spooled_file(save_func):
+    temp_file = SpooledTemporaryFile(max_size=SPOOLED_FILE_MAX_MEMORY_SIZE)
+    save_func(temp_file)
+    temp_file.seek(0)
+    return temp_file
 
 
 def _format_files_content(files,  file_format='csv', add_header_prefix=False, blank_value=''):
     if file_format not in DELIMITERS:
         raise ValueError('Invalid file_format: {}'.format(file_format))
-    parsed_files = []
     for filename, header, rows in files:
-        header_display = header
-        if add_header_prefix:
-            header_display = ['{}-{}'.format(str(header_tuple[0]).zfill(2), header_tuple[1]) for header_tuple in
-                              enumerate(header)]
-            header_display[0] = header[0]
-        content_rows = [[row.get(key) or blank_value for key in header] for row in rows]
-        content = '\n'.join([
-            DELIMITERS[file_format].join(row) for row in [header_display] + content_rows
-            if any(val != blank_value for val in row)
-        ])
-        content = str(content.encode('utf-8'), 'ascii', errors='ignore')  # Strip unicode chars in the content
-        parsed_files.append(('{}.{}'.format(filename, file_format), content))
-    return parsed_files
+        yield '{}.{}'.format(filename, file_format), _format_file_lines(
+            header, rows, DELIMITERS[file_format], add_header_prefix, blank_value)
+
+
+def _format_file_lines(header, rows, delimiter, add_header_prefix, blank_value):
+    header_display = header
+    if add_header_prefix:
+        header_display = ['{}-{}'.format(str(header_tuple[0]).zfill(2), header_tuple[1]) for header_tuple in
+                          enumerate(header)]
+        header_display[0] = header[0]
+    content_rows = ([row.get(key) or blank_value for key in header] for row in rows)
+    line_prefix = ''
+    for row in chain([header_display], content_rows):
+        if any(val != blank_value for val in row):
+            line = line_prefix + delimiter.join(row)
+            yield str(line.encode('utf-8'), 'ascii', errors='ignore')  # Strip unicode chars in the content
+            line_prefix = '\n'
 
 
 def export_multiple_files(files, zip_filename, **kwargs):
-    with NamedTemporaryFile() as temp_file:
+    def _write_zip(temp_file):
         with zipfile.ZipFile(temp_file, 'w') as zip_file:
-            for filename, content in _format_files_content(files, **kwargs):
-                zip_file.writestr(filename, content)
-        temp_file.seek(0)
-        response = HttpResponse(temp_file, content_type='application/zip')
-        response['Content-Disposition'] = 'attachment; filename="{}.zip"'.format(zip_filename).encode('ascii', 'ignore')
-        return response
+            for filename, lines in _format_files_content(files, **kwargs):
+                with zip_file.open(filename, 'w') as f:
+                    for line in lines:
+                        f.write(line.encode('utf-8'))
+
+    response = FileResponse(_save_to_spooled_file(_write_zip), content_type='application/zip')
+    response['Content-Disposition'] = 'attachment; filename="{}.zip"'.format(zip_filename).encode('ascii', 'ignore')
+    return response
 
 
 def write_multiple_files_to_gs(files, gs_path, user, **kwargs):
     with TemporaryDirectory() as temp_dir_name:
-        for filename, content in _format_files_content(files, **kwargs):
+        for filename, lines in _format_files_content(files, **kwargs):
             with open(f'{temp_dir_name}/{filename}', 'w') as f:
-                f.write(content)
+                f.writelines(lines)
         mv_file_to_gs(f'{temp_dir_name}/*', gs_path, user)
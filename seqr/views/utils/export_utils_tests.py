@@ -3,7 +3,8 @@ from django.test import TestCase
 
 from openpyxl import load_workbook
 from io import BytesIO
-import mock
+import json
+import zipfile
 
 from seqr.views.utils.export_utils import export_table, export_multiple_files
 
@@ -20,13 +21,29 @@ class ExportTableUtilsTest(TestCase):
 
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.get('content-disposition'), 'attachment; filename="test_file.tsv"')
-        self.assertEqual(response.content, ('\n'.join(['\t'.join(row) for row in [header]+rows]) + '\n').encode('utf-8'))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response.getvalue(), ('\n'.join(['\t'.join(row) for row in [header]+rows]) + '\n').encode('utf-8'))
+
+        # test rows are streamed from a generator
+        response = export_table('test_file', header, ([f'row{i}', None] for i in range(3)))
+        self.assertEqual(response.getvalue(), b'column1\tcolumn2\nrow0\t\nrow1\t\nrow2\t\n')
+
+        response = export_table('test_file', header, [])
+        self.assertEqual(response.getvalue(), b'column1\tcolumn2\n')
+
+        # test json format
+        response = export_table('test_file', ['column 1', 'Column2'], iter(rows), file_format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get('content-disposition'), 'attachment; filename="test_file.json"')
+        self.assertListEqual([json.loads(line) for line in response.getvalue().decode('utf-8').strip().split('\n')], [
+            {'column_1': 'row1_v1\xe2', 'column2': 'row1_v2'}, {'column_1': 'row2_v1', 'column2': 'row2_v2'},
+        ])
 
         # test Excel format
-        response = export_table('test_file', header, rows, file_format='xls')
+        response = export_table('test_file', header, iter(rows), file_format='xls')
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.get('content-disposition'), 'attachment; filename="test_file.xlsx"')
-        wb = load_workbook(BytesIO(response.content))
+        wb = load_workbook(BytesIO(response.getvalue()))
         worksheet = wb.active
 
         self.assertListEqual([cell.value for cell in worksheet['A']], ['Column1', 'row1_v1\xe2', 'row2_v1'])
@@ -42,13 +59,17 @@ class ExportTableUtilsTest(TestCase):
             export_table('test_file', ['column1'], rows)
         self.assertEqual(str(cm.exception), 'len(header) != len(row): 1 != 2\ncolumn1\nrow1_v1\xe2,row1_v2')
 
-    @mock.patch('seqr.views.utils.export_utils.zipfile.ZipFile')
-    def test_export_multiple_files(self, mock_zip):
-        mock_zip_content = {}
-        def mock_write_zip(file, content):
-            mock_zip_content[file] = content
-        mock_zip.return_value.__enter__.return_value.writestr.side_effect = mock_write_zip
+        response = export_table('test_file', header, rows + [['row3_v1']])
+        with self.assertRaises(ValueError) as cm:
+            response.getvalue()
+        self.assertEqual(str(cm.exception), 'len(header) != len(row): 2 != 1\ncolumn1,column2\nrow3_v1')
+
+    @staticmethod
+    def _get_zip_content(response):
+        with zipfile.ZipFile(BytesIO(response.getvalue())) as zip_file:
+            return {filename: zip_file.read(filename).decode('utf-8') for filename in zip_file.namelist()}
 
+    def test_export_multiple_files(self):
         header1 = ['col1', 'col2']
         header2 = ['col1']
         header3 = ['col2', 'col3', 'col1']
@@ -58,11 +79,10 @@ class ExportTableUtilsTest(TestCase):
         response = export_multiple_files([['file1', header1, rows], ['file2', header2, rows]], 'zipfile')
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.get('content-disposition'), 'attachment; filename="zipfile.zip"')
-        self.assertDictEqual(mock_zip_content, {
+        self.assertDictEqual(self._get_zip_content(response), {
             'file1.csv': 'col1,col2\nrow1_v1,row1_v2\nrow2_v1,',
             'file2.csv': 'col1\nrow1_v1\nrow2_v1',
         })
-        mock_zip_content = {}
 
         # test tsv format with a filename in unicode
         response = export_multiple_files(
@@ -70,21 +90,19 @@ class ExportTableUtilsTest(TestCase):
         self.assertEqual(response.status_code, 200)
         filename = response.get('content-disposition')
         self.assertEqual(filename, 'attachment; filename="zipfilenme.zip"')
-        self.assertDictEqual(mock_zip_content, {
+        self.assertDictEqual(self._get_zip_content(response), {
             'file1.tsv': 'col1\tcol2\nrow1_v1\trow1_v2\nrow2_v1\t',
             'file2.tsv': 'col1\nrow1_v1\nrow2_v1',
         })
-        mock_zip_content = {}
 
         response = export_multiple_files(
             [['file1', header1, rows], ['file2', header3, rows]], 'zipfile', add_header_prefix=True, blank_value='X')
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.get('content-disposition'), 'attachment; filename="zipfile.zip"')
-        self.assertDictEqual(mock_zip_content, {
+        self.assertDictEqual(self._get_zip_content(response), {
             'file1.csv': 'col1,01-col2\nrow1_v1,row1_v2\nrow2_v1,X',
             'file2.csv': 'col2,01-col3,02-col1\nrow1_v2,X,row1_v1\nX,X,row2_v1',
         })
-        mock_zip_content = {}
 
         # test unknown format
         with self.assertRaises(ValueError) as cm:
@@ -14,6 +14,9 @@ from seqr.views.utils.permissions_utils import login_and_policies_required
 
 logger = logging.getLogger(__name__)
 
+JSON_WRITE_BATCH_SIZE = 1000
+UPLOAD_COMPRESS_LEVEL = 1
+
 
 @login_and_policies_required
 def save_temp_file(request):
@@ -32,36 +35,58 @@ def save_temp_file(request):
     return create_json_response(response)
 
 
-def parse_file(filename, stream):
+def _iter_tsv_rows(stream):
+    for line in stream:
+        yield [s.strip().strip('"') for s in line.rstrip('\n').split('\t')]
+
+
+def _iter_excel_rows(stream):
+    wb = xl.load_workbook(stream, read_only=True)
+    ws = wb[wb.sheetnames[0]]
+    # trim trailing empty rows, which are only emitted once a subsequent non-empty row is found
+    empty_rows = []
+    for row in ws.iter_rows(values_only=True):
+        row = [_parse_excel_string_cell(value) for value in row]
+        if any(row):
+            yield from empty_rows
+            empty_rows = []
+            yield row
+        else:
+            empty_rows.append(row)
+
+
+def iter_file_rows(filename, stream):
+    """Lazily parse the rows of a tabular file, without loading the full parsed file into memory"""
     if filename.endswith('.tsv') or filename.endswith('.fam') or filename.endswith('.ped'):
-        return [[s.strip().strip('"') for s in line.rstrip('\n').split('\t')] for line in stream]
+        return _iter_tsv_rows(stream)
 
     elif filename.endswith('.csv'):
-        return [row for row in csv.reader(stream)]
+        return csv.reader(stream)
 
     elif filename.endswith('.xls') or filename.endswith('.xlsx'):
-        wb = xl.load_workbook(stream, read_only=True)
-        ws = wb[wb.sheetnames[0]]
-        rows = [[_parse_excel_string_cell(cell) for cell in row] for row in ws.iter_rows()]
-        # trim trailing empty rows
-        last_row_index = max(i for i, row in enumerate(rows) if any(val for val in row))
-        rows = rows[:last_row_index+1]
-        # all rows should have same column count
-        last_col_index = max(max(i for i, val in enumerate(row) if val) for row in rows)
-        padding = [''] * last_col_index
-        rows = [(row + padding)[:last_col_index+1] for row in rows]
+        return _iter_excel_rows(stream)
 
-        return rows
+    raise ValueError("Unexpected file type: {}".format(filename))
 
-    elif filename.endswith('.json'):
+
+def parse_file(filename, stream):
+    if filename.endswith('.json'):
         return json.loads(stream.read())
 
-    raise ValueError("Unexpected file type: {}".format(filename))
+    rows = list(iter_file_rows(filename, stream))
+
+    if filename.endswith('.xls') or filename.endswith('.xlsx'):
+        # all rows should have same column count
+        num_cols = max(max((i for i, val in enumerate(row) if val), default=0) for row in rows) + 1
+        for i, row in enumerate(rows):
+            if len(row) != num_cols:
+                rows[i] = (row + [''] * num_cols)[:num_cols]
 
+    return rows
 
-def _parse_excel_string_cell(cell):
-    cell_value = cell.value
-    if cell_value is not None and cell.data_type == 'n' and int(cell_value) == cell_value:
+
+def _parse_excel_string_cell(cell_value):
+    if isinstance(cell_value, (int, float)) and not isinstance(cell_value, bool) and int(cell_value) == cell_value:
         cell_value = '{:.0f}'.format(cell_value)
     return cell_value or ''
 
@@ -80,6 +105,29 @@ def _compute_serialized_file_path(uploaded_file_id):
     return os.path.join(upload_directory, "temp_upload_{}.json.gz".format(uploaded_file_id))
 
 
+def _get_uploaded_file_id(request, stream):
+    """Hash the raw uploaded content, scoped to the upload endpoint as records are processed differently by each"""
+    md5 = hashlib.md5(request.path.encode('utf-8'))  # nosec
+    for chunk in stream.chunks():
+        md5.update(chunk)
+    stream.seek(0)
+    return md5.hexdigest()
+
+
+def _write_json(f, json_records):
+    """Write json to the file in batches, which is much faster than json.dump and avoids serializing all records at once"""
+    if not isinstance(json_records, list):
+        f.write(json.dumps(json_records))
+        return
+
+    f.write('[')
+    for i in range(0, len(json_records), JSON_WRITE_BATCH_SIZE):
+        if i:
+            f.write(', ')
+        f.write(json.dumps(json_records[i:i + JSON_WRITE_BATCH_SIZE])[1:-1])
+    f.write(']')
+
+
 def save_uploaded_file(request, process_records=None):
 
     if len(request.FILES) != 1:
@@ -88,6 +136,7 @@ def save_uploaded_file(request, process_records=None):
     # parse file
     stream = next(iter(request.FILES.values()))
     filename = stream._name
+    uploaded_file_id = _get_uploaded_file_id(request, stream)
 
     if not filename.endswith('.xls') and not filename.endswith('.xlsx'):
         stream = TextIOWrapper(stream.file, encoding = 'utf-8')
@@ -97,10 +146,9 @@ def save_uploaded_file(request, process_records=None):
         json_records = process_records(json_records, filename=filename)
 
     # save json to temporary file
-    uploaded_file_id = hashlib.md5(str(json_records).encode('utf-8')).hexdigest() # nosec
     serialized_file_path = _compute_serialized_file_path(uploaded_file_id)
-    with gzip.open(serialized_file_path, 'wt') as f:
-        json.dump(json_records, f)
+    with gzip.open(serialized_file_path, 'wt', compresslevel=UPLOAD_COMPRESS_LEVEL) as f:
+        _write_json(f, json_records)
 
     return uploaded_file_id, filename, json_records
 
@@ -8,7 +8,7 @@ from tempfile import NamedTemporaryFile
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls.base import reverse
 
-from seqr.views.utils.file_utils import save_temp_file, parse_file, load_uploaded_file
+from seqr.views.utils.file_utils import save_temp_file, parse_file, load_uploaded_file, iter_file_rows
 from seqr.views.utils.test_utils import AuthenticationTestCase
 
 TSV_DATA = b'Family ID	Individual ID	Notes\n\
@@ -40,19 +40,15 @@ PARSED_DATA = [
 ]
 
 
-def _mock_cell(value):
-    mock_cell = mock.MagicMock()
-    mock_cell.value = value
+def _mock_cell_value(value):
     try:
-        mock_cell.value = int(value)
-        mock_cell.data_type = 'n'
+        return int(value)
     except ValueError:
-        mock_cell.data_type = 's'
-    return mock_cell
+        return value
 
 
 MOCK_EXCEL_SHEET = mock.MagicMock()
-MOCK_EXCEL_SHEET.iter_rows.return_value = [[_mock_cell(cell) for cell in row] for row in PARSED_DATA]
+MOCK_EXCEL_SHEET.iter_rows.return_value = [[_mock_cell_value(cell) for cell in row] for row in PARSED_DATA]
 
 
 class FileUtilsTest(AuthenticationTestCase):
@@ -83,6 +79,7 @@ class FileUtilsTest(AuthenticationTestCase):
 
         # Test loading uploaded file
         uploaded_file_id = response_json['uploadedFileId']
+        self.assertEqual(uploaded_file_id, '57788f0abf80a0270af915f47ee8c1f7')
         file_content = load_uploaded_file(uploaded_file_id)
         self.assertListEqual(file_content, PARSED_DATA)
         # File should be removed after loading it once
@@ -96,6 +93,7 @@ class FileUtilsTest(AuthenticationTestCase):
         ws['A2'], ws['B2'], ws['C2'] = [1, 'NA19675', 'An affected individual, additional metadata']
         ws['A3'], ws['B3'] = [0, 'NA19678']
         ws['A4'] = ''  # for testing trimming trailing empty rows
+        ws['A5'] = None
 
         with NamedTemporaryFile() as tmp:
             wb.save(tmp)
@@ -125,3 +123,19 @@ class FileUtilsTest(AuthenticationTestCase):
         for call_args in mock_load_xl.call_args_list:
             self.assertEqual(call_args.args[0].read().encode('utf-8'), EXCEL_DATA)
             self.assertDictEqual(call_args.kwargs, {'read_only': True})
+        MOCK_EXCEL_SHEET.iter_rows.assert_called_with(values_only=True)
+
+        # Test rows are lazily parsed, and empty excel rows are only skipped if they are trailing
+        MOCK_EXCEL_SHEET.iter_rows.return_value = [
+            ['Family ID', None, 'Notes'], [None, None], ['1', 'NA19675', 2.5], [True, ''], [None], [''],
+        ]
+        rows = iter_file_rows('test.xlsx', StringIO(''))
+        self.assertListEqual(next(rows), ['Family ID', '', 'Notes'])
+        self.assertListEqual(list(rows), [['', ''], ['1', 'NA19675', 2.5], [True, '']])
+        self.assertListEqual(parse_file('test.xlsx', StringIO('')), [
+            ['Family ID', '', 'Notes'], ['', '', ''], ['1', 'NA19675', 2.5], [True, '', ''],
+        ])
+
+        with self.assertRaises(ValueError) as cm:
+            iter_file_rows('test.foo', StringIO(''))
+        self.assertEqual(str(cm.exception), 'Unexpected file type: test.foo')
@@ -4,6 +4,7 @@ Utility functions for converting Django ORM object to JSON
 
 from collections import defaultdict
 from django.contrib.postgres.aggregates import ArrayAgg
+from django.db.models.fields.json import KeyTransform
 from django.db.models import prefetch_related_objects, Count, Value, F, Q, CharField, Case, When
 from django.db.models.functions import Concat, Coalesce, NullIf, Lower, Trim, JSONObject
 from django.contrib.auth.models import User
@@ -397,7 +398,18 @@ def get_json_for_analysis_group(analysis_group, **kwargs):
     return _get_json_for_model(analysis_group, get_json_for_models=get_json_for_analysis_groups, **kwargs)
 
 
-def get_json_for_saved_variants(saved_variants, add_details=False, additional_model_fields=None, additional_values=None):
+def get_json_for_saved_variants(saved_variants, add_details=False, additional_model_fields=None, additional_values=None,
+                                saved_variant_json_keys=None):
+    """Returns a JSON representation of the given SavedVariants.
+
+    Args:
+        saved_variants (queryset): SavedVariant queryset
+        add_details (bool): Whether to include the fields from the saved_variant_json
+        saved_variant_json_keys (list): If add_details is set, only include these top-level keys from the
+            saved_variant_json. Only the requested keys are sent from the database, rather than the full json
+    Returns:
+        array: json objects
+    """
     sv_additional_values = {
         'familyGuids': ArrayAgg('family__guid', distinct=True),
     }
@@ -406,7 +418,11 @@ def get_json_for_saved_variants(saved_variants, add_details=False, additional_mo
 
     additional_fields = []
     additional_fields += additional_model_fields or []
-    if add_details:
+    if add_details and saved_variant_json_keys:
+        sv_additional_values['savedVariantJson'] = JSONObject(**{
+            key: KeyTransform(key, 'saved_variant_json') for key in saved_variant_json_keys
+        })
+    elif add_details:
         additional_fields.append('saved_variant_json')
 
     results = get_json_for_queryset(
@@ -416,7 +432,10 @@ def get_json_for_saved_variants(saved_variants, add_details=False, additional_mo
 
     if add_details:
         for result in results:
-            result.update({k: v for k, v in result.pop('savedVariantJson').items() if k not in result})
+            result.update({
+                k: v for k, v in result.pop('savedVariantJson').items()
+                if k not in result and not (saved_variant_json_keys and v is None)
+            })
 
     return results
 
@@ -434,13 +453,13 @@ def _format_functional_tags(tags):
 
 
 def get_json_for_saved_variants_child_entities(tag_cls, saved_variant_id_map, tag_filter=None):
-    variant_tag_id_map = defaultdict(list)
-    for savedvariant_id, tag_id in tag_cls.saved_variants.through.objects.filter(
-            savedvariant_id__in=saved_variant_id_map.keys()).values_list(
-        'savedvariant_id', f'{tag_cls.__name__.lower()}_id',
-    ):
-        variant_tag_id_map[tag_id].append(savedvariant_id)
-    tag_models = tag_cls.objects.filter(id__in=variant_tag_id_map.keys())
+    """Returns the JSON for the tags, notes or functional data of the given saved variants, and a mapping of each
+    saved variant guid to its child entity guids. The saved variant ids for each entity are aggregated in the same
+    query that loads the entity"""
+    if not saved_variant_id_map:
+        return [], {}
+
+    tag_models = tag_cls.objects.filter(saved_variants__id__in=saved_variant_id_map.keys())
     if tag_filter:
         tag_models = tag_models.filter(**tag_filter)
 
@@ -452,24 +471,23 @@ def get_json_for_saved_variants_child_entities(tag_cls, saved_variant_id_map, ta
     elif tag_cls == VariantNote:
         guid_key = 'noteGuid'
 
-    tags = get_json_for_queryset(
-        tag_models, guid_key=guid_key, nested_fields=nested_fields, additional_model_fields=['id'])
+    tags = list(get_json_for_queryset(
+        tag_models.order_by('id'), guid_key=guid_key, nested_fields=nested_fields,
+        additional_values={'variantIds': ArrayAgg('saved_variants__id', ordering='saved_variants__id')},
+    ))
     if tag_cls == VariantFunctionalData:
         _format_functional_tags(tags)
 
     variant_tag_map = defaultdict(list)
     for tag in tags:
-        tag['variantGuids'] = []
-        variant_ids = variant_tag_id_map[tag.pop('id')]
-        for variant_id in variant_ids:
-            variant_guid = saved_variant_id_map[variant_id]
+        tag['variantGuids'] = [saved_variant_id_map[variant_id] for variant_id in tag.pop('variantIds')]
+        for variant_guid in tag['variantGuids']:
             variant_tag_map[variant_guid].append(tag[guid_key])
-            tag['variantGuids'].append(variant_guid)
 
     return tags, variant_tag_map
 
 
-def get_json_for_saved_variants_with_tags(saved_variants, **kwargs):
+def get_json_for_saved_variants_with_tags(saved_variants, include_functional_data=True, **kwargs):
     variants_by_guid = {
         variant['variantGuid']: dict(tagGuids=[], functionalDataGuids=[], noteGuids=[], **variant)
         for variant in get_json_for_saved_variants(saved_variants, additional_model_fields=['id'], **kwargs)
@@ -483,11 +501,6 @@ def get_json_for_saved_variants_with_tags(saved_variants, **kwargs):
     for variant_guid, tag_guids in variant_tag_map.items():
         variants_by_guid[variant_guid]['tagGuids'] = tag_guids
 
-    functional_data, variant_tag_map = get_json_for_saved_variants_child_entities(
-        VariantFunctionalData, saved_variant_id_map)
-    for variant_guid, tag_guids in variant_tag_map.items():
-        variants_by_guid[variant_guid]['functionalDataGuids'] = tag_guids
-
     notes, variant_tag_map = get_json_for_saved_variants_child_entities(VariantNote, saved_variant_id_map)
     for variant_guid, tag_guids in variant_tag_map.items():
         variants_by_guid[variant_guid]['noteGuids'] = tag_guids
@@ -495,15 +508,31 @@ def get_json_for_saved_variants_with_tags(saved_variants, **kwargs):
     response = {
         'variantTagsByGuid': {tag['tagGuid']: tag for tag in tags},
         'variantNotesByGuid': {note['noteGuid']: note for note in notes},
-        'variantFunctionalDataByGuid': {tag['tagGuid']: tag for tag in functional_data},
         'savedVariantsByGuid': variants_by_guid,
     }
 
+    if include_functional_data:
+        functional_data, variant_tag_map = get_json_for_saved_variants_child_entities(
+            VariantFunctionalData, saved_variant_id_map)
+        for variant_guid, tag_guids in variant_tag_map.items():
+            variants_by_guid[variant_guid]['functionalDataGuids'] = tag_guids
+        response['variantFunctionalDataByGuid'] = {tag['tagGuid']: tag for tag in functional_data}
+
     return response
 
 
-def get_json_for_discovery_tags(variants, user):
-    from seqr.views.utils.variant_utils import get_variant_key
+def get_json_for_discovery_tags(variants, user, loaded_tags_by_guid=None):
+    """Returns the discovery tags for all saved variants the user can view which match the given variants.
+
+    Args:
+        variants (list): variant json objects
+        user (object): Django User model
+        loaded_tags_by_guid (dict): An optional mapping of the already loaded tags for the given variants, which are
+            re-used instead of being queried again
+    Returns:
+        tuple: discovery tags by variant key, response json with any additional families
+    """
+    from seqr.views.utils.variant_utils import get_variant_key, DISCOVERY_CATEGORY
     response = {}
     discovery_tags = defaultdict(list)
 
@@ -512,10 +541,23 @@ def get_json_for_discovery_tags(variants, user):
         family__project__guid__in=get_project_guids_user_can_view(user),
     ).only('id', 'guid', 'ref', 'alt', 'xpos', 'family_id').prefetch_related('family', 'family__project')
     saved_variants_by_guid = {sv.guid: sv for sv in saved_variants}
-    saved_variant_id_map = {sv.id: guid for guid, sv in saved_variants_by_guid.items()}
 
-    discovery_tag_json, _ = get_json_for_saved_variants_child_entities(
-        VariantTag, saved_variant_id_map, tag_filter={'variant_tag_type__category': 'CMG Discovery Tags'})
+    loaded_variant_guids = set()
+    discovery_tag_json = []
+    if loaded_tags_by_guid is not None:
+        loaded_variant_guids = {variant['variantGuid'] for variant in variants if variant.get('variantGuid')}
+        discovery_tag_json = [
+            dict(tag, variantGuids=[guid for guid in tag['variantGuids'] if guid in saved_variants_by_guid])
+            for tag in loaded_tags_by_guid.values() if tag['category'] == DISCOVERY_CATEGORY
+        ]
+
+    saved_variant_id_map = {
+        sv.id: guid for guid, sv in saved_variants_by_guid.items() if guid not in loaded_variant_guids
+    }
+    if saved_variant_id_map:
+        queried_tag_json, _ = get_json_for_saved_variants_child_entities(
+            VariantTag, saved_variant_id_map, tag_filter={'variant_tag_type__category': DISCOVERY_CATEGORY})
+        discovery_tag_json += queried_tag_json
     if discovery_tag_json:
         existing_families = set()
         for variant in variants:
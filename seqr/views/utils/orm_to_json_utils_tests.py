@@ -1,10 +1,13 @@
 from django.contrib.auth.models import User
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
 import mock
 from copy import deepcopy
 from seqr.models import Project, Sample, IgvSample, SavedVariant, VariantNote, LocusList, VariantSearch
 from seqr.views.utils.orm_to_json_utils import get_json_for_user, _get_json_for_project, \
     get_json_for_sample, get_json_for_saved_variants, get_json_for_variant_note, get_json_for_locus_list, \
-    get_json_for_saved_searches, get_json_for_saved_variants_with_tags, get_json_for_current_user
+    get_json_for_saved_searches, get_json_for_saved_variants_with_tags, get_json_for_current_user, \
+    get_json_for_discovery_tags
 from seqr.views.utils.test_utils import AuthenticationTestCase, AnvilAuthenticationTestCase, \
     PROJECT_FIELDS,  INTERNAL_FAMILY_FIELDS, \
     INDIVIDUAL_FIELDS, INTERNAL_INDIVIDUAL_FIELDS, SAMPLE_FIELDS, SAVED_VARIANT_FIELDS,  \
@@ -125,6 +128,13 @@ class JSONUtilsTest(object):
         self.assertEqual(json['variantId'], '21-3343353-GAGA-G')
         self.assertEqual(json['mainTranscriptId'], 'ENST00000258436')
 
+        json = get_json_for_saved_variants(
+            variants, add_details=True, saved_variant_json_keys=['mainTranscriptId', 'transcripts', 'variantId', 'svType'])[0]
+        self.assertSetEqual(set(json.keys()), {*SAVED_VARIANT_FIELDS, 'mainTranscriptId', 'transcripts'})
+        self.assertEqual(json['variantId'], '21-3343353-GAGA-G')
+        self.assertEqual(json['mainTranscriptId'], 'ENST00000258436')
+        self.assertDictEqual(json['transcripts'], variants.first().saved_variant_json['transcripts'])
+
     def test_json_for_saved_variants_with_tags(self):
         variant_guid_1 = 'SV0000001_2103343353_r0390_100'
         variant_guid_2 = 'SV0000002_1248367227_r0390_100'
@@ -136,7 +146,9 @@ class JSONUtilsTest(object):
             'VFD0000026_1248367227_r0390_10'}
 
         variants = SavedVariant.objects.filter(guid__in=[variant_guid_1, variant_guid_2])
-        json = get_json_for_saved_variants_with_tags(variants)
+        # Saved variants, tags, notes and functional data are each loaded in a single query
+        with self.assertNumQueries(4, using='default'):
+            json = get_json_for_saved_variants_with_tags(variants)
 
         keys = {'variantTagsByGuid', 'variantNotesByGuid', 'variantFunctionalDataByGuid', 'savedVariantsByGuid'}
         self.assertSetEqual(set(json.keys()), keys)
@@ -170,6 +182,54 @@ class JSONUtilsTest(object):
         for tag_guid in v1_functional_guids:
             self.assertListEqual(json['variantFunctionalDataByGuid'][tag_guid]['variantGuids'], [variant_guid_1])
 
+        with self.assertNumQueries(3, using='default'):
+            no_functional_json = get_json_for_saved_variants_with_tags(variants, include_functional_data=False)
+        self.assertSetEqual(set(no_functional_json.keys()), keys - {'variantFunctionalDataByGuid'})
+        self.assertListEqual(no_functional_json['savedVariantsByGuid'][variant_guid_1]['functionalDataGuids'], [])
+
+        with self.assertNumQueries(0, using='default'):
+            self.assertDictEqual(get_json_for_saved_variants_with_tags(SavedVariant.objects.none()), {
+                'variantTagsByGuid': {}, 'variantNotesByGuid': {}, 'variantFunctionalDataByGuid': {},
+                'savedVariantsByGuid': {},
+            })
+
+        # Tags shared by multiple variants are loaded once with all their variants
+        compound_het_json = get_json_for_saved_variants_with_tags(SavedVariant.objects.filter(id__in=[6, 7]))
+        compound_het_guids = sorted(compound_het_json['savedVariantsByGuid'].keys())
+        self.assertListEqual(
+            compound_het_json['variantTagsByGuid']['VT1726961_2103343353_r0003_tes']['variantGuids'], compound_het_guids)
+        for variant in compound_het_json['savedVariantsByGuid'].values():
+            self.assertIn('VT1726961_2103343353_r0003_tes', variant['tagGuids'])
+
+    def test_json_for_discovery_tags(self):
+        user = User.objects.get(username='test_user')
+        saved_variants = get_json_for_saved_variants_with_tags(
+            SavedVariant.objects.filter(family__guid='F000001_1'), add_details=True)
+
+        variants = saved_variants['savedVariantsByGuid'].values()
+        with CaptureQueriesContext(connections['default']) as queries:
+            discovery_tags, response = get_json_for_discovery_tags(variants, user)
+        self.assertListEqual(list(discovery_tags.keys()), ['21003343353-GAGA-G_37'])
+        self.assertListEqual(
+            [tag['tagGuid'] for tag in discovery_tags['21003343353-GAGA-G_37']], ['VT1726961_2103343353_r0390_100'])
+        self.assertDictEqual(discovery_tags['21003343353-GAGA-G_37'][0]['savedVariant'], {
+            'variantGuid': 'SV0000001_2103343353_r0390_100', 'familyGuid': 'F000001_1', 'projectGuid': 'R0001_1kg',
+        })
+        self.assertDictEqual(response, {'familiesByGuid': {}})
+
+        # Test re-using the already loaded tags does not query the tags again
+        with CaptureQueriesContext(connections['default']) as loaded_queries:
+            loaded_tags, loaded_response = get_json_for_discovery_tags(
+                variants, user, loaded_tags_by_guid=saved_variants['variantTagsByGuid'])
+        self.assertDictEqual(loaded_tags, discovery_tags)
+        self.assertDictEqual(loaded_response, response)
+        tag_query = '"seqr_varianttag_saved_variants"'
+        self.assertTrue(any(tag_query in query['sql'] for query in queries))
+        self.assertFalse(any(tag_query in query['sql'] for query in loaded_queries))
+        self.assertListEqual(
+            saved_variants['variantTagsByGuid']['VT1726961_2103343353_r0390_100']['variantGuids'],
+            ['SV0000001_2103343353_r0390_100'])
+
     def test_json_for_variant_note(self):
         tag = VariantNote.objects.first()
         json = get_json_for_variant_note(tag)
@@ -108,12 +108,16 @@ def add_child_ids(response):
         family['individualGuids'] = individual_guids_by_family[family['familyGuid']]
 
 
+# Only the fields needed to display the discovery genes
+DISCOVERY_TAG_JSON_KEYS = ['transcripts', 'mainTranscriptId']
+
+
 def families_discovery_tags(families):
     families_by_guid = {f['familyGuid']: dict(discoveryTags=[], **f) for f in families}
 
     discovery_tags = get_json_for_saved_variants(SavedVariant.objects.filter(
         family__guid__in=families_by_guid.keys(), varianttag__variant_tag_type__category='CMG Discovery Tags',
-    ), add_details=True)
+    ), add_details=True, saved_variant_json_keys=DISCOVERY_TAG_JSON_KEYS)
 
     gene_ids = set()
     for tag in discovery_tags:
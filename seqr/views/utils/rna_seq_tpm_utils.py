@@ -0,0 +1,85 @@
+from collections import defaultdict
+from django.core.exceptions import EmptyResultSet
+from django.db import connections, router, transaction
+from django.db.models import QuerySet
+
+from seqr.models import RnaSeqTpm, RnaSeqTpmArray, RnaSeqTpmGeneIndex
+from seqr.utils.logging_utils import SeqrLogger
+
+logger = SeqrLogger(__name__)
+
+# Looks up the position of each requested gene once per gene index version, and then subscripts the array of every
+# sample matched by the array id subquery at those positions
+TPM_ARRAY_LOOKUP_SQL = """
+SELECT a.sample_id, p.gene_id, a.tpms[p.position]
+FROM {array_table} a
+JOIN (
+  SELECT i.id AS gene_index_id, g.gene_id, array_position(i.gene_ids, g.gene_id) AS position
+  FROM {gene_index_table} i, unnest(%s::varchar[]) AS g(gene_id)
+) p ON p.gene_index_id = a.gene_index_id AND p.position IS NOT NULL
+WHERE a.id IN ({{array_ids_sql}})
+""".format(array_table=RnaSeqTpmArray._meta.db_table, gene_index_table=RnaSeqTpmGeneIndex._meta.db_table)
+
+
+def get_rna_seq_tpms(sample_ids, gene_ids):
+    """Returns the TPMs for the given samples and genes as {sample_id: {gene_id: tpm}}. TPMs are read from the
+    RnaSeqTpmArray for samples which have one, and from the RnaSeqTpm rows otherwise. The samples may be given as a
+    Sample queryset, which is used as a subquery so the sample ids are never loaded"""
+    if isinstance(sample_ids, QuerySet):
+        sample_ids = sample_ids.values('id')
+    else:
+        sample_ids = list(sample_ids)
+    gene_ids = list(gene_ids)
+    tpms = defaultdict(dict)
+    if not gene_ids:
+        return tpms
+
+    db = router.db_for_read(RnaSeqTpmArray)
+    array_ids_query = RnaSeqTpmArray.objects.using(db).filter(sample_id__in=sample_ids).values('id').query
+    try:
+        array_ids_sql, array_ids_params = array_ids_query.get_compiler(using=db).as_sql()
+    except EmptyResultSet:
+        return tpms
+    with connections[db].cursor() as cursor:
+        cursor.execute(TPM_ARRAY_LOOKUP_SQL.format(array_ids_sql=array_ids_sql), [gene_ids, *array_ids_params])
+        for sample_id, gene_id, tpm in cursor.fetchall():
+            if tpm is not None:
+                tpms[sample_id][gene_id] = tpm
+
+    for sample_id, gene_id, tpm in RnaSeqTpm.objects.filter(
+            sample_id__in=sample_ids, gene_id__in=gene_ids, sample__rnaseqtpmarray__isnull=True,
+    ).values_list('sample_id', 'gene_id', 'tpm'):
+        tpms[sample_id][gene_id] = tpm
+
+    return tpms
+
+
+def get_or_create_gene_index(gene_ids):
+    """Returns the latest gene index, first creating a new version if any of the given genes are not yet indexed.
+    New versions only append genes, so positions in earlier versions remain valid"""
+    gene_index = RnaSeqTpmGeneIndex.objects.order_by('-version').first()
+    indexed_gene_ids = gene_index.gene_ids if gene_index else []
+    new_gene_ids = set(gene_ids) - set(indexed_gene_ids)
+    if new_gene_ids:
+        gene_index = RnaSeqTpmGeneIndex.objects.create(
+            version=gene_index.version + 1 if gene_index else 1, gene_ids=indexed_gene_ids + sorted(new_gene_ids),
+        )
+    return gene_index
+
+
+def convert_rna_seq_tpm_rows_to_arrays(user, sample_ids):
+    """Converts the RnaSeqTpm rows for each of the given samples to a single RnaSeqTpmArray, one sample at a time.
+    The rows are kept, as per-gene lookups are faster from the indexed rows than from the arrays"""
+    gene_index = get_or_create_gene_index(
+        RnaSeqTpm.objects.filter(sample_id__in=sample_ids).values_list('gene_id', flat=True).distinct())
+    gene_positions = {gene_id: i for i, gene_id in enumerate(gene_index.gene_ids)}
+
+    for sample_id in sample_ids:
+        tpms = [None] * len(gene_positions)
+        for gene_id, tpm in RnaSeqTpm.objects.filter(sample_id=sample_id).values_list('gene_id', 'tpm'):
+            tpms[gene_positions[gene_id]] = tpm
+        with transaction.atomic(using=router.db_for_write(RnaSeqTpmArray)):
+            RnaSeqTpmArray.bulk_delete(user, sample_id=sample_id)
+            RnaSeqTpmArray.bulk_create(user, [RnaSeqTpmArray(sample_id=sample_id, gene_index=gene_index, tpms=tpms)])
+
+    return gene_index
@@ -0,0 +1,60 @@
+from django.test import TestCase
+
+from seqr.models import Sample, RnaSeqTpm, RnaSeqTpmArray, RnaSeqTpmGeneIndex
+from seqr.views.utils.rna_seq_tpm_utils import get_rna_seq_tpms, get_or_create_gene_index, \
+    convert_rna_seq_tpm_rows_to_arrays
+
+GENE_IDS = ['ENSG00000135953', 'ENSG00000227232', 'ENSG00000240361']
+EXPECTED_TPMS = {
+    151: {'ENSG00000135953': 1.01},
+    152: {'ENSG00000135953': 8.38, 'ENSG00000227232': 9.1},
+}
+
+
+class RnaSeqTpmUtilsTest(TestCase):
+    databases = '__all__'
+    fixtures = ['users', '1kg_project', 'reference_data']
+
+    def test_get_or_create_gene_index(self):
+        gene_index = get_or_create_gene_index(['ENSG2', 'ENSG1'])
+        self.assertEqual(gene_index.version, 1)
+        self.assertListEqual(gene_index.gene_ids, ['ENSG1', 'ENSG2'])
+
+        self.assertEqual(get_or_create_gene_index(['ENSG1']).id, gene_index.id)
+
+        # New genes are appended so existing positions are unchanged
+        new_gene_index = get_or_create_gene_index(['ENSG3', 'ENSG0', 'ENSG1'])
+        self.assertEqual(new_gene_index.version, 2)
+        self.assertListEqual(new_gene_index.gene_ids, ['ENSG1', 'ENSG2', 'ENSG0', 'ENSG3'])
+        self.assertEqual(RnaSeqTpmGeneIndex.objects.count(), 2)
+
+    def test_convert_rna_seq_tpm_rows_to_arrays(self):
+        self.assertDictEqual(get_rna_seq_tpms([151, 152, 153], GENE_IDS), EXPECTED_TPMS)
+        self.assertDictEqual(get_rna_seq_tpms([], GENE_IDS), {})
+        self.assertDictEqual(get_rna_seq_tpms([151], []), {})
+
+        num_rows = RnaSeqTpm.objects.filter(sample_id=152).count()
+        gene_index = convert_rna_seq_tpm_rows_to_arrays(None, [152])
+        self.assertEqual(gene_index.version, 1)
+        self.assertEqual(len(gene_index.gene_ids), num_rows)
+        self.assertEqual(RnaSeqTpm.objects.filter(sample_id=152).count(), num_rows)
+        tpm_array = RnaSeqTpmArray.objects.get(sample_id=152)
+        self.assertEqual(len(tpm_array.tpms), num_rows)
+        self.assertEqual(tpm_array.tpms[gene_index.gene_ids.index('ENSG00000227232')], 9.1)
+
+        # Samples with and without arrays are both returned
+        self.assertDictEqual(get_rna_seq_tpms([151, 152], GENE_IDS), EXPECTED_TPMS)
+        self.assertDictEqual(get_rna_seq_tpms(Sample.objects.filter(id__in=[151, 152, 153]), GENE_IDS), EXPECTED_TPMS)
+        self.assertDictEqual(get_rna_seq_tpms(Sample.objects.none(), GENE_IDS), {})
+
+        # Re-converting replaces the existing array and uses the same gene index
+        gene_index = convert_rna_seq_tpm_rows_to_arrays(None, [151, 152])
+        self.assertEqual(gene_index.version, 1)
+        self.assertEqual(RnaSeqTpmArray.objects.filter(sample_id__in=[151, 152]).count(), 2)
+        self.assertEqual(RnaSeqTpm.objects.filter(sample_id__in=[151, 152]).count(), 4)
+        tpms = RnaSeqTpmArray.objects.get(sample_id=151).tpms
+        self.assertEqual(len(tpms), num_rows)
+        self.assertEqual(len([tpm for tpm in tpms if tpm is not None]), 1)
+
+        self.assertDictEqual(get_rna_seq_tpms([151, 152], GENE_IDS), EXPECTED_TPMS)
+        self.assertDictEqual(get_rna_seq_tpms([151], ['ENSG00000240361']), {})
@@ -1,5 +1,7 @@
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 from django.contrib.postgres.aggregates import ArrayAgg
+from django.db import connections
 from django.db.models import F
 import logging
 import redis
@@ -10,7 +12,6 @@ from seqr.models import SavedVariant, VariantSearchResults, Family, LocusList, L
     RnaSeqTpm, PhenotypePrioritization, Project, Sample, VariantTagType
 from seqr.utils.search.utils import get_variants_for_variant_ids
 from seqr.utils.gene_utils import get_genes_for_variants
-from seqr.views.utils.json_to_orm_utils import update_model_from_json
 from seqr.views.utils.orm_to_json_utils import get_json_for_discovery_tags, get_json_for_locus_lists, \
     get_json_for_queryset, get_json_for_rna_seq_outliers, get_json_for_saved_variants_with_tags, \
     get_json_for_matchmaker_submissions
@@ -22,11 +23,14 @@ logger = logging.getLogger(__name__)
 
 
 MAX_VARIANTS_FETCH = 1000
+MAX_VARIANT_FETCH_WORKERS = 4
+SAVED_VARIANT_UPDATE_BATCH_SIZE = 500
 DISCOVERY_CATEGORY = 'CMG Discovery Tags'
 
 
 def update_project_saved_variant_json(project, family_id=None, user=None):
-    saved_variants = SavedVariant.objects.filter(family__project=project).select_related('family')
+    saved_variants = SavedVariant.objects.filter(family__project=project).select_related('family').defer(
+        'saved_variant_json')
     if family_id:
         saved_variants = saved_variants.filter(family__family_id=family_id)
 
@@ -43,21 +47,51 @@ def update_project_saved_variant_json(project, family_id=None, user=None):
 
     variant_ids = sorted(variant_ids)
     families = sorted(families, key=lambda f: f.guid)
-    variants_json = []
-    for sub_var_ids in [variant_ids[i:i+MAX_VARIANTS_FETCH] for i in range(0, len(variant_ids), MAX_VARIANTS_FETCH)]:
-        variants_json += get_variants_for_variant_ids(families, sub_var_ids, user=user)
+    batches = [variant_ids[i:i+MAX_VARIANTS_FETCH] for i in range(0, len(variant_ids), MAX_VARIANTS_FETCH)]
 
     updated_saved_variant_guids = []
-    for var in variants_json:
-        for family_guid in var['familyGuids']:
-            saved_variant = saved_variants_map.get((var['variantId'], family_guid))
-            if saved_variant:
-                update_model_from_json(saved_variant, {'saved_variant_json': var}, user)
-                updated_saved_variant_guids.append(saved_variant.guid)
+    for variants_json in _fetch_variant_batches(families, batches, user):
+        updated_saved_variants = []
+        for var in variants_json:
+            for family_guid in var['familyGuids']:
+                saved_variant = saved_variants_map.get((var['variantId'], family_guid))
+                if saved_variant:
+                    saved_variant.saved_variant_json = var
+                    updated_saved_variants.append(saved_variant)
+        for i in range(0, len(updated_saved_variants), SAVED_VARIANT_UPDATE_BATCH_SIZE):
+            updated_saved_variant_guids += SavedVariant.bulk_update_models(
+                user, updated_saved_variants[i:i+SAVED_VARIANT_UPDATE_BATCH_SIZE], ['saved_variant_json'])
 
     return updated_saved_variant_guids
 
 
+def _fetch_variant_batches(families, batches, user):
+    """Yields the fetched variants for each batch of variant ids in order. Multiple batches are fetched concurrently,
+    with a bounded number of fetched batches waiting to be applied"""
+    num_workers = min(MAX_VARIANT_FETCH_WORKERS, len(batches))
+    if num_workers <= 1:
+        for variant_ids in batches:
+            yield get_variants_for_variant_ids(families, variant_ids, user=user)
+        return
+
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        futures = deque()
+        for variant_ids in batches:
+            futures.append(executor.submit(_fetch_variant_batch, families, variant_ids, user))
+            if len(futures) >= num_workers * 2:
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
+
+
+def _fetch_variant_batch(families, variant_ids, user):
+    try:
+        return get_variants_for_variant_ids(families, variant_ids, user=user)
+    finally:
+        # Database connections are per-thread, so close any opened by the worker thread
+        connections.close_all()
+
+
 def reset_cached_search_results(project, reset_index_metadata=False):
     try:
         redis_client = redis.StrictRedis(host=REDIS_SERVICE_HOSTNAME, port=REDIS_SERVICE_PORT, socket_connect_timeout=3)
@@ -207,7 +241,8 @@ def get_variants_response(request, saved_variants, response_variants=None, add_a
     discovery_tags = None
     is_analyst = user_is_analyst(request.user)
     if is_analyst:
-        discovery_tags, discovery_response = get_json_for_discovery_tags(response['savedVariantsByGuid'].values(), request.user)
+        discovery_tags, discovery_response = get_json_for_discovery_tags(
+            response['savedVariantsByGuid'].values(), request.user, loaded_tags_by_guid=response.get('variantTagsByGuid'))
         response.update(discovery_response)
 
     response['transcriptsById'] = transcripts
@@ -4,6 +4,7 @@ import random
 import re
 import string
 import subprocess # nosec
+import tempfile
 
 from ssl import create_default_context
 
@@ -331,6 +332,8 @@ if ELASTICSEARCH_CA_PATH:
     ES_SSL_CONTEXT = create_default_context(cafile=ELASTICSEARCH_CA_PATH)
 else:
     ES_SSL_CONTEXT = None
+# max number of concurrent msearch requests sent for a single variant search
+ELASTICSEARCH_MAX_PARALLEL_SEARCHES = int(os.environ.get('ELASTICSEARCH_MAX_PARALLEL_SEARCHES', '4'))
 
 KIBANA_SERVER = '{host}:{port}'.format(
     host=os.environ.get('KIBANA_SERVICE_HOSTNAME', 'localhost'),
@@ -344,6 +347,18 @@ HAIL_BACKEND_SERVICE_PORT = int(os.environ.get('HAIL_BACKEND_SERVICE_PORT', '500
 REDIS_SERVICE_HOSTNAME = os.environ.get('REDIS_SERVICE_HOSTNAME', 'localhost')
 REDIS_SERVICE_PORT = int(os.environ.get('REDIS_SERVICE_PORT', '6379'))
 
+# base url for the google storage JSON/XML API, can be overridden to use a local fake GCS server
+GS_STORAGE_URL = os.environ.get('GS_STORAGE_URL', 'https://storage.googleapis.com')
+# how google bucket files are accessed, either by running "gsutil" commands or by calling the storage "api" directly
+GS_STORAGE_BACKEND = os.environ.get('GS_STORAGE_BACKEND', 'gsutil')
+
+# local disk cache for IGV reference genome resources
+IGV_GENOMES_CACHE_DIR = os.environ.get('IGV_GENOMES_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'igv_genomes_cache'))
+IGV_GENOMES_CACHE_MAX_SIZE = int(os.environ.get('IGV_GENOMES_CACHE_MAX_SIZE', 2 * 1024 ** 3))
+# local disk cache for IGV track index files stored in google buckets
+IGV_INDEX_CACHE_DIR = os.environ.get('IGV_INDEX_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'igv_index_cache'))
+IGV_INDEX_CACHE_MAX_SIZE = int(os.environ.get('IGV_INDEX_CACHE_MAX_SIZE', 1024 ** 3))
+
 # Matchmaker
 MME_DEFAULT_CONTACT_NAME = 'Samantha Baxter'
 MME_DEFAULT_CONTACT_INSTITUTION = 'Broad Center for Mendelian Genomics'